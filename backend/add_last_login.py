@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Add last_login column to users table
+
+Deprecated: migration 0001_baseline adds this column; use scripts/migrate.py.
 """
 
 import psycopg2
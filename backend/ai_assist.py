@@ -1,9 +1,17 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
+import json
+import hashlib
+import logging
+import psycopg2
 from dotenv import load_dotenv
 
+from db_pool import get_pool, read_pool
+from shared_cache import SharedCache
+
 # For OpenAI integration (install with: pip install openai)
 try:
     import openai
@@ -14,6 +22,8 @@ except ImportError:
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Router for AI assistance endpoints
 ai_router = APIRouter(prefix="/api/ai", tags=["AI Assistance"])
 
@@ -21,6 +31,13 @@ ai_router = APIRouter(prefix="/api/ai", tags=["AI Assistance"])
 if OPENAI_AVAILABLE:
     openai.api_key = os.getenv("OPENAI_API_KEY")
 
+AI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# Suggestions stay in memory (and the shared cache tier) for a day and in
+# ai_suggestions for AI_SUGGESTION_RETENTION_DAYS
+AI_SUGGESTION_CACHE_TTL = float(os.getenv("AI_SUGGESTION_CACHE_TTL", "86400"))
+AI_SUGGESTION_CACHE_SIZE = int(os.getenv("AI_SUGGESTION_CACHE_SIZE", "5000"))
+AI_SUGGESTION_RETENTION_DAYS = int(os.getenv("AI_SUGGESTION_RETENTION_DAYS", "90"))
+
 class AIAssistRequest(BaseModel):
     deed_type: str
     field: str
@@ -29,6 +46,7 @@ class AIAssistRequest(BaseModel):
 class AIAssistResponse(BaseModel):
     suggestion: str
     confidence: Optional[float] = None
+    cached: bool = False
 
 # Field-specific prompts for better AI assistance
 FIELD_PROMPTS = {
@@ -46,6 +64,133 @@ DEED_TYPE_CONTEXT = {
     "Trust Transfer Deed": "This is a trust transfer deed for estate planning purposes."
 }
 
+SYSTEM_PROMPT = "You are a legal document assistant specializing in real estate deeds. Provide accurate, professional formatting suggestions."
+
+PROMPT_TEMPLATE = """
+{deed_context}
+
+{field_prompt}
+
+User input: "{input}"
+
+Provide a professionally formatted suggestion that would be appropriate for a legal real estate document. Keep it concise and accurate.
+"""
+
+# Changes whenever any prompt text does, so older cached suggestions stop matching
+PROMPT_VERSION = hashlib.sha1(json.dumps(
+    [FIELD_PROMPTS, DEED_TYPE_CONTEXT, SYSTEM_PROMPT, PROMPT_TEMPLATE], sort_keys=True
+).encode()).hexdigest()[:16]
+
+suggestion_cache = SharedCache("ai_suggestions", ttl=AI_SUGGESTION_CACHE_TTL, l1_size=AI_SUGGESTION_CACHE_SIZE)
+
+def normalize_input(text: str) -> str:
+    """Case and whitespace do not change the suggestion"""
+    return " ".join(text.split()).casefold()
+
+def suggestion_key(deed_type: str, field: str, text: str) -> str:
+    material = json.dumps([deed_type, field, normalize_input(text), AI_MODEL, PROMPT_VERSION])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+def load_stored_suggestion(key: str) -> Optional[dict]:
+    """The ai_suggestions row for key, if it is younger than the retention period"""
+    pool = read_pool()
+    if not pool:
+        return None
+    with pool.connection("ai_suggestion_lookup") as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT suggestion, confidence FROM ai_suggestions
+            WHERE cache_key = %s AND created_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+        """, (key, AI_SUGGESTION_RETENTION_DAYS))
+        row = cur.fetchone()
+    return {"suggestion": row[0], "confidence": row[1]} if row else None
+
+def store_suggestion(key: str, request: "AIAssistRequest", suggestion: dict):
+    pool = get_pool()
+    if not pool:
+        return
+    with pool.connection("ai_suggestion_store") as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO ai_suggestions (cache_key, deed_type, field, model, prompt_version, suggestion, confidence)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                suggestion = EXCLUDED.suggestion, confidence = EXCLUDED.confidence, created_at = CURRENT_TIMESTAMP
+        """, (key, request.deed_type[:100], request.field[:100], AI_MODEL, PROMPT_VERSION,
+              suggestion["suggestion"], suggestion["confidence"]))
+
+def prune_ai_suggestions(conn=None) -> int:
+    """Delete stored suggestions from other prompt versions or past retention (startup warmup)"""
+    sql = """
+        DELETE FROM ai_suggestions
+        WHERE prompt_version <> %s OR created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+    """
+    if conn is not None:
+        with conn.cursor() as cur:
+            cur.execute(sql, (PROMPT_VERSION, AI_SUGGESTION_RETENTION_DAYS))
+            return cur.rowcount
+    pool = get_pool()
+    if not pool:
+        return 0
+    try:
+        with pool.connection("ai_suggestion_prune") as pooled, pooled.cursor() as cur:
+            cur.execute(sql, (PROMPT_VERSION, AI_SUGGESTION_RETENTION_DAYS))
+            return cur.rowcount
+    except psycopg2.Error as e:
+        # e.g. migration 0008 not applied yet; lookups then just miss
+        logger.warning(f"Pruning AI suggestions failed: {e}")
+        return 0
+
+def request_model_suggestion(request: "AIAssistRequest") -> dict:
+    """One chat completion for the request's field"""
+    full_prompt = PROMPT_TEMPLATE.format(
+        deed_context=DEED_TYPE_CONTEXT.get(request.deed_type, ""),
+        field_prompt=FIELD_PROMPTS.get(request.field, "Improve and format this text for legal document use:"),
+        input=request.input,
+    )
+    response = openai.ChatCompletion.create(
+        model=AI_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": full_prompt}
+        ],
+        max_tokens=200,
+        temperature=0.3
+    )
+    return {
+        "suggestion": response.choices[0].message.content.strip(),
+        "confidence": 0.85,  # High confidence for OpenAI responses
+    }
+
+def cached_model_suggestion(request: "AIAssistRequest") -> tuple:
+    """
+    (suggestion, cached): memory, then ai_suggestions, then the model
+
+    cached is True only when this request read the suggestion from the cache or
+    the ai_suggestions table; a request that waited on another one's load is not.
+    """
+    key = suggestion_key(request.deed_type, request.field, request.input)
+    read_stored = False
+
+    def load():
+        nonlocal read_stored
+        try:
+            stored = load_stored_suggestion(key)
+        except Exception as e:
+            logger.warning(f"AI suggestion lookup failed, asking the model: {e}")
+            stored = None
+        if stored is not None:
+            read_stored = True
+            return stored
+
+        suggestion = request_model_suggestion(request)
+        try:
+            store_suggestion(key, request, suggestion)
+        except Exception as e:
+            logger.warning(f"Storing AI suggestion failed: {e}")
+        return suggestion
+
+    suggestion, hit = suggestion_cache.lookup(key, load)
+    return suggestion, hit or read_stored
+
 @ai_router.post("/assist", response_model=AIAssistResponse)
 async def get_ai_assistance(request: AIAssistRequest):
     """
@@ -58,43 +203,19 @@ async def get_ai_assistance(request: AIAssistRequest):
         if not request.input.strip():
             raise HTTPException(status_code=400, detail="Input cannot be empty")
         
-        # Get field-specific prompt
-        field_prompt = FIELD_PROMPTS.get(request.field, "Improve and format this text for legal document use:")
-        deed_context = DEED_TYPE_CONTEXT.get(request.deed_type, "")
-        
-        # Construct the full prompt
-        full_prompt = f"""
-{deed_context}
-
-{field_prompt}
-
-User input: "{request.input}"
-
-Provide a professionally formatted suggestion that would be appropriate for a legal real estate document. Keep it concise and accurate.
-"""
-
         if OPENAI_AVAILABLE and openai.api_key:
-            # Use OpenAI for real suggestions
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a legal document assistant specializing in real estate deeds. Provide accurate, professional formatting suggestions."},
-                    {"role": "user", "content": full_prompt}
-                ],
-                max_tokens=200,
-                temperature=0.3
-            )
-            
-            suggestion = response.choices[0].message.content.strip()
-            confidence = 0.85  # High confidence for OpenAI responses
-            
-        else:
-            # Mock responses for development/demo
-            suggestion = get_mock_suggestion(request.field, request.input, request.deed_type)
-            confidence = 0.75  # Lower confidence for mock responses
+            # Use OpenAI for real suggestions unless this input was answered before
+            result, cached = await run_in_threadpool(cached_model_suggestion, request)
+            return AIAssistResponse(suggestion=result["suggestion"], confidence=result["confidence"], cached=cached)
+        
+        # Mock responses for development/demo
+        suggestion = get_mock_suggestion(request.field, request.input, request.deed_type)
+        confidence = 0.75  # Lower confidence for mock responses
         
         return AIAssistResponse(suggestion=suggestion, confidence=confidence)
         
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error in production
         print(f"AI assistance error: {str(e)}")
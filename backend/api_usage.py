@@ -0,0 +1,172 @@
+"""
+api_usage partition management
+
+api_usage is range-partitioned by month on its timestamp column. Maintenance
+pre-creates the upcoming monthly partitions and drops (or detaches) the ones
+older than the retention window, so old data leaves as a metadata operation
+instead of a bulk DELETE followed by a long vacuum.
+"""
+
+import os
+import re
+import logging
+from datetime import date
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+API_USAGE_RETENTION_MONTHS = int(os.getenv("API_USAGE_RETENTION_MONTHS", "13"))
+API_USAGE_PARTITIONS_AHEAD = int(os.getenv("API_USAGE_PARTITIONS_AHEAD", "3"))
+# "drop" deletes expired partitions, "detach" keeps them as standalone tables for archiving
+API_USAGE_RETENTION_MODE = os.getenv("API_USAGE_RETENTION_MODE", "drop")
+
+PARTITION_NAME = re.compile(r"^api_usage_y(\d{4})m(\d{2})$")
+
+CREATE_PARTITIONED_TABLE = """
+    CREATE TABLE IF NOT EXISTS api_usage (
+        id BIGSERIAL,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        endpoint VARCHAR(255) NOT NULL,
+        method VARCHAR(10) NOT NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        response_time_ms INTEGER,
+        status_code INTEGER,
+        ip_address INET,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+
+    CREATE INDEX IF NOT EXISTS idx_api_usage_user_timestamp ON api_usage (user_id, timestamp);
+
+    -- Catches rows outside every monthly partition instead of failing the insert
+    CREATE TABLE IF NOT EXISTS api_usage_default PARTITION OF api_usage DEFAULT;
+"""
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month `count` months after `month`"""
+    index = month.year * 12 + (month.month - 1) + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"api_usage_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(cur) -> Optional[bool]:
+    """True/False for an existing api_usage table, None when it does not exist"""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('api_usage')")
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row[0] == "p"
+
+
+def create_api_usage_table(conn):
+    """Create the partitioned api_usage table, converting a legacy heap table if present"""
+    with conn.cursor() as cur:
+        if is_partitioned(cur) is False:
+            _convert_legacy_table(cur)
+        else:
+            cur.execute(CREATE_PARTITIONED_TABLE)
+
+
+def _convert_legacy_table(cur):
+    """Move rows from a plain api_usage table into the partitioned layout"""
+    logger.info("Converting api_usage to a partitioned table")
+    cur.execute("ALTER TABLE api_usage RENAME TO api_usage_legacy")
+    cur.execute("ALTER INDEX IF EXISTS api_usage_pkey RENAME TO api_usage_legacy_pkey")
+    cur.execute(CREATE_PARTITIONED_TABLE)
+
+    cur.execute("SELECT MIN(timestamp), MAX(timestamp) FROM api_usage_legacy")
+    oldest, newest = cur.fetchone()
+    if oldest is not None:
+        month = oldest.date().replace(day=1)
+        while month <= newest.date():
+            _create_partition(cur, month)
+            month = add_months(month, 1)
+
+    cur.execute("""
+        INSERT INTO api_usage (id, user_id, endpoint, method, timestamp, response_time_ms, status_code, ip_address)
+        SELECT id, user_id, endpoint, method, COALESCE(timestamp, CURRENT_TIMESTAMP),
+               response_time_ms, status_code, ip_address
+        FROM api_usage_legacy
+    """)
+    cur.execute("""
+        SELECT setval(pg_get_serial_sequence('api_usage', 'id'), COALESCE(MAX(id), 0) + 1, FALSE)
+        FROM api_usage_legacy
+    """)
+    cur.execute("DROP TABLE api_usage_legacy")
+
+
+def _create_partition(cur, month: date) -> bool:
+    """Create the partition for one month; returns True if it was new"""
+    name = partition_name(month)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+    cur.execute(
+        f"CREATE TABLE {name} PARTITION OF api_usage FOR VALUES FROM (%s) TO (%s)",
+        (month, add_months(month, 1))
+    )
+    return True
+
+
+def list_partitions(cur) -> List[date]:
+    """Months that currently have a monthly partition attached"""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('api_usage')
+    """)
+    months = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def maintain_api_usage_partitions(conn, today: Optional[date] = None,
+                                  months_ahead: int = API_USAGE_PARTITIONS_AHEAD,
+                                  retention_months: int = API_USAGE_RETENTION_MONTHS,
+                                  mode: str = API_USAGE_RETENTION_MODE) -> dict:
+    """Pre-create upcoming partitions and expire the ones past retention"""
+    if mode not in ("drop", "detach"):
+        raise ValueError(f"Unknown retention mode: {mode}")
+
+    current = (today or date.today()).replace(day=1)
+    created, expired = [], []
+    with conn.cursor() as cur:
+        # Partition DDL locks the parent briefly; give up rather than queue behind traffic
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if _create_partition(cur, month):
+                created.append(partition_name(month))
+
+        cutoff = add_months(current, -retention_months)
+        for month in list_partitions(cur):
+            if month >= cutoff:
+                continue
+            name = partition_name(month)
+            if mode == "drop":
+                cur.execute(f"DROP TABLE {name}")
+            else:
+                cur.execute(f"ALTER TABLE api_usage DETACH PARTITION {name}")
+            expired.append(name)
+
+    if created or expired:
+        logger.info(f"api_usage partitions created={created} expired={expired} ({mode})")
+    return {"created": created, "expired": expired, "mode": mode}
+
+
+def monthly_api_calls(cur, user_id: int, month: Optional[date] = None) -> int:
+    """API calls for one user in one month; constant bounds prune to a single partition"""
+    start = (month or date.today()).replace(day=1)
+    cur.execute("""
+        SELECT COUNT(*) FROM api_usage
+        WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+    """, (user_id, start, add_months(start, 1)))
+    return cur.fetchone()[0]
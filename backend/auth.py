@@ -63,6 +63,18 @@ def get_current_user_id(token_data: dict = Depends(verify_token)) -> int:
     """Extract user ID from token"""
     return int(token_data.get("sub"))
 
+def user_id_from_headers(headers: dict) -> Optional[int]:
+    """Best-effort user ID from a Bearer token, None if absent or invalid (no exceptions)"""
+    authorization = headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
 def get_current_user_email(token_data: dict = Depends(verify_token)) -> str:
     """Extract user email from token"""
     return token_data.get("email")
@@ -0,0 +1,448 @@
+"""
+Database connection pooling for the DeedPro API
+
+psycopg2 is a blocking driver, so handlers that touch the database run in
+FastAPI's threadpool and borrow a connection from a shared, thread-safe pool
+for the duration of the request instead of sharing one global connection.
+"""
+
+import os
+import time
+import logging
+import ipaddress
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from fastapi import HTTPException, Request
+from dotenv import load_dotenv
+
+from auth import user_id_from_headers
+from query_budget import BudgetConnection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+DB_URL = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_CHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", "30"))
+
+# Number of recent acquire latencies kept for percentile reporting
+LATENCY_SAMPLE_SIZE = 1000
+
+# Callbacks invoked as hook(operation, acquire_ms, total_ms) after each pooled call
+_timing_hooks = []
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class DatabasePool:
+    """Thread-safe, lazily opened psycopg2 connection pool with stats"""
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT, name: str = "primary"):
+        self.dsn = dsn
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+
+        # Stats
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._latencies_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    def open(self):
+        """Create the underlying pool and its minimum number of connections"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.min_size, self.max_size, self.dsn,
+                                                    connection_factory=BudgetConnection)
+                logger.info(f"Opened {self.name} database pool (min={self.min_size}, max={self.max_size})")
+        return self._pool
+
+    def close(self):
+        """Close every connection held by the pool"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+                logger.info(f"Closed {self.name} database pool")
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    def getconn(self):
+        """Borrow a connection, waiting up to the pool timeout for a free slot"""
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a {self.name} database connection")
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._latencies_ms.append(elapsed_ms)
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, dropping it if it is broken"""
+        try:
+            if not discard and not conn.closed:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            discard = True
+
+        try:
+            close = discard or bool(conn.closed)
+            pool = self._pool
+            if pool is not None:
+                if close:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn, close=close)
+            elif not conn.closed:
+                conn.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _checkout(self):
+        """Take a connection from the pool, replacing it if the server dropped it"""
+        pool = self._pool or self.open()
+        for _ in range(self.max_size + 1):
+            conn = pool.getconn()
+            if self._is_usable(conn):
+                return conn
+            with self._lock:
+                self._reconnects += 1
+            logger.warning(f"Discarding dead {self.name} database connection, reconnecting")
+            self._last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError(f"Unable to obtain a live {self.name} database connection")
+
+    def _is_usable(self, conn) -> bool:
+        if conn.closed:
+            return False
+
+        # Connections that sat idle for a while may have been cut by the server or a proxy
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used > DB_POOL_CHECK_IDLE_SECONDS:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    @contextmanager
+    def connection(self, operation: Optional[str] = None):
+        """Borrow a connection; commit on success, roll back on error, always return it"""
+        start = time.perf_counter()
+        conn = self.getconn()
+        acquire_ms = (time.perf_counter() - start) * 1000
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.OperationalError:
+            discard = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn, discard=discard or bool(conn.closed))
+            if _timing_hooks:
+                _run_timing_hooks(operation or self.name, acquire_ms, (time.perf_counter() - start) * 1000)
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage for health and admin endpoints"""
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            in_use = self._in_use
+            waiting = self._waiting
+            acquired = self._acquired
+            timeouts = self._timeouts
+            reconnects = self._reconnects
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+        return {
+            "name": self.name,
+            "open": self.is_open,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": in_use,
+            "waiting": waiting,
+            "acquired_total": acquired,
+            "timeouts": timeouts,
+            "reconnects": reconnects,
+            "acquire_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+        }
+
+
+def add_timing_hook(hook):
+    """Register hook(operation, acquire_ms, total_ms), called after every pooled call"""
+    _timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook):
+    """Unregister a timing hook added with add_timing_hook"""
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+
+def _run_timing_hooks(operation: str, acquire_ms: float, total_ms: float):
+    for hook in list(_timing_hooks):
+        try:
+            hook(operation, acquire_ms, total_ms)
+        except Exception as e:
+            logger.warning(f"Timing hook failed: {e}")
+
+
+# Shared primary pool (connections are only opened on first use)
+primary_pool = DatabasePool(DB_URL) if DB_URL else None
+
+# Optional read replicas, comma separated
+replica_pools = [
+    DatabasePool(url.strip(), name=f"replica{i + 1}")
+    for i, url in enumerate((os.getenv("DATABASE_REPLICA_URL") or "").split(","))
+    if url.strip()
+] if primary_pool else []
+
+# Replica routing configuration
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+# Addresses/CIDRs of our own proxies; X-Forwarded-For is only believed from these
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# replica name -> (checked_at, healthy)
+_replica_health = {}
+# client key -> monotonic time until which its reads stay on the primary
+_sticky_until = {}
+_routing_lock = threading.Lock()
+_next_replica = 0
+
+
+def get_pool() -> Optional[DatabasePool]:
+    """Return the shared primary pool, or None when no database is configured"""
+    return primary_pool
+
+
+def _is_trusted_proxy(host: Optional[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def peer_address(request) -> Optional[str]:
+    """The socket peer, or behind trusted proxies the nearest X-Forwarded-For hop they did not add"""
+    host = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if host and forwarded and _is_trusted_proxy(host):
+        # Entries left of the last untrusted hop are whatever the client sent
+        for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+            host = hop
+            if not _is_trusted_proxy(hop):
+                break
+    return host
+
+
+def client_key(request) -> Optional[str]:
+    """Identify the caller for read-your-writes stickiness: the signed-in user, else the peer address"""
+    if request is None:
+        return None
+    user_id = user_id_from_headers(request.headers)
+    if user_id is not None:
+        return f"user:{user_id}"
+    host = peer_address(request)
+    return f"ip:{host}" if host else None
+
+
+def mark_recent_write(key: Optional[str]):
+    """Keep this caller's reads on the primary for the sticky window"""
+    if not key or not replica_pools:
+        return
+    now = time.monotonic()
+    with _routing_lock:
+        _sticky_until[key] = now + REPLICA_STICKY_SECONDS
+        # Drop expired entries so the map stays small
+        if len(_sticky_until) > 10000:
+            for stale in [k for k, until in _sticky_until.items() if until <= now]:
+                del _sticky_until[stale]
+
+
+def _is_sticky(key: Optional[str]) -> bool:
+    if not key:
+        return False
+    with _routing_lock:
+        until = _sticky_until.get(key)
+    return until is not None and until > time.monotonic()
+
+
+def _replica_is_healthy(pool: DatabasePool) -> bool:
+    """Check replication lag, cached for REPLICA_LAG_CHECK_SECONDS"""
+    checked_at, healthy = _replica_health.get(pool.name, (None, True))
+    if checked_at is not None and time.monotonic() - checked_at < REPLICA_LAG_CHECK_SECONDS:
+        return healthy
+
+    try:
+        with pool.connection("replica_lag_check") as conn, conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_SQL)
+            lag = float(cur.fetchone()[0] or 0)
+        healthy = lag <= REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning(f"{pool.name} is {lag:.1f}s behind, routing reads to primary")
+    except (psycopg2.Error, PoolTimeout) as e:
+        logger.warning(f"{pool.name} unavailable, routing reads to primary: {e}")
+        healthy = False
+
+    _replica_health[pool.name] = (time.monotonic(), healthy)
+    return healthy
+
+
+def read_pool(key: Optional[str] = None) -> Optional[DatabasePool]:
+    """Pick the pool for a read: a healthy replica, or the primary as fallback"""
+    global _next_replica
+    if not replica_pools or _is_sticky(key):
+        return primary_pool
+
+    with _routing_lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % len(replica_pools)
+
+    for offset in range(len(replica_pools)):
+        pool = replica_pools[(start + offset) % len(replica_pools)]
+        if _replica_is_healthy(pool):
+            return pool
+    return primary_pool
+
+
+def borrow(pool: DatabasePool, conn=None, on_write=None):
+    """Yield a connection from pool (or the one given) and return it afterwards
+
+    on_write() is called before the connection goes back if the borrower
+    committed a transaction in which a statement changed rows.
+    """
+    if conn is None:
+        try:
+            conn = pool.getconn()
+        except PoolTimeout:
+            raise HTTPException(status_code=503, detail="Database is busy, please retry")
+
+    write_commits = getattr(conn, "write_commits", 0)
+    discard = False
+    try:
+        yield conn
+    except psycopg2.OperationalError:
+        discard = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if on_write is not None and getattr(conn, "write_commits", 0) != write_commits:
+            on_write()
+        pool.putconn(conn, discard=discard or bool(conn.closed))
+
+
+def get_db(request: Request):
+    """FastAPI dependency yielding a pooled primary connection for the current request"""
+    if primary_pool is None:
+        yield None
+        return
+
+    # Once this request commits a write, keep the caller's follow-up reads consistent
+    key = client_key(request)
+    yield from borrow(primary_pool, on_write=lambda: mark_recent_write(key))
+
+
+def get_read_db(request: Request):
+    """FastAPI dependency yielding a replica connection for read-only handlers"""
+    if primary_pool is None:
+        yield None
+        return
+
+    pool = read_pool(client_key(request))
+    conn = None
+    if pool is not primary_pool:
+        try:
+            conn = pool.getconn()
+        except (psycopg2.Error, PoolTimeout) as e:
+            logger.warning(f"{pool.name} acquire failed, falling back to primary: {e}")
+            _replica_health[pool.name] = (time.monotonic(), False)
+            pool = primary_pool
+    yield from borrow(pool, conn)
+
+
+def pool_stats() -> dict:
+    """Stats for every configured pool"""
+    if primary_pool is None:
+        return {}
+    stats = {primary_pool.name: primary_pool.stats()}
+    for pool in replica_pools:
+        stats[pool.name] = pool.stats()
+        checked_at, healthy = _replica_health.get(pool.name, (None, True))
+        stats[pool.name]["healthy"] = healthy
+    return stats
@@ -0,0 +1,119 @@
+"""
+Streaming deed export
+
+Rows are read from a named (server-side) cursor EXPORT_BATCH_SIZE at a time
+and serialized straight into the response, so memory stays flat no matter
+how many deeds a user has. Rows come oldest first on (created_at, id); every
+row carries a cursor token, and passing the last one received back as
+`since` resumes an interrupted export just after that row.
+"""
+
+import io
+import os
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from psycopg2.extras import RealDictCursor
+
+from pagination import decode_cursor, encode_cursor
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = [
+    "id", "deed_type", "property_address", "apn", "county", "grantor_name", "grantee_name",
+    "legal_description", "owner_type", "sales_price", "vesting", "status", "created_at", "updated_at",
+]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _fetch_batches(pool, user_id: int, since: Optional[str]) -> Iterator[list]:
+    """Yield lists of deed rows from a server-side cursor, oldest first"""
+    after_sql, params = "", [user_id]
+    if since:
+        created_at, row_id, _ = decode_cursor(since)
+        after_sql = "AND (created_at, id) > (%s, %s)"
+        params += [created_at, row_id]
+
+    with pool.connection("deed_export") as conn:
+        # Named cursor: the server holds the result set, we pull one batch at a time
+        with conn.cursor(name="deed_export", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(f"""
+                SELECT {", ".join(EXPORT_COLUMNS)}
+                FROM deeds
+                WHERE user_id = %s {after_sql}
+                ORDER BY created_at, id
+            """, params)
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+
+
+def _ndjson_chunks(batches: Iterator[list]) -> Iterator[bytes]:
+    for rows in batches:
+        lines = []
+        for row in rows:
+            row = dict(row)
+            row["cursor"] = encode_cursor(row["created_at"], row["id"])
+            lines.append(json.dumps(row, default=_json_default, separators=(",", ":")))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _csv_chunks(batches: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS + ["cursor"])
+    for rows in batches:
+        for row in rows:
+            writer.writerow(
+                [_csv_value(row[c]) for c in EXPORT_COLUMNS] + [encode_cursor(row["created_at"], row["id"])]
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_deeds(pool, user_id: int, fmt: str, since: Optional[str] = None, gzip: bool = False) -> Iterator[bytes]:
+    """Byte chunks of a user's deeds in the given format, optionally gzipped"""
+    if since:
+        decode_cursor(since)  # raise the 400 before the response starts
+
+    batches = _fetch_batches(pool, user_id, since)
+    chunks = _ndjson_chunks(batches) if fmt == "ndjson" else _csv_chunks(batches)
+    return _gzip_chunks(chunks) if gzip else chunks
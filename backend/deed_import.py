@@ -0,0 +1,192 @@
+"""
+Bulk deed import
+
+Uploads (CSV with a header row, or NDJSON) are validated one row at a time
+against the DeedCreate model. Valid rows are written to a spooled COPY buffer
+and loaded with a single COPY into a temporary staging table, then moved into
+deeds with one set-based INSERT that also bumps the monthly usage counter.
+Invalid rows, including ones missing a column deeds declares NOT NULL, are
+skipped and reported back by row number instead of failing the COPY.
+"""
+
+import io
+import os
+import csv
+import json
+import tempfile
+from decimal import Decimal
+from typing import IO, Iterator, List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from usage_counters import INCREMENT_DEEDS_FROM_CTE
+
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "100000"))
+# Only the first errors are returned in detail; all of them are counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+# COPY buffer size kept in memory before spilling to a temp file
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+IMPORT_COLUMNS = [
+    "deed_type", "property_address", "grantor_name", "apn", "county", "legal_description",
+    "owner_type", "sales_price", "grantee_name", "vesting",
+]
+
+# deeds columns declared NOT NULL; every row must have them (and a CSV header must name them)
+REQUIRED_COLUMNS = ["deed_type", "property_address", "grantor_name", "grantee_name"]
+
+# deeds column widths, checked up front so one long value cannot fail the whole COPY
+COLUMN_LIMITS = {
+    "deed_type": 100,
+    "apn": 50,
+    "county": 100,
+    "owner_type": 100,
+    "grantor_name": 255,
+    "grantee_name": 255,
+    "vesting": 255,
+}
+MAX_SALES_PRICE = Decimal("9999999999999.99")  # DECIMAL(15,2)
+
+
+class ImportFormatError(ValueError):
+    """The upload cannot be parsed at all (as opposed to individual bad rows)"""
+
+
+def _read_csv(stream: IO[str]) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(stream)
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFormatError(f"CSV header must include the columns: {', '.join(missing)}")
+    for row_number, row in enumerate(reader, start=1):
+        # Empty cells mean "not provided"
+        yield row_number, {k: v for k, v in row.items() if k in IMPORT_COLUMNS and v != ""}
+
+
+def _read_ndjson(stream: IO[str]) -> Iterator[Tuple[int, dict]]:
+    for row_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, ImportFormatError(f"Invalid JSON: {e.msg}")
+            continue
+        if not isinstance(record, dict):
+            yield row_number, ImportFormatError("Each line must be a JSON object")
+            continue
+        # As with empty CSV cells, null means "not provided"
+        yield row_number, {k: v for k, v in record.items() if v is not None}
+
+
+def _copy_value(value) -> str:
+    """One field in PostgreSQL COPY text format"""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _check_limits(deed: BaseModel) -> List[str]:
+    problems = []
+    for column in REQUIRED_COLUMNS:
+        value = getattr(deed, column, None)
+        if value is None or not str(value).strip():
+            problems.append(f"{column}: required")
+    for column, limit in COLUMN_LIMITS.items():
+        value = getattr(deed, column)
+        if value is not None and len(value) > limit:
+            problems.append(f"{column}: longer than {limit} characters")
+    if deed.sales_price is not None and abs(Decimal(str(deed.sales_price))) > MAX_SALES_PRICE:
+        problems.append("sales_price: out of range")
+    return problems
+
+
+def validate_upload(stream: IO[str], fmt: str, model: Type[BaseModel]):
+    """
+    Validate an upload in one pass
+
+    Returns (copy_buffer, valid_count, total_rows, error_count, errors).
+    copy_buffer holds the valid rows in COPY text format, rewound and ready to load.
+    """
+    rows = _read_csv(stream) if fmt == "csv" else _read_ndjson(stream)
+    buffer = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES, mode="w+", encoding="utf-8")
+    valid = total = error_count = 0
+    errors = []
+
+    def reject(row_number, messages):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": row_number, "errors": messages})
+
+    for row_number, record in rows:
+        total += 1
+        if total > IMPORT_MAX_ROWS:
+            buffer.close()
+            raise ImportFormatError(f"Uploads are limited to {IMPORT_MAX_ROWS} rows")
+        if isinstance(record, ImportFormatError):
+            reject(row_number, [str(record)])
+            continue
+        try:
+            deed = model.model_validate(record)
+        except ValidationError as e:
+            reject(row_number, [
+                f"{'.'.join(str(p) for p in err['loc'])}: {'required' if err['type'] == 'missing' else err['msg']}"
+                for err in e.errors()
+            ])
+            continue
+        problems = _check_limits(deed)
+        if problems:
+            reject(row_number, problems)
+            continue
+
+        buffer.write("\t".join([str(row_number)] + [_copy_value(getattr(deed, c)) for c in IMPORT_COLUMNS]) + "\n")
+        valid += 1
+
+    buffer.seek(0)
+    return buffer, valid, total, error_count, errors
+
+
+def load_deeds(conn, user_id: int, copy_buffer: IO[str]) -> int:
+    """COPY validated rows into a staging table and insert them into deeds; returns rows inserted"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE deed_import_staging (
+                row_number INTEGER,
+                deed_type TEXT,
+                property_address TEXT,
+                grantor_name TEXT,
+                apn TEXT,
+                county TEXT,
+                legal_description TEXT,
+                owner_type TEXT,
+                sales_price NUMERIC,
+                grantee_name TEXT,
+                vesting TEXT
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY deed_import_staging (row_number, {', '.join(IMPORT_COLUMNS)}) FROM STDIN",
+            copy_buffer
+        )
+
+        columns = ", ".join(IMPORT_COLUMNS)
+        cur.execute(f"""
+            WITH new_deeds AS (
+                INSERT INTO deeds (user_id, {columns})
+                SELECT %s, {columns}
+                FROM deed_import_staging
+                ORDER BY row_number
+                RETURNING user_id, created_at
+            ), bumped_usage AS (
+                {INCREMENT_DEEDS_FROM_CTE}
+            )
+            SELECT COUNT(*) FROM new_deeds
+        """, (user_id,))
+        return cur.fetchone()[0]
+
+
+def text_stream(binary: IO[bytes]) -> IO[str]:
+    """Decode an uploaded file lazily, tolerating a UTF-8 byte order mark"""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
@@ -10,6 +10,10 @@ import base64
 import httpx
 import logging
 from dotenv import load_dotenv
+from metering import UsageMeteringMiddleware, usage_meter
+from lifecycle import Lifecycle
+from invalidation import invalidation_bus
+from shared_cache import shared_cache_tier, shared_cache_stats
 
 # For GraphQL client (Qualia)
 try:
@@ -26,8 +30,17 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Startup/shutdown phases; this app only writes through the metering buffer
+# and shares the main API's cache tier
+lifecycle = Lifecycle("DeedPro External Integrations API")
+lifecycle.add_worker(usage_meter)
+lifecycle.add_worker(shared_cache_tier)
+# Evictions published by the main API reach this process's in-memory caches too
+lifecycle.add_worker(invalidation_bus)
+
 # Separate FastAPI app for external integrations
 external_app = FastAPI(
+    lifespan=lifecycle.lifespan,
     title="DeedPro External Integrations API", 
     version="1.0.0",
     description="Enterprise API for SoftPro 360, Qualia, and other title production software integrations",
@@ -44,6 +57,12 @@ external_app.add_middleware(
     allow_headers=["*"],
 )
 
+# Liveness and readiness probes
+external_app.include_router(lifecycle.router)
+
+# Partner keys are not users rows, so calls are metered without a user_id
+external_app.add_middleware(UsageMeteringMiddleware, meter=usage_meter)
+
 # ============================================================================
 # AUTHENTICATION & SECURITY
 # ============================================================================
@@ -180,7 +199,9 @@ def external_health():
         "status": "ok", 
         "service": "DeedPro External Integrations API",
         "timestamp": datetime.now().isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "shared_cache": shared_cache_stats(),
+        "cache_invalidation": invalidation_bus.stats()
     }
 
 @external_app.get("/api/v1/status")
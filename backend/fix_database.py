@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Fix Database Schema - Add Missing Columns
+
+Deprecated: migration 0001_baseline adds these columns; use scripts/migrate.py.
 """
 
 import psycopg2
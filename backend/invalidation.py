@@ -0,0 +1,197 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY
+
+Each in-process cache registers an evict(key) callback under a name. A
+writer calls publish(cache, key, conn) inside its own transaction, so the
+NOTIFY goes out only if that transaction commits; every worker (including
+the writer's) then evicts the key, or the whole cache when key is None.
+
+Each worker's InvalidationBus keeps one dedicated autocommit connection
+LISTENing on CACHE_INVALIDATION_CHANNEL from a background thread. When that
+connection drops, notifications sent in the meantime are lost, so after
+every (re)connect the bus flushes all registered caches before listening
+again.
+"""
+
+import os
+import json
+import select
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "deedpro_cache_invalidation")
+# How often an idle listener checks its connection is still alive
+CACHE_INVALIDATION_PING_SECONDS = float(os.getenv("CACHE_INVALIDATION_PING_SECONDS", "30"))
+CACHE_INVALIDATION_MAX_BACKOFF = 30.0
+
+
+def publish(cache: str, key=None, conn=None):
+    """
+    Tell every worker to evict key (or all) from the named cache
+
+    With conn the notification is part of that transaction and is delivered
+    on commit; without it a pooled connection sends it right away.
+    """
+    payload = json.dumps({"cache": cache, "key": None if key is None else str(key)})
+    sql = "SELECT pg_notify(%s, %s)"
+    if conn is not None:
+        with conn.cursor() as cur:
+            cur.execute(sql, (CACHE_INVALIDATION_CHANNEL, payload))
+        return
+
+    pool = get_pool()
+    if not pool:
+        return
+    with pool.connection("cache_invalidation_publish") as pooled, pooled.cursor() as cur:
+        cur.execute(sql, (CACHE_INVALIDATION_CHANNEL, payload))
+
+
+class InvalidationBus:
+    """Background LISTEN loop dispatching invalidations to registered caches"""
+
+    def __init__(self, channel: str = CACHE_INVALIDATION_CHANNEL, ping_interval: float = CACHE_INVALIDATION_PING_SECONDS):
+        self.channel = channel
+        self.ping_interval = ping_interval
+
+        self._caches: Dict[str, Callable[[Optional[str]], None]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.connected = False
+
+        # Counters
+        self.received = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def register(self, cache: str, evict: Callable[[Optional[str]], None]):
+        """evict(key) drops one entry as a string key, or everything when key is None"""
+        with self._lock:
+            self._caches[cache] = evict
+
+    def flush_all(self, reason: str = ""):
+        """Empty every registered cache"""
+        with self._lock:
+            caches = list(self._caches.items())
+            self.flushes += 1
+        for name, evict in caches:
+            try:
+                evict(None)
+            except Exception as e:
+                logger.warning(f"Flushing cache {name} failed: {e}")
+        if reason:
+            logger.info(f"Flushed {len(caches)} caches ({reason})")
+
+    def dispatch(self, payload: str):
+        """Apply one notification payload"""
+        try:
+            message = json.loads(payload)
+            name, key = message["cache"], message.get("key")
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed cache invalidation: {payload[:200]!r}")
+            return
+
+        with self._lock:
+            self.received += 1
+            evict = self._caches.get(name)
+        if evict is None:
+            return
+        try:
+            evict(key)
+            with self._lock:
+                self.evictions += 1
+        except Exception as e:
+            logger.warning(f"Evicting {key!r} from cache {name} failed: {e}")
+
+    def start(self):
+        """Start the listener thread if it is not running"""
+        if get_pool() is None:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="cache-invalidation-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _connect(self):
+        conn = psycopg2.connect(get_pool().dsn)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _run(self):
+        delay = 1.0
+        first = True
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.connected = True
+                delay = 1.0
+                # Anything sent while we were not listening is gone
+                self.flush_all("listener connected" if first else "listener reconnected")
+                first = False
+                self._listen(conn)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    if not first:
+                        self.reconnects += 1
+                logger.warning(f"Cache invalidation listener lost its connection, retrying in {delay:.0f}s: {e}")
+            finally:
+                self.connected = False
+                if conn is not None and not conn.closed:
+                    conn.close()
+            if self._stopping.wait(delay):
+                return
+            delay = min(delay * 2, CACHE_INVALIDATION_MAX_BACKOFF)
+
+    def _listen(self, conn):
+        idle = 0.0
+        while not self._stopping.is_set():
+            # Short waits so stop() is noticed quickly
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                idle += 1.0
+                if idle >= self.ping_interval:
+                    idle = 0.0
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                continue
+            idle = 0.0
+            conn.poll()
+            while conn.notifies:
+                self.dispatch(conn.notifies.pop(0).payload)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "channel": self.channel,
+                "connected": self.connected,
+                "caches": sorted(self._caches),
+                "received": self.received,
+                "evictions": self.evictions,
+                "flushes": self.flushes,
+                "reconnects": self.reconnects,
+                "errors": self.errors,
+            }
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,254 @@
+"""
+Application startup/shutdown phases and health probes
+
+Importing the app modules does no I/O. Each FastAPI app gets a Lifecycle
+whose lifespan runs, in order:
+
+1. workers  start the background writers (last_login, API metering);
+            they only buffer in memory until the database is reachable
+2. pools    open the primary, replica and shard pools and check they answer
+3. schema   compare backend/migrations with schema_migrations
+            (MIGRATIONS_ON_STARTUP: off | warn | require | apply)
+4. warmup   prepare statements on the idle connections and run any
+            registered warmup callbacks (e.g. caches)
+
+Shutdown runs the reverse: stop accepting work, flush the writers, close
+the pools. If the database is unreachable at boot the app still starts,
+reports not ready on /health/ready, and keeps retrying in the background.
+/health/live only says the process is serving requests.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Callable, List
+
+import psycopg2
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from db_pool import get_pool, replica_pools
+from prepared_statements import prepare_connection
+from shards import shard_router
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_ON_STARTUP = os.getenv("MIGRATIONS_ON_STARTUP", "warn")
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+
+
+class Lifecycle:
+    """Startup phases, shutdown and liveness/readiness for one FastAPI app"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases = {}
+        self.ready = False
+        self.started_at = None
+        self.error = None
+
+        self._warmups: List[Callable] = []
+        self._workers = []
+        self._retry_task = None
+        self._last_ping = (0.0, False)
+
+        self.router = APIRouter()
+        self.router.add_api_route("/health/live", self.live, methods=["GET"])
+        self.router.add_api_route("/health/ready", self.readiness, methods=["GET"])
+
+    def add_warmup(self, callback: Callable):
+        """Register callback() to run (in a worker thread) during the warmup phase"""
+        self._warmups.append(callback)
+
+    def add_worker(self, worker):
+        """Register a background writer with start()/stop() methods"""
+        self._workers.append(worker)
+
+    # ------------------------------------------------------------------ phases
+
+    def _phase(self, name: str, func: Callable):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            self.phases[name] = {"status": "failed", "error": str(e),
+                                 "ms": round((time.perf_counter() - start) * 1000, 1)}
+            raise
+        self.phases[name] = {"status": "ok", "ms": round((time.perf_counter() - start) * 1000, 1)}
+        if result is not None:
+            self.phases[name]["detail"] = result
+        return result
+
+    def _open_pools(self):
+        pool = get_pool()
+        if not pool:
+            logger.warning("No database connection URL configured, running without a database")
+            return "no database configured"
+        self._ping_pool(pool)
+        opened = [pool.name]
+        # Replicas are optional: reads fall back to the primary when one is down
+        for replica in replica_pools:
+            try:
+                self._ping_pool(replica)
+                opened.append(replica.name)
+            except psycopg2.Error as e:
+                logger.warning(f"{replica.name} unavailable at startup: {e}")
+        # A shard that is down only affects the users on it
+        for shard in shard_router.shards.values():
+            if shard is pool:
+                continue
+            try:
+                self._ping_pool(shard)
+                opened.append(shard.name)
+            except psycopg2.Error as e:
+                logger.warning(f"{shard.name} unavailable at startup: {e}")
+        return {"pools": opened}
+
+    @staticmethod
+    def _ping_pool(pool):
+        pool.open()
+        with pool.connection("startup_ping") as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    def _check_schema(self):
+        pool = get_pool()
+        if not pool or MIGRATIONS_ON_STARTUP == "off":
+            return "skipped"
+
+        # Imported here so the runner's file discovery only happens when asked for
+        from schema_migrations import pending_migrations, run_migrations
+
+        if MIGRATIONS_ON_STARTUP == "apply":
+            conn = psycopg2.connect(pool.dsn)
+            try:
+                applied = run_migrations(conn)
+            finally:
+                conn.close()
+            return {"applied": [repr(m) for m in applied]}
+
+        with pool.connection("startup_schema_check") as conn:
+            pending = [repr(m) for m in pending_migrations(conn)]
+        if pending and MIGRATIONS_ON_STARTUP == "require":
+            raise RuntimeError(f"Pending migrations: {', '.join(pending)}")
+        if pending:
+            logger.warning(f"Database schema is behind, pending migrations: {', '.join(pending)}")
+        return {"pending": pending}
+
+    def _warmup(self):
+        pool = get_pool()
+        warmed = 0
+        if pool:
+            # Hold min_size connections at once so each one gets prepared
+            for p in [pool] + [r for r in replica_pools if r.is_open]:
+                conns = []
+                try:
+                    for _ in range(p.min_size):
+                        conns.append(p.getconn())
+                    for conn in conns:
+                        prepare_connection(conn)
+                        warmed += 1
+                finally:
+                    for conn in conns:
+                        p.putconn(conn)
+        for callback in self._warmups:
+            callback()
+        return {"connections": warmed, "callbacks": len(self._warmups)}
+
+    def _start_workers(self):
+        for worker in self._workers:
+            worker.start()
+        return {"workers": len(self._workers)}
+
+    def _start(self):
+        self._phase("pools", self._open_pools)
+        self._phase("schema", self._check_schema)
+        self._phase("warmup", self._warmup)
+
+    async def _retry_start(self):
+        while not self.ready:
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+            try:
+                await run_in_threadpool(self._start)
+            except Exception as e:
+                self.error = str(e)
+                logger.warning(f"{self.name} startup retry failed: {e}")
+                continue
+            self.ready, self.error = True, None
+            logger.info(f"{self.name} is ready")
+
+    async def startup(self):
+        self.started_at = time.time()
+        # Writers buffer in memory, so they can run before the database is reachable
+        self._phase("workers", self._start_workers)
+        try:
+            await run_in_threadpool(self._start)
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"{self.name} startup incomplete, retrying every {STARTUP_RETRY_SECONDS}s: {e}")
+            self._retry_task = asyncio.create_task(self._retry_start())
+            return
+        self.ready = True
+        logger.info(f"{self.name} is ready")
+
+    async def shutdown(self):
+        self.ready = False
+        if self._retry_task:
+            self._retry_task.cancel()
+
+        # Flush buffered writes while the pools are still open
+        for worker in reversed(self._workers):
+            try:
+                await run_in_threadpool(worker.stop)
+            except Exception as e:
+                logger.warning(f"Stopping {type(worker).__name__} failed: {e}")
+
+        shard_router.close()
+        for pool in replica_pools + ([get_pool()] if get_pool() else []):
+            pool.close()
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.startup()
+        try:
+            yield
+        finally:
+            await self.shutdown()
+
+    # ------------------------------------------------------------------ probes
+
+    def live(self):
+        """Liveness: the process is up and serving requests"""
+        return {"status": "ok", "service": self.name}
+
+    def _ping(self) -> bool:
+        pool = get_pool()
+        if not pool:
+            return True
+        try:
+            with pool.connection("readiness_ping") as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Readiness ping failed: {e}")
+            return False
+
+    async def readiness(self):
+        """Readiness: startup finished and the database answers"""
+        checked_at, ok = self._last_ping
+        if time.monotonic() - checked_at > READINESS_CACHE_SECONDS:
+            ok = await run_in_threadpool(self._ping) if self.ready else False
+            self._last_ping = (time.monotonic(), ok)
+
+        body = {
+            "status": "ready" if self.ready and ok else "not_ready",
+            "service": self.name,
+            "database": ("up" if ok else "down") if get_pool() else "not configured",
+            "phases": self.phases,
+        }
+        if self.error:
+            body["error"] = self.error
+        return JSONResponse(body, status_code=200 if self.ready and ok else 503)
@@ -0,0 +1,140 @@
+"""
+Write-behind buffer for users.last_login
+
+Logins record the latest login time per user in memory. A background thread
+flushes the buffer with one batched UPDATE every LAST_LOGIN_FLUSH_SECONDS, or
+sooner once LAST_LOGIN_FLUSH_MAX users are pending, and once more on shutdown.
+Repeated logins by the same user between flushes collapse into a single write.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "5"))
+LAST_LOGIN_FLUSH_MAX = int(os.getenv("LAST_LOGIN_FLUSH_MAX", "500"))
+
+FLUSH_SQL = """
+    UPDATE users SET last_login = v.last_login
+    FROM (VALUES %s) AS v(id, last_login)
+    WHERE users.id = v.id
+      AND (users.last_login IS NULL OR users.last_login < v.last_login)
+"""
+
+
+class LastLoginBuffer:
+    """Coalesces last_login updates and writes them in batches"""
+
+    def __init__(self, flush_interval: float = LAST_LOGIN_FLUSH_SECONDS, max_pending: int = LAST_LOGIN_FLUSH_MAX):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.recorded = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+
+    def record(self, user_id: int, when: datetime = None):
+        """Remember that user_id logged in at `when` (default: now)"""
+        when = when or datetime.now(timezone.utc)
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is not None:
+                self.coalesced += 1
+            if previous is None or when > previous:
+                self._pending[user_id] = when
+            self.recorded += 1
+            pending = len(self._pending)
+
+        self.start()
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write every pending login time in one UPDATE; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            pool = get_pool()
+            if not pool:
+                return 0
+
+            try:
+                with pool.connection("last_login_flush") as conn, conn.cursor() as cur:
+                    execute_values(cur, FLUSH_SQL, list(batch.items()), page_size=len(batch))
+                    written = cur.rowcount
+            except Exception as e:
+                # Put the batch back, keeping any newer login recorded meanwhile
+                with self._lock:
+                    for user_id, when in batch.items():
+                        if user_id not in self._pending or self._pending[user_id] < when:
+                            self._pending[user_id] = when
+                    self.failures += 1
+                logger.warning(f"last_login flush of {len(batch)} users failed: {e}")
+                return 0
+
+            with self._lock:
+                self.flushes += 1
+                self.rows_written += written
+            return written
+
+    def start(self):
+        """Start the background flusher if it is not running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "recorded": self.recorded,
+                "coalesced": self.coalesced,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "failures": self.failures,
+            }
+
+
+last_login_buffer = LastLoginBuffer()
+atexit.register(last_login_buffer.stop)
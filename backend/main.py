@@ -1,24 +1,57 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, Query, Request, Body
+import csv
+import hashlib
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Body, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import Optional, List
 import stripe
 import psycopg2
+from psycopg2.errors import QueryCanceled
+from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 from database import (
     create_user, get_user_by_email, create_deed, get_user_deeds
 )
-from ai_assist import ai_router
+from ai_assist import ai_router, prune_ai_suggestions
+from db_pool import get_db, get_read_db, get_pool, pool_stats, mark_recent_write, client_key
+from prepared_statements import execute_prepared
+from login_tracker import last_login_buffer
+from metering import UsageMeteringMiddleware, usage_meter
+from lifecycle import Lifecycle
+from query_budget import QueryBudgetMiddleware, QueryBudgetExceeded
+from plan_limits import plan_limits_cache, upsert_plan_limits, DEFAULT_PLAN_LIMITS
+from invalidation import invalidation_bus, publish
+from shared_cache import shared_cache_tier, user_plan_cache, shared_cache_stats
+from pagination import keyset_clause, build_page, estimate_count, merge_pages
+from shards import shard_router, get_shard_db, get_shard_read_db, is_shard_moved
+from search import search_users, search_deeds
+from deed_export import export_deeds, EXPORT_FORMATS
+from deed_import import validate_upload, load_deeds, text_stream, ImportFormatError
 from auth import (
     get_password_hash, verify_password, create_access_token, 
-    get_current_user_id, get_current_user_email, AuthUtils
+    get_current_user_id, get_current_user_email, user_id_from_headers, AuthUtils
 )
 
 load_dotenv()
 
-app = FastAPI(title="DeedPro API", version="1.0.0")
+# Pools, schema check, warmup and background writers start in the lifespan, not on import
+lifecycle = Lifecycle("DeedPro API")
+lifecycle.add_worker(last_login_buffer)
+lifecycle.add_worker(usage_meter)
+lifecycle.add_worker(invalidation_bus)
+lifecycle.add_worker(shared_cache_tier)
+lifecycle.add_warmup(plan_limits_cache.load)
+lifecycle.add_warmup(prune_ai_suggestions)
+
+app = FastAPI(title="DeedPro API", version="1.0.0", lifespan=lifecycle.lifespan)
+
+# Liveness and readiness probes
+app.include_router(lifecycle.router)
 
 # Include AI assistance router
 app.include_router(ai_router)
@@ -32,18 +65,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record every request into api_usage (buffered, written in the background)
+app.add_middleware(UsageMeteringMiddleware, meter=usage_meter, user_resolver=user_id_from_headers)
+
+# Per-route statement_timeout and statement count for every pooled connection a request uses
+app.add_middleware(QueryBudgetMiddleware)
+
+# Handlers that catch Exception re-raise these first so they still become 503s
+QUERY_BUDGET_ERRORS = (QueryBudgetExceeded, QueryCanceled)
+
+@app.exception_handler(QueryBudgetExceeded)
+@app.exception_handler(QueryCanceled)
+async def query_budget_exceeded(request: Request, exc: Exception):
+    return JSONResponse(status_code=503, content={"detail": "The request took too long, please retry or narrow it down"})
+
 # Stripe configuration
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
-# Database connection
-DB_URL = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
-if DB_URL:
-    conn = psycopg2.connect(DB_URL)
-else:
-    conn = None
-    print("Warning: No database connection URL found")
-
 # Pydantic models
 class UserCreate(BaseModel):
     email: str
@@ -71,13 +110,15 @@ class AdminUserUpdate(BaseModel):
 
 class DeedCreate(BaseModel):
     deed_type: str
-    property_address: Optional[str] = None
+    # deeds declares these NOT NULL (see deed_import.REQUIRED_COLUMNS)
+    property_address: str
+    grantor_name: str
     apn: Optional[str] = None
     county: Optional[str] = None
     legal_description: Optional[str] = None
     owner_type: Optional[str] = None
     sales_price: Optional[float] = None
-    grantee_name: Optional[str] = None
+    grantee_name: str
     vesting: Optional[str] = None
 
 class PaymentMethodCreate(BaseModel):
@@ -148,7 +189,7 @@ def health():
 # ============================================================================
 
 @app.post("/users/register")
-async def register_user(user: UserRegister = Body(...)):
+def register_user(user: UserRegister = Body(...), conn=Depends(get_db)):
     """Register a new user with comprehensive validation"""
     try:
         # Validation
@@ -197,23 +238,22 @@ async def register_user(user: UserRegister = Body(...)):
     except psycopg2.IntegrityError:
         conn.rollback()
         raise HTTPException(status_code=400, detail="Email already exists")
+    except QUERY_BUDGET_ERRORS:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @app.post("/users/login")
-async def login_user(credentials: UserLogin = Body(...)):
+def login_user(credentials: UserLogin = Body(...), conn=Depends(get_db)):
     """Authenticate user and return JWT token"""
     try:
         if not conn:
             raise HTTPException(status_code=500, detail="Database connection not available")
         
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id, password_hash, full_name, plan, is_active 
-                FROM users WHERE email = %s
-            """, (credentials.email.lower(),))
+            execute_prepared(cur, "users_login_lookup", (credentials.email.lower(),))
             user = cur.fetchone()
         
         if not user:
@@ -227,10 +267,8 @@ async def login_user(credentials: UserLogin = Body(...)):
         if not verify_password(credentials.password, password_hash):
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
-        # Update last login
-        with conn.cursor() as cur:
-            cur.execute("UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s", (user_id,))
-            conn.commit()
+        # Update last login (buffered and written in batches)
+        last_login_buffer.record(user_id)
         
         # Create access token
         access_token = create_access_token(
@@ -250,37 +288,63 @@ async def login_user(credentials: UserLogin = Body(...)):
         
     except HTTPException:
         raise
+    except QUERY_BUDGET_ERRORS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
+def profile_etag(user_id: int, updated_at, plan: str, last_login) -> str:
+    """Strong ETag for a profile: the user's version columns plus the plan limits in effect"""
+    # Looking the plan up first reloads the limits if the cached copy is stale
+    plan_limits_cache.get(plan)
+    material = f"{user_id}:{updated_at}:{plan}:{last_login}:{plan_limits_cache.version}"
+    return '"' + hashlib.sha1(material.encode()).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+PROFILE_CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
 @app.get("/users/profile")
-async def get_user_profile(user_id: int = Depends(get_current_user_id)):
-    """Get current user's profile information"""
+def get_user_profile(request: Request, user_id: int = Depends(get_current_user_id), conn=Depends(get_read_db)):
+    """Get current user's profile information (conditional: answers If-None-Match with 304)"""
     try:
         if not conn:
             raise HTTPException(status_code=500, detail="Database connection not available")
         
+        # Revalidation costs one primary-key lookup and no serialization
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            with conn.cursor() as cur:
+                execute_prepared(cur, "users_profile_version", (user_id,))
+                version = cur.fetchone()
+            etag = profile_etag(user_id, *version) if version else None
+            if etag and etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, **PROFILE_CACHE_HEADERS})
+        
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id, email, full_name, role, company_name, company_type, 
-                       phone, state, plan, created_at, last_login
-                FROM users WHERE id = %s AND is_active = TRUE
-            """, (user_id,))
+            execute_prepared(cur, "users_profile", (user_id,))
             user = cur.fetchone()
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get plan limits
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT max_deeds_per_month, api_calls_per_month, ai_assistance, 
-                       integrations_enabled, priority_support
-                FROM plan_limits WHERE plan_name = %s
-            """, (user[8],))  # user[8] is plan
-            limits = cur.fetchone()
+        limits = plan_limits_cache.get(user[8]) or DEFAULT_PLAN_LIMITS
+        etag = profile_etag(user_id, user[11], user[8], user[10])
         
-        return {
+        profile = {
             "id": user[0],
             "email": user[1],
             "full_name": user[2],
@@ -292,22 +356,19 @@ async def get_user_profile(user_id: int = Depends(get_current_user_id)):
             "plan": user[8],
             "created_at": user[9],
             "last_login": user[10],
-            "plan_limits": {
-                "max_deeds_per_month": limits[0] if limits else 5,
-                "api_calls_per_month": limits[1] if limits else 100,
-                "ai_assistance": limits[2] if limits else True,
-                "integrations_enabled": limits[3] if limits else False,
-                "priority_support": limits[4] if limits else False
-            }
+            "plan_limits": dict(limits)
         }
+        return JSONResponse(jsonable_encoder(profile), headers={"ETag": etag, **PROFILE_CACHE_HEADERS})
         
     except HTTPException:
         raise
+    except QUERY_BUDGET_ERRORS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get profile: {str(e)}")
 
 @app.post("/users/upgrade")
-async def upgrade_plan(req: UpgradeRequest, user_id: int = Depends(get_current_user_id)):
+def upgrade_plan(req: UpgradeRequest, user_id: int = Depends(get_current_user_id), conn=Depends(get_db)):
     """Initiate plan upgrade via Stripe Checkout"""
     try:
         if not conn:
@@ -366,6 +427,8 @@ async def upgrade_plan(req: UpgradeRequest, user_id: int = Depends(get_current_u
         
     except stripe.error.StripeError as e:
         raise HTTPException(status_code=400, detail=f"Stripe error: {str(e)}")
+    except QUERY_BUDGET_ERRORS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upgrade failed: {str(e)}")
 
@@ -390,51 +453,62 @@ async def stripe_webhook(request: Request):
         raise HTTPException(status_code=400, detail="Invalid signature")
     
     try:
+        # Database work is blocking, keep it off the event loop
+        await run_in_threadpool(apply_stripe_event, event)
+        return {"status": "success"}
+        
+    except Exception as e:
+        print(f"Webhook error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Webhook processing failed")
+
+def apply_stripe_event(event):
+    """Apply a verified Stripe event to the database using a pooled connection"""
+    pool = get_pool()
+    if not pool:
+        return
+    
+    changed_users = []
+    with pool.connection() as conn:
         if event['type'] == 'checkout.session.completed':
             session = event['data']['object']
             user_id = int(session['client_reference_id'])
             plan = session['metadata']['plan']
             
             # Update user plan in database
-            if conn:
-                with conn.cursor() as cur:
-                    cur.execute("UPDATE users SET plan = %s WHERE id = %s", (plan, user_id))
-                    conn.commit()
+            with conn.cursor() as cur:
+                cur.execute("UPDATE users SET plan = %s WHERE id = %s", (plan, user_id))
+            changed_users.append(user_id)
         
         elif event['type'] == 'invoice.payment_succeeded':
             invoice = event['data']['object']
             customer_id = invoice['customer']
             
             # Update subscription status
-            if conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE users SET updated_at = CURRENT_TIMESTAMP 
-                        WHERE stripe_customer_id = %s
-                    """, (customer_id,))
-                    conn.commit()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE users SET updated_at = CURRENT_TIMESTAMP 
+                    WHERE stripe_customer_id = %s
+                """, (customer_id,))
         
         elif event['type'] == 'customer.subscription.deleted':
             subscription = event['data']['object']
             customer_id = subscription['customer']
             
             # Downgrade to free plan
-            if conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE users SET plan = 'free' 
-                        WHERE stripe_customer_id = %s
-                    """, (customer_id,))
-                    conn.commit()
-        
-        return {"status": "success"}
-        
-    except Exception as e:
-        print(f"Webhook error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Webhook processing failed")
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE users SET plan = 'free' 
+                    WHERE stripe_customer_id = %s
+                    RETURNING id
+                """, (customer_id,))
+                changed_users.extend(row[0] for row in cur.fetchall())
+    
+    # Committed; quota checks must see the new plan right away
+    for user_id in changed_users:
+        user_plan_cache.invalidate(user_id)
 
 @app.post("/payments/create-portal-session")
-async def create_portal_session(user_id: int = Depends(get_current_user_id)):
+def create_portal_session(user_id: int = Depends(get_current_user_id), conn=Depends(get_db)):
     """Create Stripe customer portal session for subscription management"""
     try:
         if not conn:
@@ -456,6 +530,8 @@ async def create_portal_session(user_id: int = Depends(get_current_user_id)):
         
     except stripe.error.StripeError as e:
         raise HTTPException(status_code=400, detail=f"Stripe error: {str(e)}")
+    except QUERY_BUDGET_ERRORS:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Portal session creation failed: {str(e)}")
 
@@ -465,53 +541,73 @@ async def create_portal_session(user_id: int = Depends(get_current_user_id)):
 
 def check_plan_limits(user_id: int, action: str = "deed_creation") -> dict:
     """Check if user has reached plan limits"""
-    if not conn:
+    pool = get_pool()
+    if not pool:
         return {"allowed": True, "message": "Database not available"}
     
     try:
-        with conn.cursor() as cur:
-            # Get user plan
-            cur.execute("SELECT plan FROM users WHERE id = %s", (user_id,))
-            result = cur.fetchone()
-            if not result:
-                return {"allowed": False, "message": "User not found"}
+        # One checkout serves both reads: the plan comes from the shared cache (falling
+        # back to this connection) and the limits from the per-worker cache; this month's
+        # counters change with every deed and API call, so they are read fresh
+        with pool.connection() as conn, conn.cursor() as cur:
+            def load_plan():
+                execute_prepared(cur, "user_plan", (user_id,))
+                row = cur.fetchone()
+                return row[0] if row else None
             
-            plan = result[0]
-            
-            # Get plan limits
-            cur.execute("""
-                SELECT max_deeds_per_month, api_calls_per_month 
-                FROM plan_limits WHERE plan_name = %s
-            """, (plan,))
-            limits = cur.fetchone()
+            plan = user_plan_cache.get_or_load(user_id, load_plan)
+            if plan is None:
+                return {"allowed": False, "message": "User not found"}
             
+            limits = plan_limits_cache.get(plan)
             if not limits:
                 return {"allowed": True, "message": "No limits configured"}
+            max_deeds, max_api_calls = limits["max_deeds_per_month"], limits["api_calls_per_month"]
             
-            max_deeds, max_api_calls = limits
-            
-            if action == "deed_creation" and max_deeds > 0:
-                # Check monthly deed count
-                cur.execute("""
-                    SELECT COUNT(*) FROM deeds 
-                    WHERE user_id = %s AND created_at >= DATE_TRUNC('month', CURRENT_DATE)
-                """, (user_id,))
-                deed_count = cur.fetchone()[0]
-                
-                if deed_count >= max_deeds:
-                    return {
-                        "allowed": False, 
-                        "message": f"Monthly deed limit reached ({max_deeds}). Upgrade your plan for unlimited deeds.",
-                        "current_usage": deed_count,
-                        "limit": max_deeds
-                    }
-            
-            return {"allowed": True, "message": "Within limits"}
-            
+            execute_prepared(cur, "monthly_usage_counters", (user_id,))
+            counters = cur.fetchone()
+        deed_count, api_call_count = counters if counters else (0, 0)
+        
+        # Deed counters live next to the deeds, which may be on another shard
+        if action == "deed_creation" and shard_router.enabled:
+            shard_count = shard_router.monthly_deed_count(user_id)
+            if shard_count is not None:
+                deed_count = shard_count
+        
+        if action == "deed_creation" and max_deeds > 0:
+            if deed_count >= max_deeds:
+                return {
+                    "allowed": False, 
+                    "message": f"Monthly deed limit reached ({max_deeds}). Upgrade your plan for unlimited deeds.",
+                    "current_usage": deed_count,
+                    "limit": max_deeds
+                }
+        
+        if action == "api_call" and max_api_calls > 0:
+            if api_call_count >= max_api_calls:
+                return {
+                    "allowed": False,
+                    "message": f"Monthly API call limit reached ({max_api_calls}). Upgrade your plan for more API calls.",
+                    "current_usage": api_call_count,
+                    "limit": max_api_calls
+                }
+        
+        return {"allowed": True, "message": "Within limits"}
+        
+    except QUERY_BUDGET_ERRORS:
+        # Failing open here would let a timed-out check through
+        raise
     except Exception as e:
         print(f"Limit check error: {str(e)}")
         return {"allowed": True, "message": "Limit check failed, allowing action"}
 
+def enforce_api_quota(user_id: int = Depends(get_current_user_id)) -> int:
+    """Reject the request once the user's monthly API call allowance is used up"""
+    result = check_plan_limits(user_id, "api_call")
+    if not result["allowed"]:
+        raise HTTPException(status_code=429, detail=result["message"])
+    return user_id
+
 # ============================================================================
 # ADMIN ENDPOINTS - Platform Management
 # ============================================================================
@@ -551,85 +647,63 @@ def admin_dashboard():
 
 @app.get("/admin/users")
 def admin_list_all_users(
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
     limit: int = Query(50, ge=1, le=100),
     search: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = Query(None, pattern="^(active|inactive)$"),
+    plan: Optional[str] = None,
+    conn=Depends(get_read_db)
 ):
-    """List all users with pagination and filtering"""
+    """List all users with keyset pagination and filtering"""
     if not verify_admin():
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Mock user data - in production, query from database
-    all_users = [
-        {
-            "id": 1,
-            "email": "john@example.com",
-            "first_name": "John",
-            "last_name": "Doe",
-            "username": "johndoe",
-            "city": "Los Angeles",
-            "country": "USA",
-            "created_at": "2024-01-01T00:00:00Z",
-            "last_login": "2024-01-15T09:30:00Z",
-            "is_active": True,
-            "subscription_plan": "pro",
-            "subscription_status": "active",
-            "total_deeds": 12,
-            "monthly_revenue": 29.99
-        },
-        {
-            "id": 2,
-            "email": "jane@company.com",
-            "first_name": "Jane",
-            "last_name": "Smith",
-            "username": "janesmith",
-            "city": "San Francisco",
-            "country": "USA",
-            "created_at": "2024-01-05T00:00:00Z",
-            "last_login": "2024-01-14T15:20:00Z",
-            "is_active": True,
-            "subscription_plan": "basic",
-            "subscription_status": "active",
-            "total_deeds": 8,
-            "monthly_revenue": 9.99
-        },
-        {
-            "id": 3,
-            "email": "bob@firm.com",
-            "first_name": "Bob",
-            "last_name": "Wilson",
-            "username": "bobwilson",
-            "city": "Chicago",
-            "country": "USA",
-            "created_at": "2024-01-10T00:00:00Z",
-            "last_login": "2024-01-13T11:45:00Z",
-            "is_active": False,
-            "subscription_plan": "free",
-            "subscription_status": "cancelled",
-            "total_deeds": 3,
-            "monthly_revenue": 0.00
-        }
-    ]
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
     
-    # Apply filters (in production, use database queries)
-    filtered_users = all_users
-    if search:
-        filtered_users = [u for u in filtered_users if search.lower() in u['email'].lower() or search.lower() in f"{u['first_name']} {u['last_name']}".lower()]
+    # Filters line up with the (is_active|plan, created_at, id) indexes
+    filters, params = [], []
     if status:
-        filtered_users = [u for u in filtered_users if u['subscription_status'] == status]
+        filters.append("is_active = %s")
+        params.append(status == "active")
+    if plan:
+        filters.append("plan = %s")
+        params.append(plan)
     
-    # Pagination
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_users = filtered_users[start:end]
+    # Search results are ranked by similarity and capped rather than paginated
+    if search:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            users = search_users(cur, search, filters, params, limit)
+        return {
+            "users": users,
+            "limit": limit,
+            "next_cursor": None,
+            "prev_cursor": None,
+            "total_estimate": len(users)
+        }
+    
+    where = " AND ".join(filters) or "TRUE"
     
+    keyset, keyset_params, order_by, direction = keyset_clause(cursor)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT id, email, full_name, role, company_name, state, plan,
+                   is_active, created_at, last_login
+            FROM users
+            WHERE {where} {keyset}
+            {order_by}
+            LIMIT %s
+        """, params + keyset_params + [limit + 1])
+        rows = [dict(row) for row in cur.fetchall()]
+        total_estimate = estimate_count(cur, f"SELECT 1 FROM users WHERE {where}", params)
+    
+    users, next_cursor, prev_cursor = build_page(rows, limit, cursor, direction)
     return {
-        "users": paginated_users,
-        "total": len(filtered_users),
-        "page": page,
+        "users": users,
         "limit": limit,
-        "total_pages": (len(filtered_users) + limit - 1) // limit
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "total_estimate": total_estimate
     }
 
 @app.get("/admin/users/{user_id}")
@@ -699,69 +773,146 @@ def admin_delete_user(user_id: int):
         "message": f"User {user_id} has been deactivated"
     }
 
+@app.get("/admin/plan-limits")
+def admin_list_plan_limits():
+    """Plan limits as currently served by this worker"""
+    if not verify_admin():
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"plans": plan_limits_cache.all(), "cache": plan_limits_cache.stats()}
+
+@app.put("/admin/plan-limits/{plan_name}")
+def admin_upsert_plan_limits(plan_name: str, limits: PlanLimits, conn=Depends(get_db)):
+    """Create or update a plan's limits (admin only)"""
+    if not verify_admin():
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
+    
+    with conn.cursor() as cur:
+        upsert_plan_limits(cur, [{"plan_name": plan_name, **limits.dict()}])
+    # Other workers hear about it once this commits
+    publish("plan_limits", conn=conn)
+    conn.commit()
+    plan_limits_cache.invalidate()
+    
+    return {
+        "success": True,
+        "plan_name": plan_name,
+        "plan_limits": plan_limits_cache.get(plan_name)
+    }
+
 @app.get("/admin/deeds")
 def admin_list_all_deeds(
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
     limit: int = Query(50, ge=1, le=100),
     status: Optional[str] = None,
-    user_id: Optional[int] = None
+    user_id: Optional[int] = None,
+    conn=Depends(get_read_db)
 ):
-    """List all deeds across all users"""
+    """List all deeds across all users with keyset pagination"""
     if not verify_admin():
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Mock deed data - in production, query from database
-    all_deeds = [
-        {
-            "id": 1,
-            "user_id": 1,
-            "user_email": "john@example.com",
-            "user_name": "John Doe",
-            "deed_type": "Quitclaim Deed",
-            "property_address": "123 Main St, Los Angeles, CA",
-            "apn": "123-456-789",
-            "status": "completed",
-            "created_at": "2024-01-10T00:00:00Z",
-            "completed_at": "2024-01-12T00:00:00Z",
-            "recorded": True,
-            "shared_count": 2,
-            "approval_count": 1
-        },
-        {
-            "id": 2,
-            "user_id": 2,
-            "user_email": "jane@company.com",
-            "user_name": "Jane Smith",
-            "deed_type": "Grant Deed",
-            "property_address": "456 Oak Ave, Beverly Hills, CA",
-            "apn": "987-654-321",
-            "status": "draft",
-            "created_at": "2024-01-14T00:00:00Z",
-            "completed_at": None,
-            "recorded": False,
-            "shared_count": 0,
-            "approval_count": 0
-        }
-    ]
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
     
-    # Apply filters
-    filtered_deeds = all_deeds
+    # Filters line up with the (status|user_id, created_at, id) indexes
+    filters, params = [], []
     if status:
-        filtered_deeds = [d for d in filtered_deeds if d['status'] == status]
+        filters.append("d.status = %s")
+        params.append(status)
     if user_id:
-        filtered_deeds = [d for d in filtered_deeds if d['user_id'] == user_id]
+        filters.append("d.user_id = %s")
+        params.append(user_id)
+    where = " AND ".join(filters) or "TRUE"
     
-    # Pagination
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_deeds = filtered_deeds[start:end]
+    keyset, keyset_params, order_by, direction = keyset_clause(cursor, "d")
     
+    def fetch(shard_conn):
+        with shard_conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT d.id, d.user_id, d.deed_type, d.property_address, d.grantee_name, d.status,
+                       d.created_at, d.completed_at
+                FROM deeds d
+                WHERE {where} {keyset}
+                {order_by}
+                LIMIT %s
+            """, params + keyset_params + [limit + 1])
+            rows = [dict(row) for row in cur.fetchall()]
+            return rows, estimate_count(cur, f"SELECT 1 FROM deeds d WHERE {where}", params)
+    
+    # Deeds may be spread over shards: page each one and merge on (created_at, id)
+    if not shard_router.enabled:
+        pages = [fetch(conn)]
+    elif user_id:
+        with shard_router.pool_for(user_id).connection("admin_list_deeds") as shard_conn:
+            pages = [fetch(shard_conn)]
+    else:
+        pages = shard_router.scatter(fetch, "admin_list_deeds")
+    rows = merge_pages([page for page, _ in pages], limit, direction)
+    total_estimate = sum(estimate for _, estimate in pages)
+    
+    # Owners live on the primary only
+    owner_ids = list({row["user_id"] for row in rows if row["user_id"] is not None})
+    owners = {}
+    if owner_ids:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT id, email, full_name FROM users WHERE id = ANY(%s)", (owner_ids,))
+            owners = {row["id"]: row for row in cur.fetchall()}
+    for row in rows:
+        owner = owners.get(row["user_id"], {})
+        row["user_email"] = owner.get("email")
+        row["user_name"] = owner.get("full_name")
+    
+    deeds, next_cursor, prev_cursor = build_page(rows, limit, cursor, direction)
     return {
-        "deeds": paginated_deeds,
-        "total": len(filtered_deeds),
+        "deeds": deeds,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "total_estimate": total_estimate
+    }
+
+@app.get("/admin/deeds/search")
+def admin_search_deeds(
+    q: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: Optional[int] = None,
+    conn=Depends(get_read_db)
+):
+    """Full-text search over all deeds, optionally for one user"""
+    if not verify_admin():
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
+    
+    offset = (page - 1) * limit
+    if not shard_router.enabled:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            rows = search_deeds(cur, q, user_id, limit, offset)
+    elif user_id:
+        with shard_router.pool_for(user_id).connection("admin_search_deeds") as shard_conn:
+            with shard_conn.cursor(cursor_factory=RealDictCursor) as cur:
+                rows = search_deeds(cur, q, user_id, limit, offset)
+    else:
+        # Every shard's top offset + limit, merged on rank
+        def fetch(shard_conn):
+            with shard_conn.cursor(cursor_factory=RealDictCursor) as cur:
+                return search_deeds(cur, q, None, offset + limit, 0)
+        
+        merged = sorted((row for rows in shard_router.scatter(fetch, "admin_search_deeds") for row in rows),
+                        key=lambda row: (row["rank"], row["id"]), reverse=True)
+        rows = merged[offset:offset + limit + 1]
+    
+    return {
+        "results": rows[:limit],
         "page": page,
         "limit": limit,
-        "total_pages": (len(filtered_deeds) + limit - 1) // limit
+        "has_more": len(rows) > limit
     }
 
 @app.get("/admin/revenue")
@@ -858,7 +1009,11 @@ def admin_system_health():
         "timestamp": datetime.now().isoformat(),
         "services": {
             "api": {"status": "up", "response_time": "145ms"},
-            "database": {"status": "up", "connections": 23, "max_connections": 100},
+            "database": {"status": "up", "pools": pool_stats(), "last_login_buffer": last_login_buffer.stats(),
+                         "usage_meter": usage_meter.stats(), "shards": shard_router.stats(),
+                         "plan_limits_cache": plan_limits_cache.stats(),
+                         "cache_invalidation": invalidation_bus.stats(),
+                         "shared_cache": shared_cache_stats()},
             "stripe": {"status": "up", "last_webhook": "2024-01-15T09:45:00Z"},
             "email": {"status": "up", "queue_size": 5}
         },
@@ -880,8 +1035,10 @@ def admin_system_health():
 # ============================================================================
 
 @app.post("/users")
-def create_user_endpoint(user: UserCreate):
+def create_user_endpoint(user: UserCreate, request: Request):
     """Create a new user"""
+    mark_recent_write(client_key(request))
+    
     # Check if user already exists
     existing_user = get_user_by_email(user.email)
     if existing_user:
@@ -902,9 +1059,9 @@ def create_user_endpoint(user: UserCreate):
     return new_user
 
 @app.get("/users/{email}")
-def get_user_endpoint(email: str):
+def get_user_endpoint(email: str, request: Request):
     """Get user by email"""
-    user = get_user_by_email(email)
+    user = get_user_by_email(email, read_only=True, client=client_key(request))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -925,8 +1082,10 @@ def get_current_user():
 
 # Deed endpoints
 @app.post("/deeds")
-def create_deed_endpoint(deed: DeedCreate):
+def create_deed_endpoint(deed: DeedCreate, request: Request):
     """Create a new deed"""
+    mark_recent_write(client_key(request))
+    
     # In production, get user_id from JWT token
     user_id = 1  # Placeholder
     
@@ -938,6 +1097,46 @@ def create_deed_endpoint(deed: DeedCreate):
     
     return new_deed
 
+@app.post("/deeds/import")
+def import_deeds_endpoint(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    user_id: int = Depends(get_current_user_id),
+    conn=Depends(get_shard_db)
+):
+    """Bulk-load deeds from a CSV or NDJSON upload; invalid rows are skipped and reported"""
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
+    
+    if not format:
+        name = (file.filename or "").lower()
+        format = "ndjson" if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or "") else "csv"
+    
+    try:
+        copy_buffer, valid, total, error_count, errors = validate_upload(text_stream(file.file), format, DeedCreate)
+    except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read upload: {str(e)}")
+    
+    inserted = 0
+    try:
+        if valid:
+            inserted = load_deeds(conn, user_id, copy_buffer)
+            conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        if is_shard_moved(e):
+            raise HTTPException(status_code=503, detail="Your deeds are being moved, please retry shortly")
+        raise HTTPException(status_code=400, detail=f"Import failed, no rows were loaded: {str(e).strip()}")
+    finally:
+        copy_buffer.close()
+    
+    return {
+        "total_rows": total,
+        "imported": inserted,
+        "rejected": error_count,
+        "errors": errors
+    }
+
 @app.get("/deeds")
 def list_deeds_endpoint():
     """List all deeds for current user"""
@@ -992,6 +1191,52 @@ def list_available_deeds_for_sharing():
     ]
     return {"available_deeds": available_deeds}
 
+@app.get("/deeds/search")
+def search_deeds_endpoint(
+    q: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: int = Depends(enforce_api_quota),
+    conn=Depends(get_shard_read_db)
+):
+    """Full-text search over the current user's deeds (address, APN, parties, legal description)"""
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection not available")
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        rows = search_deeds(cur, q, user_id, limit, (page - 1) * limit)
+    
+    return {
+        "results": rows[:limit],
+        "page": page,
+        "limit": limit,
+        "has_more": len(rows) > limit
+    }
+
+@app.get("/deeds/export")
+def export_deeds_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[str] = None,
+    user_id: int = Depends(enforce_api_quota)
+):
+    """Stream all of the current user's deeds as NDJSON or CSV, oldest first; resume with since=<last cursor>"""
+    pool = shard_router.read_pool_for(user_id, client_key(request)) if get_pool() else None
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database connection not available")
+    
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    headers = {"Content-Disposition": f'attachment; filename="deeds.{format}"'}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    
+    return StreamingResponse(
+        export_deeds(pool, user_id, format, since=since, gzip=use_gzip),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers
+    )
+
 @app.get("/deeds/{deed_id}")
 def get_deed_endpoint(deed_id: int):
     """Get a specific deed"""
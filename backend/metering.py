@@ -0,0 +1,234 @@
+"""
+Batched API usage metering
+
+UsageMeteringMiddleware times every request and appends one record to an
+in-memory ring buffer; nothing on the request path touches the database.
+A background thread drains the buffer every METERING_FLUSH_SECONDS with one
+multi-row INSERT into api_usage that also bumps user_monthly_usage.api_calls
+in the same statement. When the buffer is full new records are dropped and
+counted rather than blocking the request. A batch the database rejects
+(say, a row for a user deleted since the request) is split in half and
+retried, so only the offending rows are lost.
+"""
+
+import os
+import time
+import atexit
+import logging
+import ipaddress
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db_pool import get_pool
+from usage_counters import INCREMENT_API_CALLS_FROM_CTE
+
+logger = logging.getLogger(__name__)
+
+METERING_ENABLED = os.getenv("METERING_ENABLED", "true").lower() != "false"
+METERING_FLUSH_SECONDS = float(os.getenv("METERING_FLUSH_SECONDS", "1"))
+METERING_BUFFER_SIZE = int(os.getenv("METERING_BUFFER_SIZE", "50000"))
+METERING_BATCH_SIZE = int(os.getenv("METERING_BATCH_SIZE", "5000"))
+# Paths that are not worth a row each (load balancer probes, docs)
+METERING_EXCLUDE_PATHS = tuple(
+    p.strip() for p in os.getenv("METERING_EXCLUDE_PATHS", "/health,/docs,/redoc,/openapi.json").split(",") if p.strip()
+)
+
+FLUSH_SQL = f"""
+    WITH logged AS (
+        INSERT INTO api_usage (user_id, endpoint, method, timestamp, response_time_ms, status_code, ip_address)
+        VALUES %s
+        RETURNING user_id, timestamp
+    )
+    {INCREMENT_API_CALLS_FROM_CTE}
+"""
+
+
+def _clean_ip(value: Optional[str]) -> Optional[str]:
+    """Client address if it parses as an IP (api_usage.ip_address is INET)"""
+    if not value:
+        return None
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+class UsageMeter:
+    """Bounded buffer of request records with a background drain to Postgres"""
+
+    def __init__(self, capacity: int = METERING_BUFFER_SIZE, flush_interval: float = METERING_FLUSH_SECONDS,
+                 batch_size: int = METERING_BATCH_SIZE):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.rows_failed = 0
+
+    def record(self, user_id: Optional[int], endpoint: str, method: str, started_at: datetime,
+               response_time_ms: int, status_code: int, ip_address: Optional[str]):
+        """Queue one request record; never blocks on the database"""
+        row = (user_id, endpoint[:255], method[:10], started_at, response_time_ms, status_code, _clean_ip(ip_address))
+        with self._lock:
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            self.recorded += 1
+        self.start()
+
+    def flush(self) -> int:
+        """Write everything buffered in batches of batch_size; returns rows written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    count = min(len(self._buffer), self.batch_size)
+                    batch = [self._buffer.popleft() for _ in range(count)]
+                if not batch:
+                    return written
+
+                pool = get_pool()
+                if not pool:
+                    with self._lock:
+                        self.rows_failed += len(batch)
+                    return written
+
+                try:
+                    batch_written = self._write(pool, batch)
+                except Exception as e:
+                    # Not retried: the database is unreachable or the pool is exhausted
+                    with self._lock:
+                        self.failures += 1
+                        self.rows_failed += len(batch)
+                    logger.warning(f"api_usage flush of {len(batch)} rows failed: {e}")
+                    return written
+
+                written += batch_written
+                with self._lock:
+                    self.flushes += 1
+                    self.rows_written += batch_written
+
+    def _write(self, pool, batch: list) -> int:
+        """Insert batch, bisecting it when rows are rejected; returns rows written"""
+        try:
+            with pool.connection("api_usage_flush") as conn, conn.cursor() as cur:
+                execute_values(cur, FLUSH_SQL, batch, page_size=len(batch))
+            return len(batch)
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            if len(batch) == 1:
+                with self._lock:
+                    self.rows_failed += 1
+                logger.warning(f"api_usage row dropped: {batch[0][:3]}: {e}")
+                return 0
+        middle = len(batch) // 2
+        return self._write(pool, batch[:middle]) + self._write(pool, batch[middle:])
+
+    def start(self):
+        """Start the background drain if it is not running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-meter-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the drain thread and write whatever is still buffered"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "capacity": self.capacity,
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "failures": self.failures,
+                "rows_failed": self.rows_failed,
+            }
+
+
+class UsageMeteringMiddleware:
+    """
+    ASGI middleware that meters HTTP requests into a UsageMeter
+
+    user_resolver receives the request headers (lowercased name -> value) and
+    returns the caller's users.id, or None for anonymous calls.
+    """
+
+    def __init__(self, app, meter: "UsageMeter" = None, user_resolver: Callable[[dict], Optional[int]] = None):
+        self.app = app
+        self.meter = meter or usage_meter
+        self.user_resolver = user_resolver
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METERING_ENABLED or scope["path"].startswith(METERING_EXCLUDE_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        # api_usage.timestamp is TIMESTAMP without time zone, holding UTC
+        started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._record(scope, started_at, start, status["code"])
+
+    def _record(self, scope, started_at: datetime, start: float, status_code: int):
+        try:
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+            user_id = self.user_resolver(headers) if self.user_resolver else None
+
+            forwarded = headers.get("x-forwarded-for")
+            if forwarded:
+                ip = forwarded.split(",")[0].strip()
+            else:
+                client = scope.get("client")
+                ip = client[0] if client else None
+
+            self.meter.record(
+                user_id, scope["path"], scope["method"], started_at,
+                int((time.perf_counter() - start) * 1000), status_code, ip
+            )
+        except Exception as e:
+            logger.warning(f"Failed to meter request: {e}")
+
+
+usage_meter = UsageMeter()
+atexit.register(usage_meter.stop)
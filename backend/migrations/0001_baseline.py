@@ -0,0 +1,135 @@
+"""Baseline tables, bringing databases created by the older setup scripts up to date"""
+
+from api_usage import create_api_usage_table, maintain_api_usage_partitions
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        role VARCHAR(50) NOT NULL,
+        company_name VARCHAR(255),
+        company_type VARCHAR(50),
+        phone VARCHAR(20),
+        state CHAR(2) NOT NULL,
+        subscribe BOOLEAN DEFAULT FALSE,
+        plan VARCHAR(50) DEFAULT 'free',
+        stripe_customer_id VARCHAR(255),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        verified BOOLEAN DEFAULT FALSE,
+        last_login TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deeds (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        deed_type VARCHAR(100) NOT NULL,
+        property_address TEXT NOT NULL,
+        grantor_name VARCHAR(255) NOT NULL,
+        grantee_name VARCHAR(255) NOT NULL,
+        legal_description TEXT,
+        consideration_amount DECIMAL(12,2),
+        status VARCHAR(50) DEFAULT 'draft',
+        ai_assisted BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS shared_deeds (
+        id SERIAL PRIMARY KEY,
+        deed_id INTEGER REFERENCES deeds(id) ON DELETE CASCADE,
+        recipient_email VARCHAR(255) NOT NULL,
+        recipient_name VARCHAR(255),
+        message TEXT,
+        status VARCHAR(50) DEFAULT 'pending',
+        approval_token VARCHAR(255) UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        approved_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        stripe_subscription_id VARCHAR(255) UNIQUE,
+        status VARCHAR(50) NOT NULL,
+        current_period_start TIMESTAMP,
+        current_period_end TIMESTAMP,
+        plan_name VARCHAR(50) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS plan_limits (
+        id SERIAL PRIMARY KEY,
+        plan_name VARCHAR(50) UNIQUE NOT NULL,
+        max_deeds_per_month INTEGER,
+        api_calls_per_month INTEGER,
+        ai_assistance BOOLEAN DEFAULT TRUE,
+        integrations_enabled BOOLEAN DEFAULT FALSE,
+        priority_support BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_monthly_usage (
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        month DATE NOT NULL,
+        deeds_created INTEGER NOT NULL DEFAULT 0,
+        api_calls INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, month)
+    )
+    """,
+]
+
+# Columns that setup_database.py, fix_database.py and friends created
+# inconsistently (or not at all). Nullable or constant defaults only, so
+# none of these rewrite the table.
+USER_COLUMNS = [
+    ("role", "VARCHAR(50)"),
+    ("company_name", "VARCHAR(255)"),
+    ("company_type", "VARCHAR(50)"),
+    ("phone", "VARCHAR(20)"),
+    ("state", "CHAR(2)"),
+    ("subscribe", "BOOLEAN DEFAULT FALSE"),
+    ("plan", "VARCHAR(50) DEFAULT 'free'"),
+    ("stripe_customer_id", "VARCHAR(255)"),
+    ("updated_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+    ("verified", "BOOLEAN DEFAULT FALSE"),
+    ("last_login", "TIMESTAMP"),
+    ("is_active", "BOOLEAN DEFAULT TRUE"),
+]
+
+DEED_COLUMNS = [
+    ("consideration_amount", "DECIMAL(12,2)"),
+    ("ai_assisted", "BOOLEAN DEFAULT FALSE"),
+    ("completed_at", "TIMESTAMP"),
+    # Property columns used by the deed wizard (DeedCreate)
+    ("apn", "VARCHAR(50)"),
+    ("county", "VARCHAR(100)"),
+    ("owner_type", "VARCHAR(100)"),
+    ("sales_price", "DECIMAL(15,2)"),
+    ("vesting", "VARCHAR(255)"),
+]
+
+
+def upgrade(m):
+    for sql in TABLES:
+        m.execute(sql)
+
+    for column, definition in USER_COLUMNS:
+        m.add_column("users", column, definition)
+    for column, definition in DEED_COLUMNS:
+        m.add_column("deeds", column, definition)
+
+    m.run(lambda cur: create_api_usage_table(cur.connection), "create api_usage")
+    m.run(lambda cur: maintain_api_usage_partitions(cur.connection), "api_usage partitions")
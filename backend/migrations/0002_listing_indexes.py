@@ -0,0 +1,20 @@
+"""Indexes for lookups, plan-limit counting and keyset-paginated listings"""
+
+INDEXES = [
+    ("idx_users_email", "users", "email"),
+    ("idx_users_plan", "users", "plan"),
+    ("idx_users_created_at_id", "users", "created_at DESC, id DESC"),
+    ("idx_users_plan_created_at_id", "users", "plan, created_at DESC, id DESC"),
+    ("idx_users_active_created_at_id", "users", "is_active, created_at DESC, id DESC"),
+    ("idx_deeds_user_id", "deeds", "user_id"),
+    ("idx_deeds_created_at", "deeds", "created_at"),
+    ("idx_deeds_created_at_id", "deeds", "created_at DESC, id DESC"),
+    ("idx_deeds_status_created_at_id", "deeds", "status, created_at DESC, id DESC"),
+    ("idx_deeds_user_created_at_id", "deeds", "user_id, created_at DESC, id DESC"),
+    ("idx_shared_deeds_deed_id", "shared_deeds", "deed_id"),
+]
+
+
+def upgrade(m):
+    for name, table, definition in INDEXES:
+        m.create_index(name, table, definition)
@@ -0,0 +1,8 @@
+"""Trigram indexes for admin user search"""
+
+
+def upgrade(m):
+    m.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    m.create_index("idx_users_email_trgm", "users", "email gin_trgm_ops", using="gin")
+    m.create_index("idx_users_full_name_trgm", "users", "full_name gin_trgm_ops", using="gin")
+    m.create_index("idx_users_company_name_trgm", "users", "company_name gin_trgm_ops", using="gin")
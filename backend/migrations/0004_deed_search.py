@@ -0,0 +1,36 @@
+"""Full-text deed search: trigger-maintained tsvector and normalized APN"""
+
+SEARCH_TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION deeds_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.property_address, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.apn, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.grantor_name, '') || ' ' || coalesce(NEW.grantee_name, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.legal_description, '')), 'C');
+        NEW.apn_normalized := NULLIF(regexp_replace(lower(coalesce(NEW.apn, '')), '[^0-9a-z]', '', 'g'), '');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade(m):
+    m.add_column("deeds", "search_vector", "tsvector")
+    m.add_column("deeds", "apn_normalized", "VARCHAR(50)")
+    m.execute(SEARCH_TRIGGER_FUNCTION)
+
+    def replace_trigger(cur):
+        cur.execute("DROP TRIGGER IF EXISTS deeds_search_update ON deeds")
+        cur.execute("""
+            CREATE TRIGGER deeds_search_update
+                BEFORE INSERT OR UPDATE OF property_address, apn, grantor_name, grantee_name, legal_description
+                ON deeds FOR EACH ROW EXECUTE FUNCTION deeds_search_update()
+        """)
+    m.run(replace_trigger, "deeds_search_update trigger")
+
+    # Touching apn fires the trigger for rows written before it existed
+    m.backfill("deeds", "apn = apn", "search_vector IS NULL")
+
+    m.create_index("idx_deeds_search_vector", "deeds", "search_vector", using="gin")
+    m.create_index("idx_deeds_apn_normalized", "deeds", "apn_normalized text_pattern_ops")
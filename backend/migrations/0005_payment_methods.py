@@ -0,0 +1,16 @@
+"""payment_methods table, previously created by database.py on import"""
+
+
+def upgrade(m):
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS payment_methods (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            stripe_payment_method_id VARCHAR(100),
+            card_brand VARCHAR(50),
+            last_four VARCHAR(4),
+            is_default BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    m.create_index("idx_payment_methods_user_id", "payment_methods", "user_id")
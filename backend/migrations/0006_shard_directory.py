@@ -0,0 +1,59 @@
+"""Shard directory and move fences for sharding deeds by user_id"""
+
+# Writes to a fenced user's deeds fail with SQLSTATE DP001 (see shards.py);
+# the mover sets deedpro.shard_move to copy and delete rows past the fence.
+FENCE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION deeds_shard_fence() RETURNS trigger AS $$
+    DECLARE
+        owner INTEGER;
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM shard_fences)
+           OR current_setting('deedpro.shard_move', true) = 'on' THEN
+            RETURN COALESCE(NEW, OLD);
+        END IF;
+
+        IF TG_TABLE_NAME = 'deeds' THEN
+            owner := COALESCE(NEW.user_id, OLD.user_id);
+        ELSE
+            SELECT user_id INTO owner FROM deeds WHERE id = COALESCE(NEW.deed_id, OLD.deed_id);
+        END IF;
+
+        IF EXISTS (SELECT 1 FROM shard_fences WHERE user_id = owner) THEN
+            RAISE EXCEPTION 'deeds of user % are being moved to another shard', owner
+                USING ERRCODE = 'DP001';
+        END IF;
+        RETURN COALESCE(NEW, OLD);
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade(m):
+    # Only the primary's copy is read; it is the directory for every shard
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS shard_directory (
+            user_id INTEGER PRIMARY KEY,
+            shard VARCHAR(64) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS shard_fences (
+            user_id INTEGER PRIMARY KEY,
+            target_shard VARCHAR(64) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    m.execute(FENCE_FUNCTION)
+
+    def replace_triggers(cur):
+        for table in ("deeds", "shared_deeds"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {table}_shard_fence ON {table}")
+            cur.execute(f"""
+                CREATE TRIGGER {table}_shard_fence
+                    BEFORE INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION deeds_shard_fence()
+            """)
+    m.run(replace_triggers, "shard fence triggers")
+
+    m.create_index("idx_shard_directory_shard", "shard_directory", "shard")
@@ -0,0 +1,26 @@
+"""Keep users.updated_at current so it can version the profile (ETag)"""
+
+TOUCH_FUNCTION = """
+    CREATE OR REPLACE FUNCTION users_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade(m):
+    m.execute(TOUCH_FUNCTION)
+
+    def replace_trigger(cur):
+        cur.execute("DROP TRIGGER IF EXISTS users_touch_updated_at ON users")
+        # last_login is left out: the login buffer writes it constantly and the ETag reads it directly
+        cur.execute("""
+            CREATE TRIGGER users_touch_updated_at
+                BEFORE UPDATE OF email, full_name, role, company_name, company_type, phone, state, plan, is_active
+                ON users FOR EACH ROW
+                WHEN (OLD.* IS DISTINCT FROM NEW.*)
+                EXECUTE FUNCTION users_touch_updated_at()
+        """)
+    m.run(replace_trigger, "users_touch_updated_at trigger")
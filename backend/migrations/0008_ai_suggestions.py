@@ -0,0 +1,18 @@
+"""Persistent cache of AI field suggestions (see ai_assist.py)"""
+
+
+def upgrade(m):
+    # cache_key hashes (deed_type, field, normalized input, model, prompt version)
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS ai_suggestions (
+            cache_key CHAR(64) PRIMARY KEY,
+            deed_type VARCHAR(100) NOT NULL,
+            field VARCHAR(100) NOT NULL,
+            model VARCHAR(100) NOT NULL,
+            prompt_version VARCHAR(16) NOT NULL,
+            suggestion TEXT NOT NULL,
+            confidence REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    m.create_index("idx_ai_suggestions_created_at", "ai_suggestions", "created_at")
@@ -0,0 +1,153 @@
+"""
+In-process cache of the plan_limits table
+
+plan_limits holds one row per plan and changes only when plans are seeded
+or edited, so every worker keeps the whole table in memory. It is loaded
+during the startup warmup and reloaded on the first lookup after
+PLAN_LIMITS_TTL seconds; while one request reloads, the others keep using
+the previous copy, and a failed reload keeps it too. Writers go through
+upsert_plan_limits() and call plan_limits_cache.invalidate() after
+committing, with publish("plan_limits", conn=...) in the same transaction
+so the other workers drop their copies too (see invalidation.py).
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from db_pool import get_pool
+from invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+PLAN_LIMITS_TTL = float(os.getenv("PLAN_LIMITS_TTL", "300"))
+
+PLAN_LIMIT_FIELDS = [
+    "max_deeds_per_month", "api_calls_per_month", "ai_assistance", "integrations_enabled", "priority_support",
+]
+
+# What a plan without a plan_limits row gets in the profile
+DEFAULT_PLAN_LIMITS = {
+    "max_deeds_per_month": 5,
+    "api_calls_per_month": 100,
+    "ai_assistance": True,
+    "integrations_enabled": False,
+    "priority_support": False,
+}
+
+
+class PlanLimitsCache:
+    """plan_name -> limits dict for every row of plan_limits"""
+
+    def __init__(self, ttl: float = PLAN_LIMITS_TTL):
+        self.ttl = ttl
+        self._plans: Optional[Dict[str, dict]] = None
+        self._expires_at = 0.0
+        self._version = ""
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+        self.loads = 0
+        self.failures = 0
+
+    def load(self, conn=None) -> Dict[str, dict]:
+        """Read the whole table now (on conn, or a pooled connection) and replace the cached copy"""
+        sql = f"SELECT plan_name, {', '.join(PLAN_LIMIT_FIELDS)} FROM plan_limits"
+        if conn is not None:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+        else:
+            pool = get_pool()
+            if not pool:
+                return {}
+            with pool.connection("plan_limits_load") as pooled, pooled.cursor() as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+
+        plans = {row[0]: dict(zip(PLAN_LIMIT_FIELDS, row[1:])) for row in rows}
+        version = hashlib.sha1(json.dumps(plans, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        with self._lock:
+            self._version = version
+            self._plans = plans
+            self._expires_at = time.monotonic() + self.ttl
+            self.loads += 1
+        return plans
+
+    def _current(self) -> Dict[str, dict]:
+        with self._lock:
+            plans, fresh = self._plans, time.monotonic() < self._expires_at
+        if plans is not None and fresh:
+            return plans
+
+        # One caller reloads; the rest keep serving the copy they have
+        if plans is not None and not self._reload_lock.acquire(blocking=False):
+            return plans
+        if plans is None:
+            self._reload_lock.acquire()
+        try:
+            with self._lock:
+                if self._plans is not None and time.monotonic() < self._expires_at:
+                    return self._plans
+            return self.load()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                # Back off for a while instead of retrying on every request
+                self._expires_at = time.monotonic() + min(self.ttl, 5)
+            if plans is None:
+                raise
+            logger.warning(f"Reloading plan limits failed, keeping the cached copy: {e}")
+            return plans
+        finally:
+            self._reload_lock.release()
+
+    def get(self, plan: str) -> Optional[dict]:
+        """Limits for a plan, or None when plan_limits has no row for it"""
+        return self._current().get(plan)
+
+    def all(self) -> Dict[str, dict]:
+        return dict(self._current())
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the cached limits, equal on every worker holding the same data"""
+        with self._lock:
+            return self._version
+
+    def invalidate(self):
+        """Reload on the next lookup (the current copy is kept if that fails)"""
+        with self._lock:
+            self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "plans": len(self._plans or {}),
+                "version": self._version,
+                "loads": self.loads,
+                "failures": self.failures,
+                "expires_in": round(max(0.0, self._expires_at - time.monotonic()), 1),
+            }
+
+
+def upsert_plan_limits(cur, plans: Iterable[dict]) -> int:
+    """Insert or update plan_limits rows (plan_name plus PLAN_LIMIT_FIELDS); the caller commits and invalidates"""
+    count = 0
+    for plan in plans:
+        cur.execute(f"""
+            INSERT INTO plan_limits (plan_name, {', '.join(PLAN_LIMIT_FIELDS)})
+            VALUES (%s, {', '.join(['%s'] * len(PLAN_LIMIT_FIELDS))})
+            ON CONFLICT (plan_name) DO UPDATE SET
+                {', '.join(f'{field} = EXCLUDED.{field}' for field in PLAN_LIMIT_FIELDS)}
+        """, [plan["plan_name"]] + [plan[field] for field in PLAN_LIMIT_FIELDS])
+        count += cur.rowcount
+    return count
+
+
+plan_limits_cache = PlanLimitsCache()
+invalidation_bus.register("plan_limits", lambda key: plan_limits_cache.invalidate())
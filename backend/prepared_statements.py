@@ -0,0 +1,124 @@
+"""
+Named server-side prepared statements for the hot auth and profile queries
+
+Each pooled connection prepares the registry once, on first use, in a single
+round trip. Afterwards handlers run the statements by name with EXECUTE so
+Postgres skips parsing and planning. Connections that are recycled by the pool
+start with an empty registry and are prepared again; if the server has lost
+the statements (for example behind a transaction-pooling proxy) we fall back to
+the plain ad-hoc query.
+"""
+
+import os
+import re
+import logging
+import threading
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# Set DB_PREPARED_STATEMENTS=false when running behind a transaction-pooling proxy
+PREPARED_STATEMENTS_ENABLED = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+# name -> SQL using psycopg2 %s placeholders
+STATEMENTS = {
+    "users_login_lookup": """
+        SELECT id, password_hash, full_name, plan, is_active
+        FROM users WHERE email = %s
+    """,
+    # Plan limits come from plan_limits_cache, not the database
+    "users_profile": """
+        SELECT id, email, full_name, role, company_name, company_type,
+               phone, state, plan, created_at, last_login, updated_at
+        FROM users
+        WHERE id = %s AND is_active = TRUE
+    """,
+    # Everything the profile ETag is derived from, for cheap If-None-Match checks
+    "users_profile_version": """
+        SELECT updated_at, plan, last_login
+        FROM users
+        WHERE id = %s AND is_active = TRUE
+    """,
+    "user_plan": """
+        SELECT plan FROM users WHERE id = %s
+    """,
+    # This month's usage counters (no row until the first deed or API call)
+    "monthly_usage_counters": """
+        SELECT deeds_created, api_calls
+        FROM user_monthly_usage
+        WHERE user_id = %s AND month = DATE_TRUNC('month', CURRENT_DATE)::date
+    """,
+}
+
+# connection -> set of statement names prepared on that session
+_prepared = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _to_positional(sql: str) -> str:
+    """Convert %s placeholders to $1, $2, ... for PREPARE"""
+    counter = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+
+def _param_list(count: int) -> str:
+    return f" ({', '.join(['%s'] * count)})" if count else ""
+
+
+def _prepare_all(conn):
+    """Prepare every registered statement on this connection in one round trip"""
+    # DEALLOCATE first so a session we lost track of cannot collide on names
+    batch = ";\n".join(
+        ["DEALLOCATE ALL"]
+        + [f"PREPARE {name} AS {_to_positional(sql).strip()}" for name, sql in STATEMENTS.items()]
+    )
+    with conn.cursor() as cur:
+        cur.execute(batch)
+    with _lock:
+        _prepared[conn] = set(STATEMENTS)
+
+
+def _is_prepared(conn, name: str) -> bool:
+    with _lock:
+        return name in _prepared.get(conn, ())
+
+
+def forget(conn):
+    """Drop what we know about a connection's prepared statements"""
+    with _lock:
+        _prepared.pop(conn, None)
+
+
+def prepare_connection(conn):
+    """Prepare every registered statement ahead of the first request (no-op when disabled)"""
+    if not PREPARED_STATEMENTS_ENABLED or _is_prepared(conn, next(iter(STATEMENTS))):
+        return
+    _prepare_all(conn)
+    conn.commit()
+
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Run a registered statement by name on the cursor's connection"""
+    sql = STATEMENTS[name]
+    if not PREPARED_STATEMENTS_ENABLED:
+        cur.execute(sql, params)
+        return cur
+
+    conn = cur.connection
+    fresh_transaction = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    try:
+        if not _is_prepared(conn, name):
+            _prepare_all(conn)
+        cur.execute(f"EXECUTE {name}{_param_list(len(params))}", params)
+    except psycopg2.errors.InvalidSqlStatementName as e:
+        # The session no longer matches our registry; only retry if no earlier work would be lost
+        forget(conn)
+        if not fresh_transaction:
+            raise
+        logger.warning(f"Prepared statement {name} unavailable ({e.pgcode}), running ad-hoc")
+        conn.rollback()
+        cur.execute(sql, params)
+    return cur
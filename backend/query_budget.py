@@ -0,0 +1,261 @@
+"""
+Per-route query budgets
+
+Each request gets a budget: a statement_timeout for every statement it runs
+and a cap on how many statements it may run. QueryBudgetMiddleware picks the
+budget from the path (longest matching prefix in ROUTE_BUDGETS) and keeps it
+in a context variable; pooled connections are BudgetConnection instances,
+whose cursors open every transaction with SET LOCAL statement_timeout (in
+the same round trip as the first statement) and count statements.
+
+The server cancels a statement that runs past the timeout (QueryCanceled);
+a request that would run one statement too many gets QueryBudgetExceeded
+before the statement is sent. Both are logged with the route and a SQL
+fingerprint and surface as 503s. Work outside a request (background
+writers, scripts) runs without a budget.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+from psycopg2 import errors, extensions
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGETS_ENABLED = os.getenv("QUERY_BUDGETS_ENABLED", "true").lower() == "true"
+
+
+class QueryBudget:
+    """statement_timeout in milliseconds and the most statements a request may run (None: unlimited)"""
+
+    def __init__(self, name: str, timeout_ms: int, max_statements: Optional[int]):
+        self.name = name
+        self.timeout_ms = timeout_ms
+        self.max_statements = max_statements
+
+    @classmethod
+    def from_env(cls, name: str, timeout_ms: int, max_statements: Optional[int]) -> "QueryBudget":
+        prefix = f"QUERY_BUDGET_{name.upper()}"
+        limit = os.getenv(f"{prefix}_MAX_STATEMENTS")
+        return cls(
+            name,
+            int(os.getenv(f"{prefix}_TIMEOUT_MS", str(timeout_ms))),
+            (int(limit) or None) if limit is not None else max_statements,
+        )
+
+    def __repr__(self):
+        return f"QueryBudget({self.name}, {self.timeout_ms}ms, max_statements={self.max_statements})"
+
+
+# Login/profile must stay fast even when reporting queries are slow
+OLTP_BUDGET = QueryBudget.from_env("oltp", 2000, 10)
+DEFAULT_BUDGET = QueryBudget.from_env("default", 10000, 50)
+ADMIN_BUDGET = QueryBudget.from_env("admin", 30000, 100)
+# Export fetches one batch per statement and import COPYs the whole upload
+BULK_BUDGET = QueryBudget.from_env("bulk", 60000, None)
+
+# Path prefix -> budget; the longest matching prefix wins
+ROUTE_BUDGETS = {
+    "/users/login": OLTP_BUDGET,
+    "/users/register": OLTP_BUDGET,
+    "/users/profile": OLTP_BUDGET,
+    "/health": OLTP_BUDGET,
+    "/admin": ADMIN_BUDGET,
+    "/deeds/export": BULK_BUDGET,
+    "/deeds/import": BULK_BUDGET,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    """A request tried to run more statements than its budget allows"""
+
+
+class RequestBudget:
+    """Statements run so far by one request against its QueryBudget"""
+
+    def __init__(self, route: str, budget: QueryBudget):
+        self.route = route
+        self.budget = budget
+        self.statements = 0
+        self.overruns = 0
+        self._lock = threading.Lock()
+
+    @property
+    def set_timeout_sql(self) -> str:
+        return f"SET LOCAL statement_timeout = {int(self.budget.timeout_ms)}"
+
+    def check(self, query):
+        """Count one more statement, refusing it if that is over budget"""
+        # Scatter-gather reads run on several threads for one request
+        with self._lock:
+            self.statements += 1
+            statements = self.statements
+        limit = self.budget.max_statements
+        if limit is not None and statements > limit:
+            self.overrun("statements", query)
+            raise QueryBudgetExceeded(f"{self.route} ran more than {limit} statements")
+
+    def overrun(self, kind: str, query):
+        self.overruns += 1
+        fingerprint, text = sql_fingerprint(query)
+        logger.warning(
+            f"Query budget overrun ({kind}) on {self.route}: budget={self.budget.name} "
+            f"timeout={self.budget.timeout_ms}ms statements={self.statements}/{self.budget.max_statements} "
+            f"sql={fingerprint} {text}"
+        )
+
+
+_current = ContextVar("query_budget", default=None)
+
+
+def budget_for_path(path: str) -> QueryBudget:
+    best = ""
+    for prefix in ROUTE_BUDGETS:
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return ROUTE_BUDGETS[best] if best else DEFAULT_BUDGET
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s|\$\d+")
+
+
+def sql_fingerprint(query) -> tuple:
+    """(short hash, abbreviated text) of a query with literals and parameters replaced by ?"""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    normalized = " ".join(_PLACEHOLDERS.sub("?", _LITERALS.sub("?", query)).split())
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized[:200]
+
+
+def _starts_transaction(conn) -> bool:
+    """True when the next statement opens a new transaction (and so needs SET LOCAL again)"""
+    return not conn.autocommit and conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+
+
+# Command tags of statements that change rows (COPY is checked by direction instead)
+_WRITE_TAGS = ("INSERT", "UPDATE", "DELETE", "MERGE")
+_COPY_FROM = re.compile(r"\bFROM\s+STDIN\b", re.IGNORECASE)
+
+
+def _note_write(conn, wrote: bool):
+    """Record that a statement changed rows; it counts once its transaction commits"""
+    if not wrote or not isinstance(conn, BudgetConnection):
+        return
+    if conn.autocommit:
+        conn.write_commits += 1
+    else:
+        conn.pending_write = True
+
+
+def _changed_rows(cur) -> bool:
+    tag = cur.statusmessage
+    return bool(tag) and tag.startswith(_WRITE_TAGS) and cur.rowcount != 0
+
+
+class BudgetCursorMixin:
+    def execute(self, query, vars=None):
+        budget = _current.get()
+        if budget is None:
+            super().execute(query, vars)
+            _note_write(self.connection, _changed_rows(self))
+            return
+
+        budget.check(query)
+        conn = self.connection
+        if _starts_transaction(conn):
+            if self.name is None and isinstance(query, str):
+                # Same round trip as the statement; the cursor keeps the last result
+                query = f"{budget.set_timeout_sql}; {query}"
+            else:
+                with extensions.connection.cursor(conn) as cur:
+                    cur.execute(budget.set_timeout_sql)
+        try:
+            super().execute(query, vars)
+        except errors.QueryCanceled:
+            budget.overrun("timeout", query)
+            raise
+        _note_write(conn, _changed_rows(self))
+
+    def executemany(self, query, vars_list):
+        super().executemany(query, vars_list)
+        _note_write(self.connection, _changed_rows(self))
+
+    def copy_expert(self, sql, file, size=8192):
+        budget = _current.get()
+        if budget is not None:
+            budget.check(sql)
+            if _starts_transaction(self.connection):
+                with extensions.connection.cursor(self.connection) as cur:
+                    cur.execute(budget.set_timeout_sql)
+        try:
+            super().copy_expert(sql, file, size)
+        except errors.QueryCanceled:
+            if budget is not None:
+                budget.overrun("timeout", sql)
+            raise
+        _note_write(self.connection, bool(_COPY_FROM.search(str(sql))) and self.rowcount != 0)
+
+
+_budget_cursors = {}
+
+
+def _budget_cursor(factory):
+    cls = _budget_cursors.get(factory)
+    if cls is None:
+        cls = type(f"Budget{factory.__name__}", (BudgetCursorMixin, factory), {})
+        _budget_cursors[factory] = cls
+    return cls
+
+
+class BudgetConnection(extensions.connection):
+    """psycopg2 connection whose cursors (of any cursor_factory) apply the request's query budget"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Commits of transactions in which a statement changed rows (see db_pool.get_db).
+        # Writes hidden behind a SELECT (a data-modifying CTE) have no write command
+        # tag; helpers that run those set pending_write themselves.
+        self.write_commits = 0
+        self.pending_write = False
+
+    def commit(self):
+        super().commit()
+        if self.pending_write:
+            self.pending_write = False
+            self.write_commits += 1
+
+    def rollback(self):
+        super().rollback()
+        self.pending_write = False
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _budget_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that puts the route's QueryBudget in effect for the request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_BUDGETS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        token = _current.set(RequestBudget(f"{scope['method']} {path}", budget_for_path(path)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
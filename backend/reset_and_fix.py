@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Reset Database Connection and Add Missing Columns
+
+Deprecated: migration 0001_baseline adds these columns; use scripts/migrate.py.
 """
 
 import psycopg2
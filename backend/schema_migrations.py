@@ -0,0 +1,282 @@
+"""
+Versioned, lock-aware schema migrations
+
+Migrations live in backend/migrations/NNNN_name.py. Each file has a
+docstring (its description) and an upgrade(m) function that receives a
+MigrationContext. Applied versions are recorded in schema_migrations.
+
+Every step is written to be safe against a live database:
+- each DDL statement runs in its own short transaction under lock_timeout
+  and is retried with backoff instead of queueing behind long transactions
+  (and blocking all traffic queued behind it)
+- indexes are built with CREATE INDEX CONCURRENTLY, dropping any invalid
+  leftover from an earlier failed build first
+- backfills update rows in keyed batches, committing and pausing between
+  batches so replication and vacuum keep up
+
+Steps are idempotent (IF NOT EXISTS and friends), so a migration interrupted
+halfway is simply run again.
+"""
+
+import os
+import re
+import time
+import zlib
+import logging
+import hashlib
+import importlib.util
+from typing import Callable, List, Optional
+
+from psycopg2 import errors
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "2s")
+MIGRATION_LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "10"))
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.05"))
+
+# Serializes runners across processes (e.g. several instances starting at once)
+ADVISORY_LOCK_ID = zlib.crc32(b"deedpro.schema_migrations")
+
+MIGRATION_FILE = re.compile(r"^(\d{4})_([a-z0-9_]+)\.py$")
+
+HISTORY_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(10) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INTEGER
+    )
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version: str, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, "rb") as f:
+            self.checksum = hashlib.sha256(f.read()).hexdigest()
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version}", self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if not callable(getattr(module, "upgrade", None)):
+                raise MigrationError(f"{os.path.basename(self.path)} has no upgrade(m) function")
+            self._module = module
+        return self._module
+
+    @property
+    def description(self) -> str:
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+    def __repr__(self):
+        return f"{self.version}_{self.name}"
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError("Duplicate migration version numbers")
+    return migrations
+
+
+class MigrationContext:
+    """Operations available to a migration's upgrade(m); the connection is in autocommit mode"""
+
+    def __init__(self, conn, lock_timeout: str = MIGRATION_LOCK_TIMEOUT, retries: int = MIGRATION_LOCK_RETRIES):
+        self.conn = conn
+        self.lock_timeout = lock_timeout
+        self.retries = retries
+
+    def run(self, step: Callable, description: str = ""):
+        """Run step(cur) in one transaction under lock_timeout, retrying on lock timeouts"""
+        delay = 0.5
+        for attempt in range(1, self.retries + 1):
+            try:
+                return self._transaction(step)
+            except errors.LockNotAvailable:
+                if attempt == self.retries:
+                    raise MigrationError(f"Gave up waiting for locks after {attempt} attempts: {description}")
+                logger.warning(f"Lock timeout ({description}), retrying in {delay:.1f}s [{attempt}/{self.retries}]")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def _transaction(self, step: Callable):
+        # The session is in autocommit mode (CONCURRENTLY needs that), so open the block explicitly
+        with self.conn.cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                cur.execute("SET LOCAL lock_timeout = %s", (self.lock_timeout,))
+                result = step(cur)
+            except BaseException:
+                if not self.conn.closed:
+                    cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+            return result
+
+    def execute(self, sql: str, params=None):
+        """One DDL/DML statement in its own short, lock-bounded transaction"""
+        self.run(lambda cur: cur.execute(sql, params), " ".join(sql.split())[:80])
+
+    def add_column(self, table: str, column: str, definition: str):
+        """ALTER TABLE ... ADD COLUMN IF NOT EXISTS (use constant or no defaults to avoid a rewrite)"""
+        self.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+
+    def create_index(self, name: str, table: str, definition: str, unique: bool = False, using: str = ""):
+        """CREATE INDEX CONCURRENTLY, replacing an invalid index left by an interrupted build"""
+        using_sql = f" USING {using}" if using else ""
+        sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} ON {table}{using_sql} ({definition})"
+
+        def build(cur):
+            cur.execute("""
+                SELECT i.indisvalid
+                FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, (name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                return
+            if row:
+                # A failed or timed-out concurrent build leaves an INVALID index behind
+                logger.warning(f"Dropping invalid index {name} before rebuilding")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            cur.execute(sql)
+
+        self._concurrently(build, sql)
+
+    def _concurrently(self, step: Callable, description: str):
+        """CONCURRENTLY cannot run in a transaction block; lock_timeout still bounds its lock waits"""
+        delay = 0.5
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute("SET lock_timeout = %s", (self.lock_timeout,))
+                    cur.execute("SET statement_timeout = 0")
+                    step(cur)
+                return
+            except errors.LockNotAvailable:
+                if attempt == self.retries:
+                    raise MigrationError(f"Gave up waiting for locks after {attempt} attempts: {description}")
+                logger.warning(f"Lock timeout ({description}), retrying in {delay:.1f}s [{attempt}/{self.retries}]")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                with self.conn.cursor() as cur:
+                    cur.execute("RESET lock_timeout")
+                    cur.execute("RESET statement_timeout")
+
+    def backfill(self, table: str, set_sql: str, where_sql: str, batch_size: int = MIGRATION_BATCH_SIZE,
+                 pause: float = MIGRATION_BATCH_PAUSE, key: str = "id") -> int:
+        """
+        UPDATE table SET set_sql WHERE where_sql, batch_size rows per transaction
+
+        Walks the table in key order so each batch is an index range scan and
+        no batch revisits rows. where_sql must not contain bare % signs.
+        Returns the number of rows updated.
+        """
+        total, last_key = 0, None
+        while True:
+            def step(cur):
+                cur.execute(f"""
+                    WITH batch AS (
+                        SELECT {key} FROM {table}
+                        WHERE ({where_sql}) {"AND " + key + " > %s" if last_key is not None else ""}
+                        ORDER BY {key}
+                        LIMIT %s
+                    )
+                    UPDATE {table} t SET {set_sql}
+                    FROM batch WHERE t.{key} = batch.{key}
+                    RETURNING t.{key}
+                """, ([last_key] if last_key is not None else []) + [batch_size])
+                return [row[0] for row in cur.fetchall()]
+
+            keys = self.run(step, f"backfill {table}")
+            if not keys:
+                return total
+            total += len(keys)
+            last_key = max(keys)
+            logger.info(f"Backfilled {total} rows of {table}")
+            if pause:
+                time.sleep(pause)
+
+
+def _ensure_history(conn):
+    with conn.cursor() as cur:
+        cur.execute(HISTORY_TABLE)
+
+
+def applied_versions(conn) -> dict:
+    """version -> checksum for every applied migration"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations')")
+        if cur.fetchone()[0] is None:
+            return {}
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def pending_migrations(conn, migrations: Optional[List[Migration]] = None) -> List[Migration]:
+    migrations = migrations if migrations is not None else discover()
+    applied = applied_versions(conn)
+    if not conn.autocommit:
+        conn.rollback()
+    return [m for m in migrations if m.version not in applied]
+
+
+def run_migrations(conn, target: Optional[str] = None, dry_run: bool = False) -> List[Migration]:
+    """
+    Apply pending migrations in order, up to and including target
+
+    Uses its own autocommit session on conn and a session advisory lock so
+    concurrent runners wait for each other. Returns the migrations applied.
+    """
+    conn.autocommit = True
+    migrations = discover()
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    try:
+        _ensure_history(conn)
+        applied = applied_versions(conn)
+        for m in migrations:
+            if m.version in applied and applied[m.version] != m.checksum:
+                logger.warning(f"Migration {m!r} was modified after it was applied")
+
+        todo = [m for m in migrations if m.version not in applied and (target is None or m.version <= target)]
+        if dry_run:
+            return todo
+
+        context = MigrationContext(conn)
+        for m in todo:
+            logger.info(f"Applying migration {m!r}: {m.description}")
+            print(f"⬆️  {m!r}: {m.description}")
+            start = time.perf_counter()
+            m.module.upgrade(context)
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (%s, %s, %s, %s)
+                """, (m.version, m.name, m.checksum, duration_ms))
+        return todo
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the prepared-statement registry against ad-hoc cur.execute calls
+
+Usage: python scripts/bench_prepared_statements.py [--iterations 2000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prepared_statements import STATEMENTS, execute_prepared, forget  # noqa: E402
+
+load_dotenv()
+
+
+def sample_params(cur):
+    """Pick a real user so every statement hits an existing row"""
+    cur.execute("SELECT id, email FROM users WHERE is_active = TRUE ORDER BY id LIMIT 1")
+    row = cur.fetchone()
+    if not row:
+        raise RuntimeError("No active users found, run scripts/init_db.py first")
+    user_id, email = row
+    return {
+        "users_login_lookup": (email,),
+        "users_profile": (user_id,),
+        "users_profile_version": (user_id,),
+        "user_plan": (user_id,),
+        "monthly_usage_counters": (user_id,),
+    }
+
+
+def time_calls(conn, run, iterations):
+    timings = []
+    with conn.cursor() as cur:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run(cur)
+            cur.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "mean": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[int(len(ordered) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    with conn.cursor() as cur:
+        params = sample_params(cur)
+    conn.rollback()
+
+    print(f"⏱️  {args.iterations} iterations per statement (times in ms)")
+    print(f"{'statement':<26} {'ad-hoc p50':>10} {'prep p50':>10} {'ad-hoc p95':>10} {'prep p95':>10} {'speedup':>8}")
+
+    for name, sql in STATEMENTS.items():
+        statement_params = params[name]
+        adhoc = summarize(time_calls(conn, lambda cur: cur.execute(sql, statement_params), args.iterations))
+
+        forget(conn)
+        prepared = summarize(time_calls(
+            conn, lambda cur: execute_prepared(cur, name, statement_params), args.iterations
+        ))
+
+        speedup = adhoc["mean"] / prepared["mean"] if prepared["mean"] else 0
+        print(f"{name:<26} {adhoc['p50']:>10.3f} {prepared['p50']:>10.3f} "
+              f"{adhoc['p95']:>10.3f} {prepared['p95']:>10.3f} {speedup:>7.2f}x")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
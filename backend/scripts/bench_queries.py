@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Benchmark the backend's production SQL at several data scales
+
+For each scale the schema is created with scripts/init_db.py, the database is
+refilled with scripts/generate_dataset.py, and every query below is timed
+(p50/p95/p99) and captured with EXPLAIN (ANALYZE, BUFFERS). Results go to a
+JSON file; `compare` diffs two result files and exits non-zero on regressions.
+
+The target database is TRUNCATED, so it must be passed explicitly with
+--database-url or BENCH_DATABASE_URL (never DATABASE_URL).
+
+Usage:
+    python scripts/bench_queries.py run --scales 0.01,1,100 [--iterations 200] [--output bench.json]
+    python scripts/bench_queries.py run --no-load --scales 1      # benchmark the data already loaded
+    python scripts/bench_queries.py compare before.json after.json [--threshold 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import date, datetime
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prepared_statements import STATEMENTS  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+from search import search_users, search_deeds  # noqa: E402
+from usage_counters import INCREMENT_DEEDS_FROM_CTE  # noqa: E402
+from init_db import init_database  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+load_dotenv()
+
+WARMUP_ITERATIONS = 10
+
+
+class CaptureCursor:
+    """Stands in for a cursor to record the SQL a helper would run"""
+
+    def __init__(self):
+        self.sql = None
+        self.params = None
+
+    def execute(self, sql, params=None):
+        self.sql, self.params = sql, params
+
+    def fetchall(self):
+        return []
+
+
+def captured(helper, *args):
+    cur = CaptureCursor()
+    helper(cur, *args)
+    return cur.sql, cur.params
+
+
+def pick_samples(cur) -> dict:
+    """Representative rows: the busiest account (worst case) and a deep keyset position"""
+    cur.execute("""
+        SELECT u.id, u.email, u.stripe_customer_id, u.plan
+        FROM users u
+        JOIN (SELECT user_id, COUNT(*) AS deeds FROM deeds GROUP BY user_id ORDER BY deeds DESC LIMIT 1) busiest
+          ON busiest.user_id = u.id
+    """)
+    row = cur.fetchone()
+    if not row:
+        raise RuntimeError("No deeds found, load a dataset first")
+    user_id, email, customer_id, plan = row
+
+    # Roughly the middle of the deeds list, as a cursor for a deep admin page
+    cur.execute("SELECT created_at, id FROM deeds ORDER BY created_at DESC, id DESC OFFSET (SELECT COUNT(*) / 2 FROM deeds) LIMIT 1")
+    middle = cur.fetchone()
+    return {
+        "user_id": user_id,
+        "email": email,
+        "customer_id": customer_id or "cus_missing",
+        "plan": plan,
+        "deep_cursor": encode_cursor(middle[0], middle[1]) if middle else None,
+        "deep_position": middle,
+    }
+
+
+def build_queries(samples: dict) -> list:
+    """(name, sql, params, writes) for every query on the hot and admin paths"""
+    user_id = samples["user_id"]
+    deep_created_at, deep_id = samples["deep_position"]
+
+    admin_users = """
+        SELECT id, email, full_name, role, company_name, state, plan,
+               is_active, created_at, last_login
+        FROM users
+        WHERE {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT 51
+    """
+    admin_deeds = """
+        SELECT d.id, d.user_id, u.email AS user_email, u.full_name AS user_name,
+               d.deed_type, d.property_address, d.grantee_name, d.status,
+               d.created_at, d.completed_at
+        FROM deeds d
+        LEFT JOIN users u ON u.id = d.user_id
+        WHERE {where}
+        ORDER BY d.created_at DESC, d.id DESC
+        LIMIT 51
+    """
+
+    search_users_sql, search_users_params = captured(search_users, "smith", [], [], 50)
+    search_deeds_sql, search_deeds_params = captured(search_deeds, "main street", user_id, 20, 0)
+    search_apn_sql, search_apn_params = captured(search_deeds, "123-45", None, 20, 0)
+
+    return [
+        ("login_lookup", STATEMENTS["users_login_lookup"], (samples["email"],), False),
+        ("profile_fetch", STATEMENTS["users_profile"], (user_id,), False),
+        # check_plan_limits: the plan on a shared-cache miss, then this month's counters
+        ("check_plan_limits_plan", STATEMENTS["user_plan"], (user_id,), False),
+        ("check_plan_limits_counters", STATEMENTS["monthly_usage_counters"], (user_id,), False),
+        # Mirrors database.get_user_deeds
+        ("get_user_deeds", "SELECT * FROM deeds WHERE user_id = %s ORDER BY created_at DESC", (user_id,), False),
+        ("admin_users_first_page", admin_users.format(where="TRUE"), (), False),
+        ("admin_users_plan_filter", admin_users.format(where="plan = %s"), (samples["plan"],), False),
+        ("admin_users_search", search_users_sql, search_users_params, False),
+        ("admin_deeds_first_page", admin_deeds.format(where="TRUE"), (), False),
+        ("admin_deeds_deep_page", admin_deeds.format(where="TRUE AND (d.created_at, d.id) < (%s, %s)"),
+         (deep_created_at, deep_id), False),
+        ("admin_deeds_by_status", admin_deeds.format(where="d.status = %s"), ("pending",), False),
+        ("deed_search_owner", search_deeds_sql, search_deeds_params, False),
+        ("deed_search_apn_admin", search_apn_sql, search_apn_params, False),
+        ("create_deed", f"""
+            WITH new_deeds AS (
+                INSERT INTO deeds (user_id, deed_type, property_address, grantor_name, grantee_name, apn, county)
+                VALUES (%s, 'Grant Deed', '1 Bench St, Los Angeles, CA 90001', 'Bench Grantor', 'Bench Grantee',
+                        '999-999-999', 'Los Angeles')
+                RETURNING *
+            ), bumped_usage AS (
+                {INCREMENT_DEEDS_FROM_CTE}
+            )
+            SELECT * FROM new_deeds
+        """, (user_id,), True),
+        ("webhook_checkout_completed", "UPDATE users SET plan = %s WHERE id = %s", ("professional", user_id), True),
+        ("webhook_payment_succeeded",
+         "UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE stripe_customer_id = %s",
+         (samples["customer_id"],), True),
+        ("webhook_subscription_deleted",
+         "UPDATE users SET plan = 'free' WHERE stripe_customer_id = %s", (samples["customer_id"],), True),
+    ]
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def time_query(conn, sql, params, iterations: int) -> dict:
+    """Client-side latency including fetch; every iteration is rolled back"""
+    timings = []
+    with conn.cursor() as cur:
+        for i in range(WARMUP_ITERATIONS + iterations):
+            start = time.perf_counter()
+            cur.execute(sql, params)
+            if cur.description:
+                cur.fetchall()
+            elapsed = (time.perf_counter() - start) * 1000
+            conn.rollback()
+            if i >= WARMUP_ITERATIONS:
+                timings.append(elapsed)
+
+    ordered = sorted(timings)
+    return {
+        "iterations": iterations,
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": round(percentile(ordered, 0.50), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def explain_query(conn, sql, params) -> dict:
+    """EXPLAIN (ANALYZE, BUFFERS) in JSON plus the text plan; rolled back so writes leave no trace"""
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        plan = cur.fetchone()[0]
+        conn.rollback()
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+        text = "\n".join(row[0] for row in cur.fetchall())
+        conn.rollback()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]["Plan"]
+    return {
+        "execution_ms": plan[0].get("Execution Time"),
+        "planning_ms": plan[0].get("Planning Time"),
+        "shared_hit_blocks": top.get("Shared Hit Blocks"),
+        "shared_read_blocks": top.get("Shared Read Blocks"),
+        "plan": plan,
+        "text": text,
+    }
+
+
+def table_counts(cur) -> dict:
+    counts = {}
+    for table in ("users", "deeds", "shared_deeds", "subscriptions", "api_usage"):
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def run(args, db_url: str):
+    scales = [float(s) for s in args.scales.split(",")]
+    results = {
+        "meta": {
+            "started_at": datetime.now().isoformat(),
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "host": platform.node(),
+        },
+        "scales": {},
+    }
+
+    # init_db and the dataset generator read the target from the environment
+    os.environ["DATABASE_URL"] = db_url
+    as_of = date.today()
+
+    for scale in scales:
+        print(f"\n{'=' * 60}\n📏 Scale {scale}\n{'=' * 60}")
+        if not args.no_load:
+            if not init_database():
+                print("❌ Schema setup failed")
+                sys.exit(1)
+            conn = psycopg2.connect(db_url)
+            generate(conn, scale, args.seed, as_of, truncate=True)
+            conn.close()
+
+        conn = psycopg2.connect(db_url)
+        with conn.cursor() as cur:
+            cur.execute("SELECT version()")
+            results["meta"].setdefault("postgres", cur.fetchone()[0])
+            counts = table_counts(cur)
+            samples = pick_samples(cur)
+        conn.rollback()
+
+        scale_result = {"rows": counts, "queries": {}}
+        print(f"\n{'query':<30} {'p50':>9} {'p95':>9} {'p99':>9} {'exec':>9} {'reads':>8}")
+        for name, sql, params, _ in build_queries(samples):
+            timing = time_query(conn, sql, params, args.iterations)
+            explained = explain_query(conn, sql, params)
+            scale_result["queries"][name] = {**timing, "explain": explained}
+            print(f"{name:<30} {timing['p50_ms']:>9.3f} {timing['p95_ms']:>9.3f} {timing['p99_ms']:>9.3f} "
+                  f"{explained['execution_ms'] or 0:>9.3f} {explained['shared_read_blocks'] or 0:>8}")
+            if args.verbose:
+                print(explained["text"])
+        conn.close()
+        results["scales"][str(scale)] = scale_result
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\n💾 Results written to {args.output}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = 0
+    print(f"{'scale':<8} {'query':<30} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10} {'change':>8}")
+    for scale, scale_result in candidate["scales"].items():
+        before_queries = baseline["scales"].get(scale, {}).get("queries", {})
+        for name, after in scale_result["queries"].items():
+            before = before_queries.get(name)
+            if not before:
+                print(f"{scale:<8} {name:<30} {'-':>11} {after['p50_ms']:>10.3f} {'-':>11} {after['p95_ms']:>10.3f} {'new':>8}")
+                continue
+            change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+            flag = ""
+            # Ignore sub-millisecond noise
+            if change > args.threshold and after["p95_ms"] - before["p95_ms"] > args.min_delta_ms:
+                flag = " ⚠️"
+                regressions += 1
+            print(f"{scale:<8} {name:<30} {before['p50_ms']:>11.3f} {after['p50_ms']:>10.3f} "
+                  f"{before['p95_ms']:>11.3f} {after['p95_ms']:>10.3f} {change:>+7.0%}{flag}")
+
+    if regressions:
+        print(f"\n❌ {regressions} p95 regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Load data and benchmark")
+    run_parser.add_argument("--scales", default="0.01,1,100", help="Comma separated dataset scales (1 = 100k deeds)")
+    run_parser.add_argument("--iterations", type=int, default=200)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default="bench_queries.json")
+    run_parser.add_argument("--no-load", action="store_true", help="Use the data already in the database")
+    run_parser.add_argument("--database-url", help="Target database (default: BENCH_DATABASE_URL)")
+    run_parser.add_argument("--verbose", action="store_true", help="Print every EXPLAIN plan")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 slowdown (0.2 = 20%%)")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.5)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+        return
+
+    db_url = args.database_url or os.getenv("BENCH_DATABASE_URL")
+    if not db_url:
+        print("❌ Error: pass --database-url or set BENCH_DATABASE_URL (the database will be truncated)")
+        sys.exit(1)
+    run(args, db_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-round-trip profile and plan-limit lookups against the
+sequential queries they replaced (plan limits now come from the in-process
+cache and plans from the shared cache, so the limit check reads at most the
+plan and this month's counters)
+
+Usage: python scripts/bench_round_trips.py [--iterations 1000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prepared_statements import STATEMENTS  # noqa: E402
+
+load_dotenv()
+
+
+def profile_sequential(cur, user_id):
+    """Previous get_user_profile: users, then plan_limits"""
+    cur.execute("""
+        SELECT id, email, full_name, role, company_name, company_type,
+               phone, state, plan, created_at, last_login
+        FROM users WHERE id = %s AND is_active = TRUE
+    """, (user_id,))
+    user = cur.fetchone()
+    cur.execute("""
+        SELECT max_deeds_per_month, api_calls_per_month, ai_assistance,
+               integrations_enabled, priority_support
+        FROM plan_limits WHERE plan_name = %s
+    """, (user[8],))
+    cur.fetchone()
+
+
+def profile_joined(cur, user_id):
+    cur.execute(STATEMENTS["users_profile"], (user_id,))
+    cur.fetchone()
+
+
+def limits_sequential(cur, user_id):
+    """Previous check_plan_limits: plan, limits, then the monthly count"""
+    cur.execute("SELECT plan FROM users WHERE id = %s", (user_id,))
+    plan = cur.fetchone()[0]
+    cur.execute("""
+        SELECT max_deeds_per_month, api_calls_per_month
+        FROM plan_limits WHERE plan_name = %s
+    """, (plan,))
+    limits = cur.fetchone()
+    if limits and limits[0] is not None and limits[0] > 0:
+        cur.execute("""
+            SELECT COUNT(*) FROM deeds
+            WHERE user_id = %s AND created_at >= DATE_TRUNC('month', CURRENT_DATE)
+        """, (user_id,))
+        cur.fetchone()
+
+
+def limits_current(cur, user_id):
+    """Current check_plan_limits on a plan-cache miss: plan, then this month's counters"""
+    cur.execute(STATEMENTS["user_plan"], (user_id,))
+    cur.fetchone()
+    cur.execute(STATEMENTS["monthly_usage_counters"], (user_id,))
+    cur.fetchone()
+
+
+def measure(conn, fn, user_id, iterations):
+    timings = []
+    with conn.cursor() as cur:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn(cur, user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+    ordered = sorted(timings)
+    return {
+        "mean": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[int(len(ordered) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    with conn.cursor() as cur:
+        # Prefer a capped (free plan) user so the limit check includes the deed count
+        cur.execute("""
+            SELECT id FROM users WHERE is_active = TRUE
+            ORDER BY (plan = 'free') DESC, id LIMIT 1
+        """)
+        row = cur.fetchone()
+    conn.rollback()
+    if not row:
+        print("❌ No active users found, run scripts/init_db.py first")
+        sys.exit(1)
+    user_id = row[0]
+
+    print(f"⏱️  {args.iterations} iterations per path for user {user_id} (times in ms)")
+    print(f"{'path':<20} {'before p50':>10} {'after p50':>10} {'before p95':>10} {'after p95':>10} {'speedup':>8}")
+    for label, before_fn, after_fn in [
+        ("get_user_profile", profile_sequential, profile_joined),
+        ("check_plan_limits", limits_sequential, limits_current),
+    ]:
+        before = measure(conn, before_fn, user_id, args.iterations)
+        after = measure(conn, after_fn, user_id, args.iterations)
+        speedup = before["mean"] / after["mean"] if after["mean"] else 0
+        print(f"{label:<20} {before['p50']:>10.3f} {after['p50']:>10.3f} "
+              f"{before['p95']:>10.3f} {after['p95']:>10.3f} {speedup:>7.2f}x")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
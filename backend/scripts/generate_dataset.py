@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic DeedPro dataset at a chosen scale
+
+Scale 1 is 1,000 users, 100,000 deeds and 200,000 api_usage rows; scale 10
+gives 1M deeds. Every table is bulk-loaded with COPY and the output is fully
+determined by --seed and --as-of. Run scripts/init_db.py first to create the
+schema.
+
+Usage: python scripts/generate_dataset.py --scale 10 [--seed 42] [--as-of 2024-06-30] [--truncate]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_usage import add_months, _create_partition  # noqa: E402
+from usage_counters import reconcile_monthly_usage  # noqa: E402
+
+load_dotenv()
+
+USERS_PER_SCALE = 1000
+DEEDS_PER_SCALE = 100000
+API_CALLS_PER_SCALE = 200000
+HISTORY_MONTHS = 12
+COPY_CHUNK_ROWS = 50000
+
+# Every generated account logs in with this password
+GENERATED_PASSWORD = "password123"
+
+PLAN_MIX = [("free", 0.70), ("professional", 0.25), ("enterprise", 0.05)]
+# Relative deed volume per account by plan
+PLAN_ACTIVITY = {"free": 0.2, "professional": 3.0, "enterprise": 15.0}
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Carlos", "Maria",
+    "Daniel", "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Sandra", "Wei", "Priya",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Nguyen", "Chen", "Patel",
+]
+COMPANY_WORDS = ["First", "Pacific", "Golden", "Coast", "Summit", "Pioneer", "Heritage", "Valley", "Premier", "Liberty"]
+COMPANY_TYPES = [
+    ("Title Company", "Title"), ("Independent Escrow Company", "Escrow"),
+    ("Law Firm", "Law Group"), ("Real Estate Brokerage", "Realty"),
+]
+ROLES = ["Escrow Officer", "Title Agent", "Attorney", "Paralegal", "Real Estate Agent", "Administrator"]
+STREETS = [
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Sunset",
+    "Park", "Ocean", "Mission", "Valley", "Highland", "Lincoln", "Jefferson", "Canyon", "Vista", "Willow",
+]
+STREET_SUFFIXES = ["St", "Ave", "Blvd", "Rd", "Dr", "Ln", "Ct", "Way", "Pl"]
+# (county, state, [(city, zip prefix)])
+LOCATIONS = [
+    ("Los Angeles", "CA", [("Los Angeles", "900"), ("Pasadena", "911"), ("Long Beach", "908"), ("Santa Monica", "904")]),
+    ("Orange", "CA", [("Irvine", "926"), ("Anaheim", "928"), ("Santa Ana", "927")]),
+    ("San Diego", "CA", [("San Diego", "921"), ("Chula Vista", "919"), ("Oceanside", "920")]),
+    ("Riverside", "CA", [("Riverside", "925"), ("Temecula", "925"), ("Corona", "928")]),
+    ("Sacramento", "CA", [("Sacramento", "958"), ("Elk Grove", "957")]),
+    ("Santa Clara", "CA", [("San Jose", "951"), ("Palo Alto", "943"), ("Sunnyvale", "940")]),
+    ("Travis", "TX", [("Austin", "787"), ("Pflugerville", "786")]),
+    ("Maricopa", "AZ", [("Phoenix", "850"), ("Scottsdale", "852"), ("Mesa", "852")]),
+]
+DEED_TYPES = [
+    ("Grant Deed", 0.45), ("Quitclaim Deed", 0.25), ("Interspousal Transfer Deed", 0.10),
+    ("Warranty Deed", 0.10), ("Special Warranty Deed", 0.05), ("Trust Transfer Deed", 0.05),
+]
+DEED_STATUSES = [("completed", 0.55), ("recorded", 0.20), ("pending", 0.10), ("draft", 0.15)]
+OWNER_TYPES = ["Individual", "Married Couple", "Trust", "LLC", "Corporation", "Partnership"]
+VESTINGS = [
+    "a single man", "a single woman", "husband and wife as joint tenants", "husband and wife as community property",
+    "as trustee of the Family Trust", "a California limited liability company", "tenants in common",
+]
+ENDPOINTS = [
+    ("/users/profile", "GET", 0.30), ("/deeds", "GET", 0.20), ("/deeds", "POST", 0.10),
+    ("/deeds/search", "GET", 0.15), ("/users/login", "POST", 0.10), ("/shared-deeds", "GET", 0.05),
+    ("/property/search", "GET", 0.05), ("/deeds/export", "GET", 0.02), ("/api/v1/deeds", "GET", 0.03),
+]
+STATUS_CODES = [(200, 0.90), (201, 0.04), (400, 0.03), (401, 0.02), (500, 0.01)]
+
+
+def weighted(rng, choices):
+    """Pick from [(value, weight)] pairs"""
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def copy_rows(cur, table: str, columns: list, rows) -> int:
+    """COPY an iterable of row tuples in chunks; returns the number of rows loaded"""
+    buffer = io.StringIO()
+    total = pending = 0
+
+    def send():
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        buffer.seek(0)
+        buffer.truncate()
+
+    for row in rows:
+        buffer.write("\t".join(copy_value(v) for v in row) + "\n")
+        pending += 1
+        if pending >= COPY_CHUNK_ROWS:
+            send()
+            total += pending
+            pending = 0
+    if pending:
+        send()
+        total += pending
+    return total
+
+
+def random_time(rng, start: datetime, end: datetime) -> datetime:
+    span = max((end - start).total_seconds(), 1)
+    return (start + timedelta(seconds=rng.random() * span)).replace(microsecond=0)
+
+
+def person_name(rng) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+class DatasetGenerator:
+    def __init__(self, scale: float, seed: int, as_of: date):
+        self.scale = scale
+        self.seed = seed
+        self.end = datetime.combine(as_of, datetime.min.time()) + timedelta(days=1) - timedelta(seconds=1)
+        self.start = datetime.combine(add_months(as_of.replace(day=1), -(HISTORY_MONTHS - 1)), datetime.min.time())
+
+        self.user_count = max(1, int(USERS_PER_SCALE * scale))
+        self.deed_count = int(DEEDS_PER_SCALE * scale)
+        self.api_call_count = int(API_CALLS_PER_SCALE * scale)
+
+        # Filled in by users(): (id, plan, created_at) per generated account
+        self.accounts = []
+
+    def rng(self, table: str) -> random.Random:
+        """Independent stream per table so changing one table does not shift the others"""
+        return random.Random(f"{self.seed}:{table}")
+
+    def users(self, first_id: int, password_hash: str):
+        rng = self.rng("users")
+        for n in range(self.user_count):
+            user_id = first_id + n
+            plan = weighted(rng, PLAN_MIX)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            company_type, company_suffix = rng.choice(COMPANY_TYPES)
+            county, state, _ = rng.choice(LOCATIONS)
+            created_at = random_time(rng, self.start - timedelta(days=365), self.end - timedelta(days=1))
+            last_login = random_time(rng, created_at, self.end) if rng.random() < 0.85 else None
+            self.accounts.append((user_id, plan, created_at))
+            yield (
+                user_id, f"{first.lower()}.{last.lower()}.{self.seed}.{n}@example.com", password_hash,
+                f"{first} {last}", rng.choice(ROLES),
+                f"{rng.choice(COMPANY_WORDS)} {county} {company_suffix}", company_type,
+                f"555-{rng.randrange(10000):04d}", state, rng.random() < 0.4, plan,
+                f"cus_gen{self.seed}x{n}" if plan != "free" else None,
+                created_at, created_at, rng.random() < 0.9, last_login, rng.random() < 0.97,
+            )
+
+    def subscriptions(self):
+        rng = self.rng("subscriptions")
+        for user_id, plan, created_at in self.accounts:
+            if plan == "free":
+                continue
+            period_start = random_time(rng, max(created_at, self.end - timedelta(days=30)), self.end)
+            status = weighted(rng, [("active", 0.92), ("past_due", 0.05), ("canceled", 0.03)])
+            yield (
+                user_id, f"sub_gen{self.seed}x{user_id}", status, period_start,
+                period_start + timedelta(days=30), plan, created_at, period_start,
+            )
+
+    def deeds(self, first_id: int):
+        rng = self.rng("deeds")
+        # Heavy-tailed activity: a few busy title companies, many occasional users
+        weights = [rng.paretovariate(1.5) * PLAN_ACTIVITY[plan] for _, plan, _ in self.accounts]
+        owners = rng.choices(self.accounts, weights=weights, k=self.deed_count)
+
+        for n, (user_id, _, user_created_at) in enumerate(owners):
+            county, state, cities = rng.choice(LOCATIONS)
+            city, zip_prefix = rng.choice(cities)
+            address = (f"{rng.randint(100, 99999)} {rng.choice(STREETS)} {rng.choice(STREET_SUFFIXES)}, "
+                       f"{city}, {state} {zip_prefix}{rng.randrange(100):02d}")
+            apn = f"{rng.randrange(1000):03d}-{rng.randrange(1000):03d}-{rng.randrange(1000):03d}"
+            tract = rng.randint(1000, 99999)
+            legal = (f"Lot {rng.randint(1, 250)} of Tract No. {tract}, in the City of {city}, County of {county}, "
+                     f"State of {state}, as per map recorded in Book {rng.randint(1, 900)} Page {rng.randint(1, 99)} "
+                     f"of Maps, in the Office of the County Recorder of said County. APN {apn}")
+            deed_type = weighted(rng, DEED_TYPES)
+            status = weighted(rng, DEED_STATUSES)
+            price = None if deed_type in ("Quitclaim Deed", "Interspousal Transfer Deed") else round(rng.lognormvariate(13.3, 0.5), -3)
+            created_at = random_time(rng, max(user_created_at, self.start), self.end)
+            updated_at = random_time(rng, created_at, min(created_at + timedelta(days=14), self.end))
+            yield (
+                first_id + n, user_id, deed_type, address, person_name(rng), person_name(rng), legal,
+                price, status, rng.random() < 0.6, created_at, updated_at,
+                updated_at if status in ("completed", "recorded") else None,
+                apn, county, rng.choice(OWNER_TYPES), price, rng.choice(VESTINGS),
+            )
+
+    def shared_deeds(self, first_deed_id: int):
+        rng = self.rng("shared_deeds")
+        for deed_id in range(first_deed_id, first_deed_id + self.deed_count):
+            if rng.random() >= 0.1:
+                continue
+            status = weighted(rng, [("approved", 0.6), ("pending", 0.3), ("rejected", 0.1)])
+            name = person_name(rng)
+            created_at = random_time(rng, self.start, self.end)
+            yield (
+                deed_id, f"{name.lower().replace(' ', '.')}@example.net", name,
+                "Please review and approve this deed.", status, f"{rng.getrandbits(128):032x}",
+                created_at, random_time(rng, created_at, self.end) if status == "approved" else None,
+            )
+
+    def api_usage(self):
+        rng = self.rng("api_usage")
+        weights = [PLAN_ACTIVITY[plan] for _, plan, _ in self.accounts]
+        callers = rng.choices(self.accounts, weights=weights, k=self.api_call_count)
+        endpoints = [(path, method) for path, method, _ in ENDPOINTS]
+        endpoint_weights = [w for _, _, w in ENDPOINTS]
+        for user_id, _, user_created_at in callers:
+            path, method = rng.choices(endpoints, weights=endpoint_weights)[0]
+            yield (
+                user_id, path, method, random_time(rng, max(user_created_at, self.start), self.end),
+                int(rng.lognormvariate(3.5, 0.8)), weighted(rng, STATUS_CODES),
+                f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            )
+
+
+def next_id(cur, table: str) -> int:
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cur.fetchone()[0]
+
+
+def sync_sequence(cur, table: str):
+    cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    count = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"   {label}: {count:,} rows in {elapsed:.1f}s ({count / max(elapsed, 0.001):,.0f} rows/s)")
+    return count
+
+
+def generate(conn, scale: float, seed: int, as_of: date, truncate: bool = False) -> "DatasetGenerator":
+    """Generate and COPY a full dataset, then reconcile counters and ANALYZE; commits"""
+    generator = DatasetGenerator(scale, seed, as_of)
+    print(f"🏗️  Generating scale {scale} (seed {seed}, as of {as_of}): "
+          f"{generator.user_count:,} users, {generator.deed_count:,} deeds, {generator.api_call_count:,} API calls")
+
+    # One bcrypt hash shared by every account; hashing per user would dominate the run
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(GENERATED_PASSWORD)
+
+    with conn.cursor() as cur:
+        if truncate:
+            print("🗑️  Truncating existing data...")
+            cur.execute("""
+                TRUNCATE users, deeds, shared_deeds, subscriptions, api_usage, user_monthly_usage
+                RESTART IDENTITY CASCADE
+            """)
+
+        # Monthly api_usage partitions covering the generated history
+        month = generator.start.date()
+        while month <= as_of:
+            _create_partition(cur, month)
+            month = add_months(month, 1)
+
+        print("📥 Loading with COPY...")
+        first_user_id = next_id(cur, "users")
+        timed("users", copy_rows, cur, "users", [
+            "id", "email", "password_hash", "full_name", "role", "company_name", "company_type", "phone",
+            "state", "subscribe", "plan", "stripe_customer_id", "created_at", "updated_at", "verified",
+            "last_login", "is_active",
+        ], generator.users(first_user_id, password_hash))
+        sync_sequence(cur, "users")
+
+        timed("subscriptions", copy_rows, cur, "subscriptions", [
+            "user_id", "stripe_subscription_id", "status", "current_period_start", "current_period_end",
+            "plan_name", "created_at", "updated_at",
+        ], generator.subscriptions())
+
+        first_deed_id = next_id(cur, "deeds")
+        timed("deeds", copy_rows, cur, "deeds", [
+            "id", "user_id", "deed_type", "property_address", "grantor_name", "grantee_name",
+            "legal_description", "consideration_amount", "status", "ai_assisted", "created_at",
+            "updated_at", "completed_at", "apn", "county", "owner_type", "sales_price", "vesting",
+        ], generator.deeds(first_deed_id))
+        sync_sequence(cur, "deeds")
+
+        timed("shared_deeds", copy_rows, cur, "shared_deeds", [
+            "deed_id", "recipient_email", "recipient_name", "message", "status", "approval_token",
+            "created_at", "approved_at",
+        ], generator.shared_deeds(first_deed_id))
+
+        timed("api_usage", copy_rows, cur, "api_usage", [
+            "user_id", "endpoint", "method", "timestamp", "response_time_ms", "status_code", "ip_address",
+        ], generator.api_usage())
+
+        print("🔄 Reconciling monthly usage counters...")
+        reconcile_monthly_usage(conn)
+        conn.commit()
+
+        print("📊 Analyzing tables...")
+        for table in ("users", "subscriptions", "deeds", "shared_deeds", "api_usage", "user_monthly_usage"):
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 = 1k users / 100k deeds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", help="Last day of generated history (YYYY-MM-DD, default today)")
+    parser.add_argument("--truncate", action="store_true", help="Empty the tables first (ids then start at 1)")
+    args = parser.parse_args()
+
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d").date() if args.as_of else date.today()
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    started = time.perf_counter()
+    try:
+        generate(conn, args.scale, args.seed, as_of, truncate=args.truncate)
+        print(f"\n🎉 Dataset generated in {time.perf_counter() - started:.1f}s")
+        print(f"🔑 Every generated account uses the password '{GENERATED_PASSWORD}'")
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"❌ Database error: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
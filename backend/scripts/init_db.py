@@ -1,8 +1,16 @@
 import psycopg2
 from dotenv import load_dotenv
 import os
+import sys
 from passlib.context import CryptContext
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage_counters import reconcile_monthly_usage  # noqa: E402
+from schema_migrations import run_migrations  # noqa: E402
+from plan_limits import upsert_plan_limits  # noqa: E402
+from invalidation import publish  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
@@ -21,135 +29,25 @@ def init_database():
         conn = psycopg2.connect(db_url)
         print("✅ Connected to database successfully")
         
+        # Schema comes from the versioned migrations in backend/migrations
+        print("📋 Applying schema migrations...")
+        applied = run_migrations(conn)
+        conn.autocommit = False
+        print(f"✅ Schema up to date ({len(applied)} migrations applied)")
+        
         with conn.cursor() as cur:
-            # Enhanced users table with plan management and Stripe integration
-            print("📋 Creating users table...")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    email VARCHAR(255) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    full_name VARCHAR(255) NOT NULL,
-                    role VARCHAR(50) NOT NULL,
-                    company_name VARCHAR(255),
-                    company_type VARCHAR(50),
-                    phone VARCHAR(20),
-                    state CHAR(2) NOT NULL,
-                    subscribe BOOLEAN DEFAULT FALSE,
-                    plan VARCHAR(50) DEFAULT 'free',
-                    stripe_customer_id VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    verified BOOLEAN DEFAULT FALSE,
-                    last_login TIMESTAMP,
-                    is_active BOOLEAN DEFAULT TRUE
-                );
-            """)
-            
-            # Create index for faster email lookups
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-            """)
-            
-            # Create index for plan filtering
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_users_plan ON users(plan);
-            """)
-            
-            # Deeds table (if not exists) with user relationship
-            print("📋 Creating deeds table...")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS deeds (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    deed_type VARCHAR(100) NOT NULL,
-                    property_address TEXT NOT NULL,
-                    grantor_name VARCHAR(255) NOT NULL,
-                    grantee_name VARCHAR(255) NOT NULL,
-                    legal_description TEXT,
-                    consideration_amount DECIMAL(12,2),
-                    status VARCHAR(50) DEFAULT 'draft',
-                    ai_assisted BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP
-                );
-            """)
-            
-            # Create index for user deed lookups
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_deeds_user_id ON deeds(user_id);
-            """)
-            
-            # Create index for monthly deed counting
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_deeds_created_at ON deeds(created_at);
-            """)
-            
-            # Subscriptions table for Stripe integration
-            print("📋 Creating subscriptions table...")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    stripe_subscription_id VARCHAR(255) UNIQUE,
-                    status VARCHAR(50) NOT NULL,
-                    current_period_start TIMESTAMP,
-                    current_period_end TIMESTAMP,
-                    plan_name VARCHAR(50) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            # API usage tracking table
-            print("📋 Creating api_usage table...")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS api_usage (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    endpoint VARCHAR(255) NOT NULL,
-                    method VARCHAR(10) NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    response_time_ms INTEGER,
-                    status_code INTEGER,
-                    ip_address INET
-                );
-            """)
-            
-            # Plan limits configuration table
-            print("📋 Creating plan_limits table...")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS plan_limits (
-                    id SERIAL PRIMARY KEY,
-                    plan_name VARCHAR(50) UNIQUE NOT NULL,
-                    max_deeds_per_month INTEGER,
-                    api_calls_per_month INTEGER,
-                    ai_assistance BOOLEAN DEFAULT TRUE,
-                    integrations_enabled BOOLEAN DEFAULT FALSE,
-                    priority_support BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            conn.commit()
-            print("✅ All tables created successfully")
-            
             # Seed plan limits data
             print("🌱 Seeding plan limits...")
-            cur.execute("""
-                INSERT INTO plan_limits (plan_name, max_deeds_per_month, api_calls_per_month, ai_assistance, integrations_enabled, priority_support)
-                VALUES 
-                ('free', 5, 100, TRUE, FALSE, FALSE),
-                ('professional', -1, 1000, TRUE, TRUE, FALSE),
-                ('enterprise', -1, 10000, TRUE, TRUE, TRUE)
-                ON CONFLICT (plan_name) DO UPDATE SET
-                    max_deeds_per_month = EXCLUDED.max_deeds_per_month,
-                    api_calls_per_month = EXCLUDED.api_calls_per_month,
-                    ai_assistance = EXCLUDED.ai_assistance,
-                    integrations_enabled = EXCLUDED.integrations_enabled,
-                    priority_support = EXCLUDED.priority_support;
-            """)
+            upsert_plan_limits(cur, [
+                {"plan_name": "free", "max_deeds_per_month": 5, "api_calls_per_month": 100,
+                 "ai_assistance": True, "integrations_enabled": False, "priority_support": False},
+                {"plan_name": "professional", "max_deeds_per_month": -1, "api_calls_per_month": 1000,
+                 "ai_assistance": True, "integrations_enabled": True, "priority_support": False},
+                {"plan_name": "enterprise", "max_deeds_per_month": -1, "api_calls_per_month": 10000,
+                 "ai_assistance": True, "integrations_enabled": True, "priority_support": True},
+            ])
+            # Running API workers drop their cached copies when this commits
+            publish("plan_limits", conn=conn)
             
             # Seed test users
             print("🌱 Seeding test users...")
@@ -255,6 +153,10 @@ def init_database():
                 ON CONFLICT DO NOTHING;
             """)
             
+            # Seeded deeds bypass the counters, rebuild them
+            print("🔄 Reconciling monthly usage counters...")
+            reconcile_monthly_usage(conn)
+            
             conn.commit()
             print("✅ Test data seeded successfully")
             
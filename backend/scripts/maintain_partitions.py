@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pre-create upcoming api_usage partitions and expire old ones
+
+Run daily (e.g. a Render cron job). Retention is controlled by
+API_USAGE_RETENTION_MONTHS, API_USAGE_PARTITIONS_AHEAD and
+API_USAGE_RETENTION_MODE (drop|detach), or the flags below.
+
+Usage: python scripts/maintain_partitions.py [--retention-months 13] [--ahead 3] [--mode drop]
+"""
+
+import os
+import sys
+import argparse
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_usage import (  # noqa: E402
+    API_USAGE_PARTITIONS_AHEAD, API_USAGE_RETENTION_MODE, API_USAGE_RETENTION_MONTHS,
+    maintain_api_usage_partitions
+)
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--retention-months", type=int, default=API_USAGE_RETENTION_MONTHS)
+    parser.add_argument("--ahead", type=int, default=API_USAGE_PARTITIONS_AHEAD)
+    parser.add_argument("--mode", choices=["drop", "detach"], default=API_USAGE_RETENTION_MODE)
+    args = parser.parse_args()
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        result = maintain_api_usage_partitions(
+            conn, months_ahead=args.ahead, retention_months=args.retention_months, mode=args.mode
+        )
+        conn.commit()
+        print(f"✅ Created: {', '.join(result['created']) or 'none'}")
+        print(f"🗑️  Expired ({result['mode']}): {', '.join(result['expired']) or 'none'}")
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"❌ Database error: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Apply or inspect versioned schema migrations (backend/migrations)
+
+Safe to run against the live database: DDL waits at most
+MIGRATION_LOCK_TIMEOUT for locks and retries, indexes are built
+concurrently and backfills run in throttled batches.
+
+Usage:
+    python scripts/migrate.py status
+    python scripts/migrate.py up [--target 0004] [--dry-run]
+"""
+
+import os
+import sys
+import logging
+import argparse
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import MigrationError, applied_versions, discover, run_migrations  # noqa: E402
+
+load_dotenv()
+
+
+def status(conn):
+    applied = applied_versions(conn)
+    for m in discover():
+        if m.version not in applied:
+            state = "⏳ pending"
+        elif applied[m.version] != m.checksum:
+            state = "⚠️  applied (file changed since)"
+        else:
+            state = "✅ applied"
+        print(f"{state:<34} {m!r:<28} {m.description}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "up"])
+    parser.add_argument("--target", help="Stop after this version")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be applied")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        if args.command == "status":
+            status(conn)
+            return
+
+        applied = run_migrations(conn, target=args.target, dry_run=args.dry_run)
+        if args.dry_run:
+            for m in applied:
+                print(f"⏳ would apply {m!r}: {m.description}")
+        print(f"✅ {len(applied)} migration(s) {'pending' if args.dry_run else 'applied'}")
+    except (psycopg2.Error, MigrationError) as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
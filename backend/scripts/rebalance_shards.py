@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Set up deed shards and move users between them online
+
+Shards are the primary (DATABASE_URL) plus SHARD_DATABASE_URLS, see
+backend/shards.py. Commands:
+
+    status                         deeds and users per shard
+    init                           migrate every shard, drop cross-database
+                                   foreign keys, interleave id sequences and
+                                   pin existing users to the shard they are on
+    move --user-id N --to shard2   move one user's deeds to another shard
+    rebalance [--apply]            plan (and run) moves that even out deed
+                                   counts across shards
+
+A move copies the user's deeds and shared_deeds in batches while they keep
+working, then fences the user on the source shard (their writes get a
+retryable 503), copies the last changes, repoints shard_directory and,
+after SHARD_DIRECTORY_TTL so every process has seen the change, deletes the
+source rows. Only the final copy runs under the fence.
+
+Usage:
+    python scripts/rebalance_shards.py status
+    python scripts/rebalance_shards.py move --user-id 42 --to shard1
+    python scripts/rebalance_shards.py rebalance --tolerance 0.1 --max-moves 20 --apply
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shards import shard_router, SHARD_ID_STRIDE, SHARD_DIRECTORY_TTL  # noqa: E402
+from schema_migrations import run_migrations  # noqa: E402
+from invalidation import publish  # noqa: E402
+
+load_dotenv()
+
+MOVE_BATCH_SIZE = int(os.getenv("SHARD_MOVE_BATCH_SIZE", "2000"))
+# How long a move waits for transactions that started before the fence
+FENCE_WAIT_SECONDS = float(os.getenv("SHARD_FENCE_WAIT_SECONDS", "30"))
+# Headroom left above the current max id when interleaving sequences on a live system
+SEQUENCE_HEADROOM = 10000
+
+SHARDED_TABLES = ["deeds", "shared_deeds"]
+
+
+def connect(name):
+    conn = psycopg2.connect(shard_router.shards[name].dsn)
+    with conn.cursor() as cur:
+        # Lets this session write past shard fences (see migration 0006)
+        cur.execute("SET deedpro.shard_move = 'on'")
+    conn.commit()
+    return conn
+
+
+def columns(conn, table):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s AND table_schema = current_schema() AND is_generated = 'NEVER'
+            ORDER BY ordinal_position
+        """, (table,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def owner_filter(table):
+    if table == "deeds":
+        return "user_id = %s"
+    return "deed_id IN (SELECT id FROM deeds WHERE user_id = %s)"
+
+
+def copy_rows(src, dst, table, user_id):
+    """Upsert every row of the user's in table from src to dst, id order, one batch per transaction"""
+    cols = [c for c in columns(src, table) if c in set(columns(dst, table))]
+    cols.remove("id")
+    cols.insert(0, "id")
+    col_sql = ", ".join(cols)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols[1:])
+
+    copied, last_id = 0, 0
+    while True:
+        with src.cursor() as cur:
+            cur.execute(f"""
+                SELECT {col_sql} FROM {table}
+                WHERE {owner_filter(table)} AND id > %s
+                ORDER BY id LIMIT %s
+            """, (user_id, last_id, MOVE_BATCH_SIZE))
+            rows = cur.fetchall()
+        src.rollback()
+        if not rows:
+            return copied
+        with dst.cursor() as cur:
+            execute_values(cur, f"""
+                INSERT INTO {table} ({col_sql}) VALUES %s
+                ON CONFLICT (id) DO UPDATE SET {updates}
+            """, rows)
+        dst.commit()
+        copied += len(rows)
+        last_id = rows[-1][0]
+
+
+def delete_rows(conn, table, user_id, keep_ids=None):
+    """Delete the user's rows in batches, except keep_ids"""
+    deleted = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE {owner_filter(table)} AND NOT (id = ANY(%s))
+                    LIMIT %s
+                )
+            """, (user_id, list(keep_ids or []), MOVE_BATCH_SIZE))
+            count = cur.rowcount
+        conn.commit()
+        deleted += count
+        if count < MOVE_BATCH_SIZE:
+            return deleted
+
+
+def row_ids(conn, table, user_id):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id FROM {table} WHERE {owner_filter(table)}", (user_id,))
+        ids = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+    return ids
+
+
+def wait_for_older_transactions(conn, since):
+    """Wait until no transaction that started before the fence can still write unfenced"""
+    deadline = time.monotonic() + FENCE_WAIT_SECONDS
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*) FROM pg_stat_activity
+                WHERE datname = current_database() AND pid <> pg_backend_pid()
+                  AND xact_start < %s AND (backend_xid IS NOT NULL OR state = 'active')
+            """, (since,))
+            remaining = cur.fetchone()[0]
+        conn.rollback()
+        if not remaining:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{remaining} transaction(s) older than the fence are still running")
+        time.sleep(0.2)
+
+
+def move_user(user_id, target):
+    primary = connect(shard_router.primary.name)
+    source = shard_router.shard_name(user_id, fresh=True)
+    if source == target:
+        print(f"✅ User {user_id} is already on {target}")
+        return
+
+    print(f"🚚 Moving user {user_id}: {source} → {target}")
+    src, dst = connect(source), connect(target)
+    flipped = False
+    try:
+        # 1. Bulk copy while the user keeps working
+        for table in SHARDED_TABLES:
+            print(f"   📋 {table}: {copy_rows(src, dst, table, user_id)} rows copied")
+
+        # 2. Fence the source and let in-flight writers finish
+        with src.cursor() as cur:
+            cur.execute("""
+                INSERT INTO shard_fences (user_id, target_shard) VALUES (%s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET target_shard = EXCLUDED.target_shard, created_at = now()
+                RETURNING created_at
+            """, (user_id, target))
+            fenced_at = cur.fetchone()[0]
+        src.commit()
+        wait_for_older_transactions(src, fenced_at)
+
+        # 3. Catch up on changes made during the bulk copy (rows are frozen now)
+        for table in SHARDED_TABLES:
+            copy_rows(src, dst, table, user_id)
+        for table in reversed(SHARDED_TABLES):
+            delete_rows(dst, table, user_id, keep_ids=row_ids(src, table, user_id))
+        with src.cursor() as cur:
+            cur.execute("SELECT month, deeds_created FROM user_monthly_usage WHERE user_id = %s", (user_id,))
+            counters = cur.fetchall()
+        src.rollback()
+        if counters:
+            with dst.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO user_monthly_usage (user_id, month, deeds_created) VALUES %s
+                    ON CONFLICT (user_id, month) DO UPDATE SET
+                        deeds_created = EXCLUDED.deeds_created, updated_at = CURRENT_TIMESTAMP
+                """, [(user_id, month, count) for month, count in counters])
+            dst.commit()
+
+        # 4. Repoint the directory; writers look it up fresh, readers within the TTL
+        with primary.cursor() as cur:
+            cur.execute("""
+                INSERT INTO shard_directory (user_id, shard) VALUES (%s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET shard = EXCLUDED.shard, updated_at = CURRENT_TIMESTAMP
+            """, (user_id, target))
+        publish("shard_directory", user_id, conn=primary)
+        primary.commit()
+        flipped = True
+        # Workers evict on the notification; the wait covers any whose listener was down
+        print(f"   🔀 Directory now points at {target}, waiting {SHARD_DIRECTORY_TTL:.0f}s for cached readers")
+        time.sleep(SHARD_DIRECTORY_TTL)
+
+        # 5. Drop the source copy and lift the fence
+        for table in reversed(SHARDED_TABLES):
+            delete_rows(src, table, user_id)
+        with src.cursor() as cur:
+            cur.execute("UPDATE user_monthly_usage SET deeds_created = 0, updated_at = CURRENT_TIMESTAMP WHERE user_id = %s",
+                        (user_id,))
+            cur.execute("DELETE FROM shard_fences WHERE user_id = %s", (user_id,))
+        src.commit()
+        print(f"✅ User {user_id} moved to {target}")
+    except Exception:
+        for conn in (src, dst):
+            conn.rollback()
+        if not flipped:
+            # Nothing points at the target yet: drop the partial copy and unfence
+            for table in reversed(SHARDED_TABLES):
+                delete_rows(dst, table, user_id)
+            with src.cursor() as cur:
+                cur.execute("DELETE FROM shard_fences WHERE user_id = %s", (user_id,))
+            src.commit()
+        raise
+    finally:
+        for conn in (src, dst, primary):
+            conn.close()
+
+
+def deed_counts():
+    """shard name -> {user_id: deed count}"""
+    counts = {}
+    for name in shard_router.shards:
+        conn = connect(name)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT user_id, COUNT(*) FROM deeds WHERE user_id IS NOT NULL GROUP BY user_id")
+                counts[name] = dict(cur.fetchall())
+        finally:
+            conn.close()
+    return counts
+
+
+def plan_moves(counts, tolerance, max_moves):
+    """Greedy: move the biggest user that fits from the fullest shard to the emptiest"""
+    counts = {name: dict(users) for name, users in counts.items()}
+    totals = {name: sum(users.values()) for name, users in counts.items()}
+    average = sum(totals.values()) / len(totals)
+    moves = []
+    while len(moves) < max_moves:
+        heavy = max(totals, key=totals.get)
+        light = min(totals, key=totals.get)
+        gap = totals[heavy] - totals[light]
+        if gap <= tolerance * average:
+            break
+        candidates = [(n, u) for u, n in counts[heavy].items() if n <= gap / 2]
+        if not candidates:
+            break
+        size, user_id = max(candidates)
+        moves.append((user_id, heavy, light, size))
+        del counts[heavy][user_id]
+        counts[light][user_id] = size
+        totals[heavy] -= size
+        totals[light] += size
+    return moves
+
+
+def status():
+    counts = deed_counts()
+    conn = connect(shard_router.primary.name)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT shard, COUNT(*) FROM shard_directory GROUP BY shard")
+            pinned = dict(cur.fetchall())
+    finally:
+        conn.close()
+    print(f"{'shard':<12} {'deeds':>12} {'users':>10} {'pinned':>10}")
+    for name, users in counts.items():
+        print(f"{name:<12} {sum(users.values()):>12} {len(users):>10} {pinned.get(name, 0):>10}")
+
+
+def init():
+    names = list(shard_router.shards)
+    for name in names:
+        conn = psycopg2.connect(shard_router.shards[name].dsn)
+        try:
+            print(f"📋 Migrating {name}...")
+            run_migrations(conn)
+            if name != shard_router.primary.name:
+                # users lives on the primary only, so these references cannot be enforced here
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT c.conrelid::regclass, c.conname FROM pg_constraint c
+                        WHERE c.contype = 'f' AND c.confrelid = 'users'::regclass
+                          AND c.conrelid IN ('deeds'::regclass, 'user_monthly_usage'::regclass)
+                    """)
+                    for table, constraint in cur.fetchall():
+                        cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+                        print(f"   🔓 Dropped {table}.{constraint}")
+        finally:
+            conn.close()
+
+    conns = {name: connect(name) for name in names}
+    try:
+        for table in SHARDED_TABLES:
+            highest = 0
+            for conn in conns.values():
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                    highest = max(highest, cur.fetchone()[0])
+            base = (highest + SEQUENCE_HEADROOM) // SHARD_ID_STRIDE * SHARD_ID_STRIDE + SHARD_ID_STRIDE
+            for index, (name, conn) in enumerate(conns.items()):
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+                    sequence = cur.fetchone()[0]
+                    cur.execute(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE} RESTART WITH {base + index}")
+                conn.commit()
+            print(f"🔢 {table} ids interleaved from {base} (stride {SHARD_ID_STRIDE})")
+
+        # Pin everyone who already has deeds to the shard holding them
+        primary = conns[shard_router.primary.name]
+        for name, conn in conns.items():
+            with conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT user_id FROM deeds WHERE user_id IS NOT NULL")
+                user_ids = [row[0] for row in cur.fetchall()]
+            conn.rollback()
+            with primary.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO shard_directory (user_id, shard) VALUES %s
+                    ON CONFLICT (user_id) DO NOTHING
+                """, [(user_id, name) for user_id in user_ids])
+            primary.commit()
+            print(f"📌 {len(user_ids)} users pinned to {name}")
+    finally:
+        for conn in conns.values():
+            conn.close()
+    print("✅ Shards initialized")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "init", "move", "rebalance"])
+    parser.add_argument("--user-id", type=int, help="User to move")
+    parser.add_argument("--to", help="Target shard name (primary, shard1, ...)")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Stop when shards are within this fraction of the average")
+    parser.add_argument("--max-moves", type=int, default=20)
+    parser.add_argument("--apply", action="store_true", help="Run the planned moves")
+    args = parser.parse_args()
+
+    if not shard_router.primary:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+    if args.command != "init" and not shard_router.enabled:
+        print("❌ Error: SHARD_DATABASE_URLS is not set, there is only one shard")
+        sys.exit(1)
+
+    try:
+        if args.command == "status":
+            status()
+        elif args.command == "init":
+            init()
+        elif args.command == "move":
+            if args.user_id is None or args.to not in shard_router.shards:
+                parser.error(f"move needs --user-id and --to one of: {', '.join(shard_router.shards)}")
+            move_user(args.user_id, args.to)
+        else:
+            moves = plan_moves(deed_counts(), args.tolerance, args.max_moves)
+            if not moves:
+                print("✅ Shards are balanced")
+            for user_id, source, target, size in moves:
+                print(f"{'🚚' if args.apply else '📝'} user {user_id} ({size} deeds): {source} → {target}")
+                if args.apply:
+                    move_user(user_id, target)
+    except (psycopg2.Error, RuntimeError) as e:
+        print(f"❌ Failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rebuild user_monthly_usage from the deeds and api_usage tables
+
+With deed shards (SHARD_DATABASE_URLS) the primary is rebuilt from its own
+deeds and api_usage, and every other shard (or just the user's, with
+--user-id) has its deeds_created counters rebuilt from its own deeds.
+
+Usage: python scripts/reconcile_usage.py [--user-id 42] [--month 2024-01]
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage_counters import reconcile_monthly_usage  # noqa: E402
+from shards import shard_router  # noqa: E402
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--user-id", type=int, help="Only reconcile this user")
+    parser.add_argument("--month", help="Only reconcile this month (YYYY-MM)")
+    args = parser.parse_args()
+
+    month = datetime.strptime(args.month, "%Y-%m").date() if args.month else None
+
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    if not db_url:
+        print("❌ Error: DATABASE_URL or DB_URL not found in environment variables")
+        sys.exit(1)
+
+    # shard name -> (dsn, rebuild api_calls too); api_calls are only counted on the primary
+    targets = {"primary": (db_url, True)}
+    if shard_router.enabled:
+        if args.user_id is not None:
+            shards = [shard_router.pool_for(args.user_id, fresh=True)]
+        else:
+            shards = list(shard_router.shards.values())
+        targets = {shard_router.primary.name: (shard_router.primary.dsn, True)}
+        for pool in shards:
+            if pool is not shard_router.primary:
+                targets[pool.name] = (pool.dsn, False)
+
+    for name, (dsn, api_calls) in targets.items():
+        conn = psycopg2.connect(dsn)
+        try:
+            rows = reconcile_monthly_usage(conn, user_id=args.user_id, month=month, api_calls=api_calls)
+            conn.commit()
+            counted = "deeds and API calls" if api_calls else "deeds"
+            print(f"✅ Reconciled {rows} monthly usage rows on {name} ({counted})")
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"❌ Database error on {name}: {e}")
+            sys.exit(1)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
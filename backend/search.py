@@ -0,0 +1,145 @@
+"""
+Indexed search helpers
+
+User lookups use pg_trgm: substring ILIKE patterns are answered from GIN
+trigram indexes on email, full_name and company_name instead of a sequential
+scan, and hits are ranked by trigram similarity.
+
+Deed search uses the trigger-maintained deeds.search_vector (GIN) for
+addresses, party names and legal descriptions, plus a prefix match on
+deeds.apn_normalized so "123-456-789", "123 456 789" and "123456789" agree.
+"""
+
+import os
+import re
+import html
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+# Trigram indexes need at least three characters to narrow anything down
+SEARCH_MIN_LENGTH = int(os.getenv("SEARCH_MIN_LENGTH", "3"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+
+# Deepest result offset a deed search may page to
+DEED_SEARCH_MAX_DEPTH = int(os.getenv("DEED_SEARCH_MAX_DEPTH", "1000"))
+
+# ts_headline marks matches with control characters; the text is HTML-escaped in
+# Python before they become <mark> tags, since it is user input
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+HEADLINE_OPTIONS = f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxFragments=2, MaxWords=20, MinWords=5'
+
+
+def like_pattern(term: str) -> str:
+    """Escape LIKE wildcards and wrap the term for a substring match"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def render_highlight(headline: Optional[str]) -> Optional[str]:
+    """HTML for a ts_headline result: escaped text with matches in <mark>"""
+    if headline is None:
+        return None
+    return html.escape(headline).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+def validate_search_term(term: str) -> str:
+    term = term.strip()
+    if len(term) < SEARCH_MIN_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Search term must be at least {SEARCH_MIN_LENGTH} characters"
+        )
+    return term
+
+
+def search_users(cur, term: str, filters: List[str], params: list, limit: int) -> List[dict]:
+    """
+    Rank users whose email, full name or company contains term
+
+    filters/params are extra AND conditions on users (e.g. plan, is_active).
+    At most SEARCH_MAX_RESULTS rows are returned.
+    """
+    term = validate_search_term(term)
+    pattern = like_pattern(term)
+    extra = "".join(f" AND {f}" for f in filters)
+
+    cur.execute(f"""
+        SELECT id, email, full_name, role, company_name, state, plan,
+               is_active, created_at, last_login,
+               GREATEST(
+                   similarity(email, %s),
+                   similarity(full_name, %s),
+                   similarity(COALESCE(company_name, ''), %s)
+               ) AS score
+        FROM users
+        WHERE (email ILIKE %s OR full_name ILIKE %s OR company_name ILIKE %s){extra}
+        ORDER BY score DESC, id DESC
+        LIMIT %s
+    """, [term, term, term, pattern, pattern, pattern] + params + [min(limit, SEARCH_MAX_RESULTS)])
+    return [dict(row) for row in cur.fetchall()]
+
+
+def normalize_apn(term: str) -> str:
+    """Lowercase alphanumerics only, matching deeds.apn_normalized"""
+    return re.sub(r"[^0-9a-z]", "", term.lower())
+
+
+def search_deeds(cur, term: str, user_id: Optional[int], limit: int, offset: int) -> List[dict]:
+    """
+    Ranked full-text search over deeds, optionally scoped to one owner
+
+    Returns up to limit + 1 rows so callers can tell whether another page
+    exists. Highlights are only computed for the returned page.
+    """
+    term = validate_search_term(term)
+    if offset + limit > DEED_SEARCH_MAX_DEPTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Search results are limited to the first {DEED_SEARCH_MAX_DEPTH} matches, refine your query"
+        )
+
+    # Only treat the term as an APN when it looks like one
+    apn = normalize_apn(term)
+    apn_match = bool(re.search(r"\d", apn))
+
+    match_sql = "d.search_vector @@ websearch_to_tsquery('english', %s)"
+    match_params = [term]
+    apn_rank_sql = "0.0"
+    apn_rank_params = []
+    if apn_match:
+        # Constant prefix pattern so the text_pattern_ops index applies
+        match_sql = f"({match_sql} OR d.apn_normalized LIKE %s)"
+        match_params.append(apn + "%")
+        apn_rank_sql = "CASE WHEN d.apn_normalized = %s THEN 1.0 ELSE 0.0 END"
+        apn_rank_params = [apn]
+
+    owner_filter = "AND d.user_id = %s" if user_id is not None else ""
+    owner_params = [user_id] if user_id is not None else []
+
+    cur.execute(f"""
+        WITH hits AS (
+            SELECT d.id, d.user_id, d.deed_type, d.property_address, d.apn, d.county,
+                   d.grantor_name, d.grantee_name, d.legal_description, d.status, d.created_at,
+                   ts_rank_cd(d.search_vector, websearch_to_tsquery('english', %s))::float8
+                       + {apn_rank_sql} AS rank
+            FROM deeds d
+            WHERE {match_sql}
+              {owner_filter}
+            ORDER BY rank DESC, d.id DESC
+            LIMIT %s OFFSET %s
+        )
+        SELECT id, user_id, deed_type, property_address, apn, county,
+               grantor_name, grantee_name, status, created_at, rank,
+               ts_headline('english',
+                           translate(concat_ws(' ... ', property_address, grantor_name,
+                                               grantee_name, legal_description), chr(2) || chr(3), ''),
+                           websearch_to_tsquery('english', %s), %s) AS highlight
+        FROM hits
+        ORDER BY rank DESC, id DESC
+    """, [term] + apn_rank_params + match_params + owner_params + [limit + 1, offset, term, HEADLINE_OPTIONS])
+    rows = [dict(row) for row in cur.fetchall()]
+    for row in rows:
+        row["highlight"] = render_highlight(row["highlight"])
+    return rows
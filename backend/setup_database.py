@@ -2,6 +2,9 @@
 """
 Simple Database Setup Script for DeedPro
 Run this locally to initialize your Render PostgreSQL database
+
+Deprecated: drops all tables. Use scripts/migrate.py (schema) and
+scripts/init_db.py (seed data) instead.
 """
 
 import psycopg2
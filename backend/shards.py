@@ -0,0 +1,276 @@
+"""
+Sharding deeds by user_id
+
+The primary database keeps the global tables (users, plans, api_usage) and
+is also the first deed shard; SHARD_DATABASE_URLS adds more deed shards.
+Every deed, its shared_deeds rows and the user's deed counters live on
+exactly one shard, so per-user queries touch one database.
+
+Placement is a directory with a consistent-hash fallback:
+- shard_directory (on the primary) pins a user to a named shard; users are
+  pinned on their first deed write and by scripts/rebalance_shards.py
+- users without a row are placed on a hash ring of the shard names, so
+  adding a shard only affects new users, never existing data
+
+Directory reads are cached for SHARD_DIRECTORY_TTL seconds (and evicted
+early through the invalidation bus when a user is moved); writes always
+look the user up fresh. While a user is being moved, the source shard fences
+their rows (shard_fences) and writes fail with SHARD_MOVED_SQLSTATE, which
+ShardRouter.run() answers by re-resolving the shard and retrying once.
+
+Without SHARD_DATABASE_URLS everything routes to the primary pool (and
+reads to the replicas) exactly as before.
+"""
+
+import os
+import time
+import bisect
+import hashlib
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+from fastapi import Depends, Request
+
+from auth import get_current_user_id
+from invalidation import invalidation_bus
+from db_pool import DatabasePool, get_pool, get_read_db, read_pool, borrow, client_key, mark_recent_write
+
+logger = logging.getLogger(__name__)
+
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", "30"))
+SHARD_DIRECTORY_CACHE_SIZE = int(os.getenv("SHARD_DIRECTORY_CACHE_SIZE", "100000"))
+
+# deeds/shared_deeds ids are interleaved so they stay unique across shards:
+# shard i hands out ids congruent to i modulo the stride (at most this many shards)
+SHARD_ID_STRIDE = 64
+
+# Raised by the shard_fences trigger for writes to a user that is being moved
+SHARD_MOVED_SQLSTATE = "DP001"
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+def is_shard_moved(error: Exception) -> bool:
+    return isinstance(error, psycopg2.Error) and error.pgcode == SHARD_MOVED_SQLSTATE
+
+
+class ShardRouter:
+    """Maps user_id to the pool of the deed shard holding that user's rows"""
+
+    def __init__(self, primary: Optional[DatabasePool], shards: List[DatabasePool],
+                 vnodes: int = SHARD_VNODES, directory_ttl: float = SHARD_DIRECTORY_TTL):
+        self.primary = primary
+        self.shards: Dict[str, DatabasePool] = {}
+        if primary:
+            self.shards[primary.name] = primary
+            for shard in shards:
+                self.shards[shard.name] = shard
+        self.directory_ttl = directory_ttl
+
+        self._ring = sorted(
+            (_hash(f"{name}#{v}"), name) for name in self.shards for v in range(vnodes)
+        )
+        self._ring_keys = [h for h, _ in self._ring]
+        # user_id -> (expires_at, shard name or None when the user has no directory row)
+        self._directory = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self._lookups = 0
+        self._cache_hits = 0
+        self._moved_retries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.shards) > 1
+
+    def placement(self, user_id: int) -> str:
+        """Hash-ring shard for a user that has no directory row"""
+        index = bisect.bisect(self._ring_keys, _hash(str(user_id))) % len(self._ring)
+        return self._ring[index][1]
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Forget cached directory entries (one user, or all)"""
+        with self._lock:
+            if user_id is None:
+                self._directory.clear()
+            else:
+                self._directory.pop(user_id, None)
+
+    def _lookup(self, user_id: int) -> Optional[str]:
+        with self.primary.connection("shard_directory_lookup") as conn, conn.cursor() as cur:
+            cur.execute("SELECT shard FROM shard_directory WHERE user_id = %s", (user_id,))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def shard_name(self, user_id: int, fresh: bool = False) -> str:
+        """Name of the shard holding user_id's deeds"""
+        if not self.enabled:
+            return self.primary.name if self.primary else None
+
+        now = time.monotonic()
+        with self._lock:
+            self._lookups += 1
+            cached = None if fresh else self._directory.get(user_id)
+            if cached and cached[0] > now:
+                self._cache_hits += 1
+                name = cached[1]
+                return name if name is not None else self.placement(user_id)
+
+        name = self._lookup(user_id)
+        with self._lock:
+            if len(self._directory) >= SHARD_DIRECTORY_CACHE_SIZE:
+                self._directory.clear()
+            self._directory[user_id] = (now + self.directory_ttl, name)
+        if name is not None and name not in self.shards:
+            raise RuntimeError(f"User {user_id} is assigned to unknown shard {name!r}, check SHARD_DATABASE_URLS")
+        return name if name is not None else self.placement(user_id)
+
+    def assign(self, user_id: int) -> str:
+        """Pin user_id in the directory (at its hash placement if new) and return its shard"""
+        if not self.enabled:
+            return self.primary.name
+        with self.primary.connection("shard_directory_assign") as conn, conn.cursor() as cur:
+            cur.execute("""
+                WITH pinned AS (
+                    INSERT INTO shard_directory (user_id, shard) VALUES (%s, %s)
+                    ON CONFLICT (user_id) DO NOTHING
+                    RETURNING shard
+                )
+                SELECT shard FROM pinned
+                UNION ALL
+                SELECT shard FROM shard_directory WHERE user_id = %s
+                LIMIT 1
+            """, (user_id, self.placement(user_id), user_id))
+            row = cur.fetchone()
+            if row is None:
+                # Lost a race with a concurrent first write; that row is committed now
+                cur.execute("SELECT shard FROM shard_directory WHERE user_id = %s", (user_id,))
+                row = cur.fetchone()
+            name = row[0]
+        with self._lock:
+            self._directory[user_id] = (time.monotonic() + self.directory_ttl, name)
+        return name
+
+    def pool_for(self, user_id: int, fresh: bool = False) -> Optional[DatabasePool]:
+        """Pool of the shard holding user_id's deeds"""
+        if not self.enabled:
+            return self.primary
+        return self.shards[self.shard_name(user_id, fresh=fresh)]
+
+    def write_pool_for(self, user_id: int) -> Optional[DatabasePool]:
+        """Pool for writing user_id's deeds: a fresh lookup, pinning the user if new"""
+        if not self.enabled:
+            return self.primary
+        return self.shards[self.assign(user_id)]
+
+    def read_pool_for(self, user_id: int, client: Optional[str] = None) -> Optional[DatabasePool]:
+        """Pool for reading user_id's deeds; replicas are used when unsharded"""
+        if not self.enabled:
+            return read_pool(client)
+        return self.pool_for(user_id)
+
+    def run(self, user_id: int, func: Callable, operation: Optional[str] = None):
+        """
+        func(conn) in one transaction on user_id's shard
+
+        Retried once on the new shard if the user was moved in the meantime,
+        so func must be safe to run again.
+        """
+        for attempt in (1, 2):
+            pool = self.write_pool_for(user_id)
+            try:
+                with pool.connection(operation) as conn:
+                    return func(conn)
+            except psycopg2.Error as e:
+                if not is_shard_moved(e) or attempt == 2:
+                    raise
+                with self._lock:
+                    self._moved_retries += 1
+                logger.info(f"User {user_id} moved off {pool.name}, retrying {operation or 'write'}")
+                self.invalidate(user_id)
+
+    def scatter(self, func: Callable, operation: Optional[str] = None) -> List:
+        """func(conn) on every shard in parallel; results in shard order"""
+        if not self.enabled:
+            with self.primary.connection(operation) as conn:
+                return [func(conn)]
+
+        def call(pool):
+            with pool.connection(operation) as conn:
+                return func(conn)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard-scatter")
+        # Each shard query runs in the request's context, so its query budget applies
+        futures = [self._executor.submit(contextvars.copy_context().run, call, pool) for pool in self.shards.values()]
+        return [future.result() for future in futures]
+
+    def monthly_deed_count(self, user_id: int) -> Optional[int]:
+        """This month's deed counter from the user's shard, or None when it lives on the primary"""
+        pool = self.pool_for(user_id)
+        if pool is self.primary:
+            return None
+        with pool.connection("shard_deed_count") as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT deeds_created FROM user_monthly_usage
+                WHERE user_id = %s AND month = DATE_TRUNC('month', CURRENT_DATE)::date
+            """, (user_id,))
+            row = cur.fetchone()
+        return row[0] if row else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups, hits, retries, cached = self._lookups, self._cache_hits, self._moved_retries, len(self._directory)
+        return {
+            "enabled": self.enabled,
+            "shards": list(self.shards),
+            "directory_lookups": lookups,
+            "directory_cache_hits": hits,
+            "directory_cached_users": cached,
+            "moved_retries": retries,
+            "pools": {name: pool.stats() for name, pool in self.shards.items() if pool is not self.primary},
+        }
+
+    def close(self):
+        for pool in self.shards.values():
+            if pool is not self.primary:
+                pool.close()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+def _shard_pools() -> List[DatabasePool]:
+    urls = [url.strip() for url in (os.getenv("SHARD_DATABASE_URLS") or "").split(",") if url.strip()]
+    return [DatabasePool(url, name=f"shard{i + 1}") for i, url in enumerate(urls)]
+
+
+shard_router = ShardRouter(get_pool(), _shard_pools() if get_pool() else [])
+invalidation_bus.register("shard_directory", lambda key: shard_router.invalidate(int(key) if key is not None else None))
+
+
+def get_shard_db(request: Request, user_id: int = Depends(get_current_user_id)):
+    """FastAPI dependency yielding a connection on the current user's deed shard, for writes"""
+    if get_pool() is None:
+        yield None
+        return
+    mark_recent_write(client_key(request))
+    yield from borrow(shard_router.write_pool_for(user_id))
+
+
+def get_shard_read_db(request: Request, user_id: int = Depends(get_current_user_id)):
+    """FastAPI dependency yielding a read connection for the current user's deeds"""
+    if not shard_router.enabled:
+        yield from get_read_db(request)
+        return
+    yield from borrow(shard_router.pool_for(user_id))
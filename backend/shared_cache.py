@@ -0,0 +1,482 @@
+"""
+Cache shared by the main and external APIs
+
+Each SharedCache is one namespace (e.g. "user_plans") with two tiers:
+
+- L1, a per-process LRU of up to SHARED_CACHE_L1_SIZE entries. While an L2
+  is configured entries stay in it at most SHARED_CACHE_L1_TTL seconds, so
+  writes made by the other service show up quickly.
+- L2, a Redis-protocol server at SHARED_CACHE_URL that every worker of both
+  Render services talks to. Without the URL (or the redis package) only L1
+  is used.
+
+get_or_load(key, loader) answers from L1, then L2. On a miss it calls
+loader() once per key and process, and concurrent callers wait for that
+result (single-flight). Across processes, a short-lived L2 lock key lets one
+process load while the others poll L2 for its result. Entries remember how
+long they took to load, and every hit may refresh one early, with a
+probability that rises as expiry nears (XFetch: refresh when
+now - delta * beta * ln(rand) >= expiry). A hot key is then reloaded by one
+caller shortly before it expires instead of by all of them right after.
+
+Namespaces are defined here so both services use the same keys. For now only
+main.py reads through them: external_api's partner and deed data are still
+in-memory placeholders, so it only opens the L2 connection and reports stats.
+
+Values are stored in L2 as JSON, so loaders must return JSON-compatible data.
+L2 errors count as misses, and L2 is skipped for a few seconds after one.
+Postgres remains the source of truth.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Redis client for the L2 tier (install with: pip install redis)
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from db_pool import LATENCY_SAMPLE_SIZE
+from invalidation import invalidation_bus, publish
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", os.getenv("REDIS_URL", ""))
+SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "deedpro")
+SHARED_CACHE_L1_SIZE = int(os.getenv("SHARED_CACHE_L1_SIZE", "10000"))
+SHARED_CACHE_L1_TTL = float(os.getenv("SHARED_CACHE_L1_TTL", "5"))
+# XFetch beta: above 1 refreshes earlier, below 1 later, 0 never early
+SHARED_CACHE_EARLY_REFRESH_BETA = float(os.getenv("SHARED_CACHE_EARLY_REFRESH_BETA", "1"))
+# How long other processes wait for the one loading a key before loading it themselves
+SHARED_CACHE_LOCK_SECONDS = float(os.getenv("SHARED_CACHE_LOCK_SECONDS", "2"))
+SHARED_CACHE_SOCKET_TIMEOUT = float(os.getenv("SHARED_CACHE_SOCKET_TIMEOUT", "0.25"))
+SHARED_CACHE_RETRY_SECONDS = 5.0
+SHARED_CACHE_POLL_SECONDS = 0.05
+
+
+class SharedCacheTier:
+    """The L2 connection shared by every namespace in this process; errors become misses"""
+
+    def __init__(self, url: str = SHARED_CACHE_URL, socket_timeout: float = SHARED_CACHE_SOCKET_TIMEOUT):
+        self.url = url
+        self.socket_timeout = socket_timeout
+        self._client = None
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+
+        self.errors = 0
+        if url and not REDIS_AVAILABLE:
+            logger.warning("SHARED_CACHE_URL is set but the redis package is not installed; using L1 only")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url) and REDIS_AVAILABLE
+
+    def _connection(self):
+        if not self.enabled or time.monotonic() < self._down_until:
+            return None
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(
+                    self.url, socket_timeout=self.socket_timeout,
+                    socket_connect_timeout=self.socket_timeout, health_check_interval=30,
+                )
+            return self._client
+
+    def _failed(self, operation: str, e: Exception):
+        with self._lock:
+            self.errors += 1
+            self._down_until = time.monotonic() + SHARED_CACHE_RETRY_SECONDS
+        logger.warning(f"Shared cache {operation} failed, skipping L2 for {SHARED_CACHE_RETRY_SECONDS:.0f}s: {e}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        client = self._connection()
+        if client is None:
+            return None
+        try:
+            return client.get(key)
+        except redis.RedisError as e:
+            self._failed("get", e)
+            return None
+
+    def set(self, key: str, data: str, ttl: float):
+        client = self._connection()
+        if client is None:
+            return
+        try:
+            client.set(key, data, px=max(1, int(ttl * 1000)))
+        except redis.RedisError as e:
+            self._failed("set", e)
+
+    def lock(self, key: str, ttl: float) -> Optional[bool]:
+        """True if we took the lock, False if someone holds it, None when L2 is unavailable"""
+        client = self._connection()
+        if client is None:
+            return None
+        try:
+            return bool(client.set(key, "1", px=max(1, int(ttl * 1000)), nx=True))
+        except redis.RedisError as e:
+            self._failed("lock", e)
+            return None
+
+    def delete(self, *keys: str):
+        client = self._connection()
+        if client is None or not keys:
+            return
+        try:
+            client.delete(*keys)
+        except redis.RedisError as e:
+            self._failed("delete", e)
+
+    def delete_prefix(self, prefix: str):
+        client = self._connection()
+        if client is None:
+            return
+        try:
+            batch = []
+            for key in client.scan_iter(match=f"{prefix}*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    client.delete(*batch)
+                    batch = []
+            if batch:
+                client.delete(*batch)
+        except redis.RedisError as e:
+            self._failed("delete", e)
+
+    def start(self):
+        """Check the L2 answers (the app starts either way)"""
+        client = self._connection()
+        if client is None:
+            return
+        try:
+            client.ping()
+            logger.info("Shared cache L2 connected")
+        except redis.RedisError as e:
+            self._failed("ping", e)
+
+    def stop(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def stats(self) -> dict:
+        return {
+            "l2_enabled": self.enabled,
+            "l2_available": self.enabled and time.monotonic() >= self._down_until,
+            "l2_errors": self.errors,
+        }
+
+
+shared_cache_tier = SharedCacheTier()
+_namespaces: Dict[str, "SharedCache"] = {}
+
+
+class _Entry:
+    __slots__ = ("value", "delta", "expires_at")
+
+    def __init__(self, value, delta: float, expires_at: float):
+        self.value = value
+        self.delta = delta  # seconds the load took
+        self.expires_at = expires_at  # wall clock, comparable across processes
+
+    def encode(self) -> str:
+        return json.dumps({"v": self.value, "d": self.delta, "e": self.expires_at})
+
+    @classmethod
+    def decode(cls, data) -> "_Entry":
+        body = json.loads(data)
+        return cls(body["v"], float(body["d"]), float(body["e"]))
+
+
+class _Flight:
+    """One in-progress load that other callers for the same key wait on"""
+
+    __slots__ = ("done", "entry", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class SharedCache:
+    """One namespace of the shared cache"""
+
+    def __init__(self, namespace: str, ttl: float, tier: SharedCacheTier = shared_cache_tier,
+                 l1_size: int = SHARED_CACHE_L1_SIZE, l1_ttl: float = SHARED_CACHE_L1_TTL,
+                 beta: float = SHARED_CACHE_EARLY_REFRESH_BETA, negative_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        # TTL for a loader result of None (defaults to ttl); 0 or less keeps None out of the cache
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.tier = tier
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.beta = beta
+
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.early_refreshes = 0
+        self.collapsed = 0
+        self._hit_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self._load_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+        _namespaces[namespace] = self
+        invalidation_bus.register(f"shared_cache.{namespace}", self.evict_local)
+
+    def _l2_key(self, key: str) -> str:
+        return f"{SHARED_CACHE_PREFIX}:{self.namespace}:{key}"
+
+    # L1
+
+    def _l1_get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            item = self._l1.get(key)
+            if item is None:
+                return None
+            entry, l1_expires_at = item
+            if time.time() >= l1_expires_at:
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _l1_put(self, key: str, entry: _Entry):
+        # Without an L2 nothing else can serve newer data, so keep the full TTL
+        l1_expires_at = min(entry.expires_at, time.time() + self.l1_ttl) if self.tier.enabled else entry.expires_at
+        with self._lock:
+            self._l1[key] = (entry, l1_expires_at)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    def evict_local(self, key: Optional[str] = None):
+        """Drop one key (or all) from this process's L1"""
+        with self._lock:
+            if key is None:
+                self._l1.clear()
+            else:
+                self._l1.pop(str(key), None)
+
+    # L2
+
+    def _l2_get(self, key: str) -> Optional[_Entry]:
+        data = self.tier.get(self._l2_key(key))
+        if data is None:
+            return None
+        try:
+            entry = _Entry.decode(data)
+        except (ValueError, KeyError, TypeError):
+            return None
+        return entry if entry.expires_at > time.time() else None
+
+    def _l2_put(self, key: str, entry: _Entry):
+        if not self.tier.enabled:
+            return
+        try:
+            data = entry.encode()
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Shared cache {self.namespace} value for {key!r} is not JSON, kept in L1 only: {e}")
+            return
+        self.tier.set(self._l2_key(key), data, entry.expires_at - time.time())
+
+    # Reads
+
+    def get_or_load(self, key, loader: Callable[[], Any]):
+        """Cached value for key, calling loader() on a miss (or to refresh it early)"""
+        return self.lookup(key, loader)[0]
+
+    def lookup(self, key, loader: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        (value, hit) as get_or_load; hit is True only when the value was read
+        from L1 or L2, not loaded by this call or by a concurrent one it waited on
+        """
+        key = str(key)
+        start = time.perf_counter()
+
+        entry = self._l1_get(key)
+        hit = "l1"
+        if entry is None:
+            entry = self._l2_get(key)
+            hit = "l2"
+            if entry is not None:
+                self._l1_put(key, entry)
+
+        if entry is not None:
+            with self._lock:
+                if hit == "l1":
+                    self.l1_hits += 1
+                else:
+                    self.l2_hits += 1
+                self._hit_ms.append((time.perf_counter() - start) * 1000)
+            if self._should_refresh(entry):
+                refreshed = self._load(key, loader, wait=False)
+                if refreshed is not None:
+                    return refreshed.value, False
+            return entry.value, True
+
+        with self._lock:
+            self.misses += 1
+        entry = self._load(key, loader, wait=True)
+        with self._lock:
+            self._load_ms.append((time.perf_counter() - start) * 1000)
+        return entry.value, False
+
+    def _should_refresh(self, entry: _Entry) -> bool:
+        if self.beta <= 0:
+            return False
+        # 1 - random() is in (0, 1], so the log is defined
+        return time.time() - entry.delta * self.beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+    def _load(self, key: str, loader: Callable[[], Any], wait: bool) -> Optional[_Entry]:
+        """Run loader once per key in this process; with wait=False return None if a load is already running"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            elif wait:
+                self.collapsed += 1
+        if not leader:
+            if not wait:
+                return None
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.entry is None:
+                # That was an early refresh that gave way to another process
+                return self._load(key, loader, wait)
+            return flight.entry
+
+        try:
+            flight.entry = self._load_shared(key, loader, early=not wait)
+            return flight.entry
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _load_shared(self, key: str, loader: Callable[[], Any], early: bool) -> Optional[_Entry]:
+        """Load under the L2 lock so one process at a time calls loader for a key"""
+        lock_key = self._l2_key(key) + ":lock"
+        locked = self.tier.lock(lock_key, SHARED_CACHE_LOCK_SECONDS)
+        if locked is False:
+            # Another process is refreshing; keep serving what we have
+            if early:
+                return None
+            deadline = time.monotonic() + SHARED_CACHE_LOCK_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(SHARED_CACHE_POLL_SECONDS)
+                entry = self._l2_get(key)
+                if entry is not None:
+                    self._l1_put(key, entry)
+                    with self._lock:
+                        self.collapsed += 1
+                    return entry
+
+        try:
+            started = time.perf_counter()
+            try:
+                value = loader()
+            except Exception:
+                with self._lock:
+                    self.load_errors += 1
+                raise
+            ttl = self.ttl if value is not None else self.negative_ttl
+            entry = _Entry(value, time.perf_counter() - started, time.time() + ttl)
+            with self._lock:
+                self.loads += 1
+                if early:
+                    self.early_refreshes += 1
+            if ttl > 0:
+                self._l1_put(key, entry)
+                self._l2_put(key, entry)
+            return entry
+        finally:
+            if locked:
+                self.tier.delete(lock_key)
+
+    # Writes
+
+    def invalidate(self, key=None):
+        """
+        Drop key (or the whole namespace) everywhere: this process, L2, and the
+        other workers' L1 via the invalidation bus. Call it after committing.
+        """
+        self.evict_local(key)
+        if key is None:
+            self.tier.delete_prefix(f"{SHARED_CACHE_PREFIX}:{self.namespace}:")
+        else:
+            self.tier.delete(self._l2_key(str(key)))
+        try:
+            publish(f"shared_cache.{self.namespace}", key)
+        except Exception as e:
+            logger.warning(f"Publishing shared cache invalidation for {self.namespace} failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hit_ms = sorted(self._hit_ms)
+            load_ms = sorted(self._load_ms)
+            hits = self.l1_hits + self.l2_hits
+            lookups = hits + self.misses
+            counters = {
+                "l1_entries": len(self._l1),
+                "l1_hits": self.l1_hits,
+                "l2_hits": self.l2_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "early_refreshes": self.early_refreshes,
+                "collapsed": self.collapsed,
+            }
+
+        def summary(samples):
+            if not samples:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            return {
+                "avg": round(sum(samples) / len(samples), 3),
+                "p50": round(samples[int(len(samples) * 0.50)], 3),
+                "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                "max": round(samples[-1], 3),
+            }
+
+        return {**counters, "hit_latency_ms": summary(hit_ms), "miss_latency_ms": summary(load_ms)}
+
+
+# users.plan per user, read by every quota check. Plan changes invalidate it;
+# usage counters move with every deed and API call and are never cached.
+# Unknown users are not cached by default, so a new or restored account is
+# seen on its next request rather than rejected until the entry expires.
+user_plan_cache = SharedCache(
+    "user_plans",
+    ttl=float(os.getenv("USER_PLAN_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("USER_PLAN_CACHE_NEGATIVE_TTL", "0")),
+)
+
+
+def shared_cache_stats() -> dict:
+    """Per-namespace counters and latencies plus the L2 connection state"""
+    return {**shared_cache_tier.stats(), "namespaces": {name: cache.stats() for name, cache in _namespaces.items()}}
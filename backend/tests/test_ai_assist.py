@@ -0,0 +1,56 @@
+import time
+import threading
+
+import pytest
+
+import ai_assist
+from ai_assist import AIAssistRequest, cached_model_suggestion, suggestion_cache
+
+
+@pytest.fixture
+def model(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def request_model_suggestion(request):
+        calls.append(request.input)
+        release.wait(5)
+        return {"suggestion": request.input.upper(), "confidence": 0.85}
+
+    monkeypatch.setattr(ai_assist, "load_stored_suggestion", lambda key: None)
+    monkeypatch.setattr(ai_assist, "store_suggestion", lambda key, request, suggestion: None)
+    monkeypatch.setattr(ai_assist, "request_model_suggestion", request_model_suggestion)
+    suggestion_cache.evict_local()
+    yield calls, release
+    release.set()
+    suggestion_cache.evict_local()
+
+
+def ask(text="1 main st"):
+    return cached_model_suggestion(AIAssistRequest(deed_type="grant_deed", field="property_address", input=text))
+
+
+def test_waiting_on_another_requests_load_is_not_a_cache_hit(model):
+    calls, release = model
+    results = []
+    collapsed = suggestion_cache.collapsed
+    threads = [threading.Thread(target=lambda: results.append(ask())) for _ in range(2)]
+    threads[0].start()
+    while not calls:
+        time.sleep(0.001)
+    threads[1].start()
+    while suggestion_cache.collapsed == collapsed:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [cached for _, cached in results] == [False, False]
+    assert ask()[1] is True
+
+
+def test_stored_suggestion_counts_as_cached(model, monkeypatch):
+    monkeypatch.setattr(ai_assist, "load_stored_suggestion", lambda key: {"suggestion": "1 MAIN ST", "confidence": 0.9})
+
+    assert ask() == ({"suggestion": "1 MAIN ST", "confidence": 0.9}, True)
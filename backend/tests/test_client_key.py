@@ -0,0 +1,37 @@
+import ipaddress
+from types import SimpleNamespace
+
+import pytest
+
+import db_pool
+from auth import create_access_token
+from db_pool import client_key
+
+
+def request(peer="203.0.113.9", **headers):
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=peer) if peer else None)
+
+
+@pytest.fixture
+def proxies(monkeypatch):
+    monkeypatch.setattr(db_pool, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def test_signed_in_caller_is_keyed_by_user_id():
+    token = create_access_token(data={"sub": "42", "email": "a@example.com"})
+
+    assert client_key(request(authorization=f"Bearer {token}")) == "user:42"
+
+
+def test_forwarded_header_is_ignored_from_an_untrusted_peer():
+    assert client_key(request(**{"x-forwarded-for": "198.51.100.1"})) == "ip:203.0.113.9"
+
+
+def test_forwarded_header_is_used_behind_a_trusted_proxy(proxies):
+    spoofed = request("10.0.0.5", **{"x-forwarded-for": "198.51.100.1, 203.0.113.7, 10.0.0.4"})
+
+    assert client_key(spoofed) == "ip:203.0.113.7"
+
+
+def test_invalid_token_and_no_peer_has_no_key():
+    assert client_key(request(None, authorization="Bearer nonsense")) is None
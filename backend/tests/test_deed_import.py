@@ -0,0 +1,82 @@
+import io
+
+import pytest
+from pydantic import ValidationError
+
+import database
+from deed_import import ImportFormatError, IMPORT_COLUMNS, validate_upload
+from main import DeedCreate
+
+HEADER = "deed_type,property_address,grantor_name,grantee_name,apn\n"
+
+
+def copy_rows(buffer):
+    rows = [line.rstrip("\n").split("\t") for line in buffer.read().splitlines(True)]
+    buffer.close()
+    return [dict(zip(["row_number"] + IMPORT_COLUMNS, row)) for row in rows]
+
+
+def test_row_missing_required_column_is_reported_and_skipped():
+    upload = io.StringIO(
+        HEADER
+        + "Grant Deed,1 Main St,Ann Lee,Bo Chan,123-45\n"
+        + "Grant Deed,,Ann Lee,Bo Chan,123-46\n"
+        + "Quitclaim Deed,2 Oak Ave,Ann Lee,Bo Chan,123-47\n"
+    )
+
+    buffer, valid, total, error_count, errors = validate_upload(upload, "csv", DeedCreate)
+
+    assert (valid, total, error_count) == (2, 3, 1)
+    assert errors == [{"row": 2, "errors": ["property_address: required"]}]
+    rows = copy_rows(buffer)
+    assert [row["row_number"] for row in rows] == ["1", "3"]
+    assert all(row["grantor_name"] == "Ann Lee" for row in rows)
+
+
+def test_ndjson_row_without_grantor_is_rejected():
+    upload = io.StringIO(
+        '{"deed_type": "Grant Deed", "property_address": "1 Main St", "grantee_name": "Bo Chan"}\n'
+        '{"deed_type": "Grant Deed", "property_address": "1 Main St", "grantor_name": " ", "grantee_name": "Bo Chan"}\n'
+    )
+
+    buffer, valid, total, error_count, errors = validate_upload(upload, "ndjson", DeedCreate)
+    buffer.close()
+
+    assert (valid, error_count) == (0, 2)
+    assert [e["errors"] for e in errors] == [["grantor_name: required"]] * 2
+
+
+def test_csv_header_must_name_required_columns():
+    with pytest.raises(ImportFormatError, match="grantor_name"):
+        validate_upload(io.StringIO("deed_type,property_address,grantee_name\n"), "csv", DeedCreate)
+
+
+def test_create_deed_inserts_grantor_name(monkeypatch):
+    captured = {}
+
+    class Cursor:
+        def execute(self, sql, params):
+            captured["sql"], captured["params"] = sql, params
+
+        def fetchone(self):
+            return {"id": 1}
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self, cursor_factory=None):
+            return Cursor()
+
+    monkeypatch.setattr(database, "get_pool", lambda: object())
+    monkeypatch.setattr(database.shard_router, "run", lambda user_id, fn, operation: fn(Connection()))
+    deed = DeedCreate(deed_type="Grant Deed", property_address="1 Main St", grantor_name="Ann Lee", grantee_name="Bo Chan")
+
+    assert database.create_deed(1, deed.model_dump()) == {"id": 1}
+    assert "grantor_name" in captured["sql"]
+    assert "Ann Lee" in captured["params"]
+
+
+def test_deed_without_grantor_is_rejected_by_the_model():
+    with pytest.raises(ValidationError, match="grantor_name"):
+        DeedCreate(deed_type="Grant Deed", property_address="1 Main St", grantee_name="Bo Chan")
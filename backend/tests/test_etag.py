@@ -0,0 +1,25 @@
+import pytest
+
+from main import etag_matches
+
+ETAG = '"3f2a9c"'
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '"3f2a9c"',
+    'W/"3f2a9c"',
+    '"aaaa", W/"3f2a9c"',
+    ' "bbbb" ,"3f2a9c" ',
+    "*",
+])
+def test_matching_validators(if_none_match):
+    assert etag_matches(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize("if_none_match", [None, "", '"3f2a9d"', "3f2a9c", 'W/"aaaa", "bbbb"'])
+def test_non_matching_validators(if_none_match):
+    assert not etag_matches(if_none_match, ETAG)
+
+
+def test_weak_current_etag_matches_its_strong_form():
+    assert etag_matches(ETAG, 'W/"3f2a9c"')
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+import pytest
+
+import metering
+from metering import UsageMeter
+
+
+class FakePool:
+    def __init__(self):
+        self.attempts = 0
+
+    @contextmanager
+    def connection(self, operation=None):
+        self.attempts += 1
+        yield self
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def written(monkeypatch):
+    rows = []
+
+    def execute_values(cur, sql, batch, page_size=None):
+        # user 13 was deleted after the request was metered
+        if any(row[0] == 13 for row in batch):
+            raise psycopg2.IntegrityError("violates foreign key constraint")
+        rows.extend(batch)
+
+    monkeypatch.setattr(metering, "execute_values", execute_values)
+    return rows
+
+
+def meter_with(user_ids):
+    meter = UsageMeter(capacity=100, batch_size=100)
+    meter.start = lambda: None
+    for user_id in user_ids:
+        meter.record(user_id, "/deeds", "GET", datetime(2026, 1, 1), 5, 200, "10.0.0.1")
+    return meter
+
+
+def test_rejected_rows_are_dropped_without_the_rest_of_the_batch(monkeypatch, written):
+    monkeypatch.setattr(metering, "get_pool", FakePool)
+    meter = meter_with([1, 2, 13, 4, 5, 13, 7])
+
+    assert meter.flush() == 5
+
+    assert sorted(row[0] for row in written) == [1, 2, 4, 5, 7]
+    stats = meter.stats()
+    assert (stats["rows_written"], stats["rows_failed"], stats["failures"]) == (5, 2, 0)
+
+
+def test_unreachable_database_drops_the_batch_without_bisecting(monkeypatch):
+    pool = FakePool()
+
+    def execute_values(cur, sql, batch, page_size=None):
+        raise psycopg2.OperationalError("server closed the connection")
+
+    monkeypatch.setattr(metering, "get_pool", lambda: pool)
+    monkeypatch.setattr(metering, "execute_values", execute_values)
+    meter = meter_with([1, 2, 3])
+
+    assert meter.flush() == 0
+
+    assert pool.attempts == 1
+    assert meter.stats()["rows_failed"] == 3
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import build_page, decode_cursor, encode_cursor, keyset_clause, merge_pages
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def row(day, row_id):
+    return {"created_at": datetime(2026, 3, day, 12, 0), "id": row_id}
+
+
+def test_cursor_round_trips():
+    created_at = datetime(2026, 3, 14, 9, 26, 53, 589000)
+
+    token = encode_cursor(created_at, 42, "prev")
+
+    assert "=" not in token
+    assert decode_cursor(token) == (created_at, 42, "prev")
+
+
+@pytest.mark.parametrize("token", [
+    "not a cursor",
+    encode_cursor(datetime(2026, 3, 14), 42)[:-4],
+    raw_cursor({"c": "2026-03-14T00:00:00", "i": 42, "d": "sideways"}),
+    raw_cursor({"c": "yesterday", "i": 42}),
+    raw_cursor({"c": "2026-03-14T00:00:00", "i": "42; DROP TABLE deeds"}),
+    raw_cursor({"i": 42}),
+    raw_cursor([1, 2, 3]),
+])
+def test_malformed_or_tampered_cursor_is_a_400(token):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(token)
+
+    assert raised.value.status_code == 400
+
+
+def test_keyset_clause_binds_the_cursor_position():
+    created_at = datetime(2026, 3, 14)
+
+    where, params, order, direction = keyset_clause(encode_cursor(created_at, 7, "prev"), "d")
+
+    assert where == "AND (d.created_at, d.id) > (%s, %s)"
+    assert params == [created_at, 7]
+    assert order == "ORDER BY d.created_at ASC, d.id ASC"
+    assert direction == "prev"
+
+
+def test_build_page_trims_the_probe_row_and_links_neighbours():
+    rows, next_cursor, prev_cursor = build_page([row(5, 5), row(4, 4), row(3, 3)], 2, None, "next")
+
+    assert [r["id"] for r in rows] == [5, 4]
+    assert decode_cursor(next_cursor)[1:] == (4, "next")
+    assert prev_cursor is None
+
+
+def test_merge_pages_interleaves_shards_and_drops_duplicates():
+    pages = [[row(9, 9), row(6, 6), row(2, 2)], [row(8, 8), row(6, 6), row(5, 5)]]
+
+    assert [r["id"] for r in merge_pages(pages, 3, "next")] == [9, 8, 6, 5]
@@ -0,0 +1,92 @@
+import pytest
+
+import main
+from shared_cache import user_plan_cache
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetchone(self):
+        return self.row
+
+
+class FakePool:
+    """Counts checkouts; each statement name maps to the row it returns"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.checkouts = 0
+        self.executed = []
+
+    def connection(self, operation=None):
+        self.checkouts += 1
+        return self
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeLimits:
+    def get(self, plan):
+        return {"free": {"max_deeds_per_month": 5, "api_calls_per_month": 100}}.get(plan)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool({"user_plan": ("free",), "monthly_usage_counters": (5, 10)})
+
+    def execute_prepared(cur, name, params=()):
+        pool.executed.append(name)
+        cur.row = cur.rows.get(name)
+
+    monkeypatch.setattr(main, "get_pool", lambda: pool)
+    monkeypatch.setattr(main, "execute_prepared", execute_prepared)
+    monkeypatch.setattr(main, "plan_limits_cache", FakeLimits())
+    user_plan_cache.evict_local()
+    yield pool
+    user_plan_cache.evict_local()
+
+
+def test_plan_and_counters_share_one_checkout(pool):
+    result = main.check_plan_limits(7, "deed_creation")
+
+    assert result["allowed"] is False
+    assert result["current_usage"] == 5
+    assert pool.checkouts == 1
+    assert pool.executed == ["user_plan", "monthly_usage_counters"]
+
+
+def test_cached_plan_reads_only_the_counters(pool):
+    main.check_plan_limits(7, "api_call")
+    pool.executed.clear()
+
+    result = main.check_plan_limits(7, "api_call")
+
+    assert result["allowed"] is True
+    assert pool.checkouts == 2
+    assert pool.executed == ["monthly_usage_counters"]
+
+
+def test_unknown_user_is_not_cached(pool):
+    pool.rows["user_plan"] = None
+    assert main.check_plan_limits(7)["message"] == "User not found"
+
+    pool.rows["user_plan"] = ("free",)
+    result = main.check_plan_limits(7, "api_call")
+
+    assert result["allowed"] is True
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from psycopg2.errors import QueryCanceled
+
+import main
+from auth import get_current_user_id
+from db_pool import get_read_db
+from shared_cache import user_plan_cache
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+    def connection(self, operation=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def cancel_statement(cur, name, params=()):
+    raise QueryCanceled("canceling statement due to statement timeout")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "execute_prepared", cancel_statement)
+    main.app.dependency_overrides[get_current_user_id] = lambda: 7
+    main.app.dependency_overrides[get_read_db] = lambda: FakeConnection()
+    user_plan_cache.evict_local()
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    user_plan_cache.evict_local()
+
+
+def test_canceled_profile_query_is_a_503(client):
+    response = client.get("/users/profile")
+
+    assert response.status_code == 503
+
+
+def test_canceled_plan_check_does_not_fail_open(client, monkeypatch):
+    monkeypatch.setattr(main, "get_pool", lambda: FakeConnection())
+
+    response = client.get("/deeds/search", params={"q": "main"})
+
+    assert response.status_code == 503
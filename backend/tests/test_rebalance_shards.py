@@ -0,0 +1,42 @@
+import os
+import importlib.util
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "rebalance_shards.py")
+spec = importlib.util.spec_from_file_location("rebalance_shards", SCRIPT)
+rebalance_shards = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rebalance_shards)
+plan_moves = rebalance_shards.plan_moves
+
+
+def test_balanced_shards_need_no_moves():
+    counts = {"primary": {1: 50, 2: 50}, "shard1": {3: 60, 4: 45}}
+
+    assert plan_moves(counts, 0.1, 10) == []
+
+
+def test_moves_the_biggest_user_that_fits_from_fullest_to_emptiest():
+    counts = {"primary": {1: 100, 2: 40, 3: 30, 4: 10}, "shard1": {5: 20}}
+
+    moves = plan_moves(counts, 0.1, 10)
+
+    assert moves == [
+        (2, "primary", "shard1", 40),
+        (3, "primary", "shard1", 30),
+        (4, "primary", "shard1", 10),
+    ]
+
+
+def test_never_moves_a_user_bigger_than_half_the_gap():
+    counts = {"primary": {1: 100}, "shard1": {}}
+
+    assert plan_moves(counts, 0.1, 10) == []
+
+
+def test_stops_at_max_moves_and_leaves_the_input_alone():
+    counts = {"primary": {u: 10 for u in range(1, 21)}, "shard1": {}}
+
+    moves = plan_moves(counts, 0.0, 3)
+
+    assert len(moves) == 3
+    assert {source for _, source, _, _ in moves} == {"primary"}
+    assert len(counts["primary"]) == 20 and counts["shard1"] == {}
@@ -0,0 +1,61 @@
+import pytest
+from psycopg2 import errors
+
+import schema_migrations
+from schema_migrations import MigrationContext, MigrationError, discover
+
+
+def test_shipped_migrations_are_ordered_and_loadable():
+    migrations = discover()
+
+    versions = [m.version for m in migrations]
+    assert versions == sorted(versions)
+    assert versions[0] == "0001"
+    assert all(callable(m.module.upgrade) for m in migrations)
+
+
+def test_duplicate_versions_are_refused(tmp_path):
+    for name in ("0001_first.py", "0001_second.py"):
+        (tmp_path / name).write_text("def upgrade(m):\n    pass\n")
+
+    with pytest.raises(MigrationError, match="Duplicate"):
+        discover(str(tmp_path))
+
+
+def test_migration_without_upgrade_is_refused(tmp_path):
+    (tmp_path / "0001_empty.py").write_text('"""Nothing here"""\n')
+
+    with pytest.raises(MigrationError, match="upgrade"):
+        discover(str(tmp_path))[0].module
+
+
+def test_lock_timeouts_are_retried_then_reported(monkeypatch):
+    monkeypatch.setattr(schema_migrations.time, "sleep", lambda seconds: None)
+    context = MigrationContext(conn=None, retries=3)
+    attempts = []
+
+    def locked(step):
+        attempts.append(step)
+        raise errors.LockNotAvailable("canceling statement due to lock timeout")
+
+    monkeypatch.setattr(context, "_transaction", locked)
+
+    with pytest.raises(MigrationError, match="3 attempts"):
+        context.run(lambda cur: None, "add column")
+    assert len(attempts) == 3
+
+
+def test_step_succeeds_after_a_lock_timeout(monkeypatch):
+    monkeypatch.setattr(schema_migrations.time, "sleep", lambda seconds: None)
+    context = MigrationContext(conn=None, retries=3)
+    outcomes = iter([errors.LockNotAvailable("lock timeout"), "done"])
+
+    def transaction(step):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(context, "_transaction", transaction)
+
+    assert context.run(lambda cur: None, "add column") == "done"
@@ -0,0 +1,29 @@
+from search import HIGHLIGHT_START, HIGHLIGHT_STOP, render_highlight, search_deeds
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_highlight_escapes_user_text_and_marks_matches():
+    headline = f'<img src=x onerror="alert(1)"> 1 {HIGHLIGHT_START}Main{HIGHLIGHT_STOP} St & Co'
+
+    assert render_highlight(headline) == (
+        '&lt;img src=x onerror=&quot;alert(1)&quot;&gt; 1 <mark>Main</mark> St &amp; Co'
+    )
+    assert render_highlight(None) is None
+
+
+def test_deed_search_returns_escaped_highlights():
+    cur = FakeCursor([{"id": 1, "highlight": f"<b>{HIGHLIGHT_START}Oak{HIGHLIGHT_STOP}</b>"}])
+
+    rows = search_deeds(cur, "oak", 7, 20, 0)
+
+    assert rows[0]["highlight"] == "&lt;b&gt;<mark>Oak</mark>&lt;/b&gt;"
@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+from shards import ShardRouter, SHARD_MOVED_SQLSTATE
+
+
+class FakePool:
+    def __init__(self, name):
+        self.name = name
+        self.operations = []
+
+    @contextmanager
+    def connection(self, operation=None):
+        self.operations.append(operation)
+        yield self
+
+
+class ShardMoved(psycopg2.Error):
+    pgcode = SHARD_MOVED_SQLSTATE
+
+
+def make_router(*names, **kwargs):
+    primary, *shards = [FakePool(name) for name in names]
+    return ShardRouter(primary, shards, **kwargs)
+
+
+def test_unsharded_router_sends_everything_to_the_primary():
+    router = make_router("primary")
+
+    assert not router.enabled
+    assert router.shard_name(42) == "primary"
+    assert router.pool_for(42) is router.primary
+
+
+def test_placement_is_stable_and_spread_across_shards():
+    router = make_router("primary", "shard1")
+    again = make_router("primary", "shard1")
+
+    placements = [router.placement(user_id) for user_id in range(1, 2001)]
+
+    assert placements == [again.placement(user_id) for user_id in range(1, 2001)]
+    assert 0.3 < placements.count("shard1") / len(placements) < 0.7
+
+
+def test_adding_a_shard_only_moves_users_onto_it():
+    before = make_router("primary", "shard1")
+    after = make_router("primary", "shard1", "shard2")
+
+    moved = [u for u in range(1, 2001) if before.placement(u) != after.placement(u)]
+
+    assert moved
+    assert all(after.placement(u) == "shard2" for u in moved)
+
+
+def test_directory_rows_override_placement_and_are_cached(monkeypatch):
+    router = make_router("primary", "shard1", directory_ttl=60)
+    lookups = []
+    monkeypatch.setattr(router, "_lookup", lambda user_id: lookups.append(user_id) or "shard1")
+
+    assert router.shard_name(7) == "shard1"
+    assert router.shard_name(7) == "shard1"
+    assert lookups == [7]
+    assert router.shard_name(7, fresh=True) == "shard1"
+    assert lookups == [7, 7]
+
+
+def test_directory_row_naming_an_unknown_shard_is_an_error(monkeypatch):
+    router = make_router("primary", "shard1")
+    monkeypatch.setattr(router, "_lookup", lambda user_id: "shard9")
+
+    with pytest.raises(RuntimeError, match="shard9"):
+        router.shard_name(7)
+
+
+@pytest.fixture
+def moving_router(monkeypatch):
+    """Router whose directory says shard1 first and primary after the move"""
+    router = make_router("primary", "shard1")
+    assignments = iter(["shard1", "primary", "shard1"])
+    monkeypatch.setattr(router, "assign", lambda user_id: next(assignments))
+    return router
+
+
+def test_run_retries_once_on_the_new_shard_after_a_move(moving_router):
+    calls = []
+
+    def write(conn):
+        calls.append(conn.name)
+        if conn.name == "shard1":
+            raise ShardMoved("user 7 is being moved")
+        return "written"
+
+    assert moving_router.run(7, write, "create_deed") == "written"
+    assert calls == ["shard1", "primary"]
+    assert moving_router._moved_retries == 1
+
+
+def test_run_gives_up_after_the_second_move(moving_router):
+    def write(conn):
+        raise ShardMoved("user 7 is being moved")
+
+    with pytest.raises(ShardMoved):
+        moving_router.run(7, write)
+
+
+def test_run_does_not_retry_other_errors(moving_router):
+    calls = []
+
+    def write(conn):
+        calls.append(conn.name)
+        raise psycopg2.IntegrityError("duplicate key")
+
+    with pytest.raises(psycopg2.IntegrityError):
+        moving_router.run(7, write)
+    assert calls == ["shard1"]
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+
+from db_pool import borrow
+from query_budget import _changed_rows
+
+
+@pytest.mark.parametrize("tag, rowcount, wrote", [
+    ("SELECT 1", 1, False),
+    ("INSERT 0 1", 1, True),
+    ("INSERT 0 0", 0, False),
+    ("UPDATE 3", 3, True),
+    ("DELETE 0", 0, False),
+    ("SET", -1, False),
+    (None, -1, False),
+])
+def test_only_statements_that_change_rows_count_as_writes(tag, rowcount, wrote):
+    assert _changed_rows(SimpleNamespace(statusmessage=tag, rowcount=rowcount)) is wrote
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, wrote):
+        self.wrote = wrote
+        self.write_commits = 0
+
+    def commit(self):
+        if self.wrote:
+            self.write_commits += 1
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, discard=False):
+        pass
+
+
+@pytest.mark.parametrize("wrote", [False, True])
+def test_on_write_runs_only_after_a_committed_write(wrote):
+    marks = []
+    borrowed = borrow(FakePool(FakeConnection(wrote)), on_write=lambda: marks.append(1))
+
+    next(borrowed).commit()
+    with pytest.raises(StopIteration):
+        next(borrowed)
+
+    assert marks == ([1] if wrote else [])
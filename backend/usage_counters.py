@@ -0,0 +1,120 @@
+"""
+Per-user monthly usage counters
+
+user_monthly_usage keeps one row per (user_id, month) with the number of deeds
+created and API calls made, so plan-limit checks read a single row instead of
+counting deeds. Counters are bumped in the same transaction as the write they
+count; reconcile_monthly_usage() rebuilds them from the source tables.
+
+With deed shards each database counts its own writes: deeds_created lives on
+the shard holding the user's deeds, api_calls on the primary (the usage
+meter writes there). Reconcile each database from its own tables, rebuilding
+only the counters it owns (see scripts/reconcile_usage.py).
+"""
+
+from datetime import date
+from typing import Optional
+
+# Bumps the deed counter for the month of each deed returned by a "new_deeds" CTE
+INCREMENT_DEEDS_FROM_CTE = """
+    INSERT INTO user_monthly_usage (user_id, month, deeds_created)
+    SELECT user_id, DATE_TRUNC('month', created_at)::date, COUNT(*)
+    FROM new_deeds
+    WHERE user_id IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (user_id, month) DO UPDATE SET
+        deeds_created = user_monthly_usage.deeds_created + EXCLUDED.deeds_created,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Bumps the API call counter for each row returned by a "logged" CTE
+INCREMENT_API_CALLS_FROM_CTE = """
+    INSERT INTO user_monthly_usage (user_id, month, api_calls)
+    SELECT user_id, DATE_TRUNC('month', timestamp)::date, COUNT(*)
+    FROM logged
+    WHERE user_id IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (user_id, month) DO UPDATE SET
+        api_calls = user_monthly_usage.api_calls + EXCLUDED.api_calls,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def month_start(value: Optional[date] = None) -> date:
+    """First day of the month containing value (default: today)"""
+    value = value or date.today()
+    return value.replace(day=1)
+
+
+def reconcile_monthly_usage(conn, user_id: Optional[int] = None, month: Optional[date] = None,
+                            deeds: bool = True, api_calls: bool = True) -> int:
+    """
+    Rebuild user_monthly_usage from deeds and api_usage on conn's database
+
+    Optionally scoped to one user and/or one month, and to the deeds_created
+    or api_calls counter (the other is left as is). Counter increments are
+    blocked for the duration (they take ROW EXCLUSIVE on user_monthly_usage in
+    the same transaction as the counted write), so none can race the recount.
+    Returns the number of counter rows written.
+    """
+    counter_filters, counter_params = [], []
+    deed_filters, deed_params = [], []
+    call_filters, call_params = [], []
+    if user_id is not None:
+        counter_filters.append("user_id = %s")
+        counter_params.append(user_id)
+        deed_filters.append("user_id = %s")
+        deed_params.append(user_id)
+        call_filters.append("user_id = %s")
+        call_params.append(user_id)
+    if month is not None:
+        first = month_start(month)
+        counter_filters.append("month = %s")
+        counter_params.append(first)
+        # Range predicates keep the created_at/timestamp indexes usable
+        deed_filters.append("created_at >= %s AND created_at < %s::date + INTERVAL '1 month'")
+        deed_params.extend([first, first])
+        call_filters.append("timestamp >= %s AND timestamp < %s::date + INTERVAL '1 month'")
+        call_params.extend([first, first])
+
+    def where(filters):
+        return "".join(f" AND {f}" for f in filters)
+
+    counters = [name for name, rebuild in (("deeds_created", deeds), ("api_calls", api_calls)) if rebuild]
+    if not counters:
+        return 0
+    counts, params = [], []
+    if deeds:
+        counts.append(f"""
+                SELECT user_id, DATE_TRUNC('month', created_at)::date AS month,
+                       COUNT(*) AS deeds_created, 0 AS api_calls
+                FROM deeds WHERE user_id IS NOT NULL{where(deed_filters)}
+                GROUP BY 1, 2""")
+        params.extend(deed_params)
+    if api_calls:
+        counts.append(f"""
+                SELECT user_id, DATE_TRUNC('month', timestamp)::date AS month,
+                       0 AS deeds_created, COUNT(*) AS api_calls
+                FROM api_usage WHERE user_id IS NOT NULL{where(call_filters)}
+                GROUP BY 1, 2""")
+        params.extend(call_params)
+
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE user_monthly_usage IN SHARE ROW EXCLUSIVE MODE")
+
+        # Start from zero so months whose rows were deleted are corrected too
+        cur.execute(f"""
+            UPDATE user_monthly_usage SET {", ".join(f"{c} = 0" for c in counters)}, updated_at = CURRENT_TIMESTAMP
+            WHERE TRUE{where(counter_filters)}
+        """, counter_params)
+
+        cur.execute(f"""
+            INSERT INTO user_monthly_usage (user_id, month, deeds_created, api_calls)
+            SELECT user_id, month, SUM(deeds_created), SUM(api_calls)
+            FROM ({"UNION ALL".join(counts)}
+            ) counts
+            GROUP BY user_id, month
+            ON CONFLICT (user_id, month) DO UPDATE SET
+                {"".join(f"{c} = EXCLUDED.{c}, " for c in counters)}updated_at = CURRENT_TIMESTAMP
+        """, params)
+        return cur.rowcount